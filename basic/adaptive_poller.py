@@ -0,0 +1,146 @@
+import time
+from basic.plc_poller import PLCPoller
+
+
+class AdaptivePoller(PLCPoller):
+    def __init__(self, plc, interval: float = 0.5, max_interval: float = 2.0,
+                 max_utilization: float = 0.5, slowdown: float = 1.5):
+        """
+        PLCPoller where every group runs at its own, self-adjusting rate.
+
+        A group that changed is polled at its fastest interval again; a group
+        that stayed the same backs off by `slowdown` up to its max interval.
+        link(trigger, target) makes a change in one group (e.g. the M100
+        start bit) put another (the axis monitor) on its fast rate.
+
+        The round-trip time of every request is measured, and the total
+        request rate is kept under max_utilization of what the link can
+        carry: when demand exceeds it, non-critical groups are stretched
+        first, critical ones only when they alone exceed the budget.
+        """
+        super().__init__(plc, interval)
+        self.max_interval = max_interval
+        self.max_utilization = max_utilization
+        self.slowdown = slowdown
+
+        self.rtt = None        # EMA of seconds per Modbus request
+        self._rates = {}       # name -> rate state, see set_group
+        self._links = {}       # trigger group -> [target groups]
+
+    def set_group(self, name: str, device: str, start: int, count: int,
+                  min_interval: float = None, max_interval: float = None, critical: bool = False):
+        """min_interval=None follows self.interval, so a UI refresh setting still applies."""
+        super().set_group(name, device, start, count)
+        limit = self.plc.MAX_READ_REGS if device.upper() == "D" else self.plc.MAX_READ_BITS
+        with self._lock:
+            self._rates[name] = {
+                "min": min_interval,
+                "max": max_interval,
+                "current": None,
+                "next": 0.0,
+                "critical": critical,
+                "frames": -(-count // limit),
+            }
+
+    def set_rate(self, name: str, min_interval: float = None, max_interval: float = None):
+        """Change a group's bounds without re-reading it from scratch."""
+        with self._lock:
+            rate = self._rates.get(name)
+            if rate is not None:
+                rate["min"], rate["max"] = min_interval, max_interval
+                rate["current"] = None
+                rate["next"] = 0.0
+
+    def remove_group(self, name: str):
+        super().remove_group(name)
+        with self._lock:
+            self._rates.pop(name, None)
+            self._links.pop(name, None)
+
+    def link(self, trigger: str, target: str):
+        with self._lock:
+            self._links.setdefault(trigger, []).append(target)
+
+    def intervals(self) -> dict:
+        """Effective interval of every group after the link budget is applied."""
+        with self._lock:
+            return {name: self._effective(name) for name in self._rates}
+
+    def _bounds(self, rate: dict) -> tuple[float, float]:
+        fast = rate["min"] if rate["min"] is not None else self.interval
+        slow = rate["max"] if rate["max"] is not None else max(self.max_interval, fast)
+        return fast, slow
+
+    def _budget_scale(self) -> tuple[float, float]:
+        """(critical, other) multipliers that keep requests/s inside the budget."""
+        if not self.rtt:
+            return 1.0, 1.0
+        budget = self.max_utilization / self.rtt
+        demand = {True: 0.0, False: 0.0}
+        for rate in self._rates.values():
+            current = rate["current"] or self._bounds(rate)[0]
+            demand[rate["critical"]] += rate["frames"] / current
+
+        if demand[True] >= budget:
+            scale = demand[True] / budget
+            return scale, max(scale, (demand[True] + demand[False]) / budget)
+        spare = budget - demand[True]
+        return 1.0, max(1.0, demand[False] / spare)
+
+    def _effective(self, name: str) -> float:
+        rate = self._rates[name]
+        current = rate["current"] or self._bounds(rate)[0]
+        critical_scale, other_scale = self._budget_scale()
+        return current * (critical_scale if rate["critical"] else other_scale)
+
+    def poll_once(self):
+        """Poll the groups that are due and re-plan their next poll."""
+        now = time.monotonic()
+        with self._lock:
+            due = [(name, self._groups[name]) for name, rate in self._rates.items()
+                   if rate["next"] <= now and name in self._groups]
+
+        boosted = []
+        for name, (device, start, count) in due:
+            started = time.monotonic()
+            changed = self._poll_group(name, device, start, count)
+            elapsed = time.monotonic() - started
+
+            with self._lock:
+                rate = self._rates.get(name)
+                if rate is None:
+                    continue
+                per_request = elapsed / rate["frames"]
+                self.rtt = per_request if self.rtt is None else self.rtt + 0.2 * (per_request - self.rtt)
+
+                fast, slow = self._bounds(rate)
+                if changed:
+                    rate["current"] = fast
+                    boosted.extend(self._links.get(name, []))
+                else:
+                    rate["current"] = min(slow, (rate["current"] or fast) * self.slowdown)
+
+        with self._lock:
+            for target in boosted:
+                rate = self._rates.get(target)
+                if rate is not None:
+                    rate["current"] = self._bounds(rate)[0]
+                    rate["next"] = 0.0
+            after = time.monotonic()
+            for name, _ in due:
+                if name in self._rates and name not in boosted:
+                    self._rates[name]["next"] = after + self._effective(name)
+
+        if due:
+            self.cycle_count += 1
+            self.changes.put(("cycle", self.cycle_count))
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.poll_once()
+            with self._lock:
+                upcoming = min((rate["next"] for rate in self._rates.values()), default=None)
+            # Wake at the next due group, but at least twice a second to pick up new groups
+            wait = 0.5 if upcoming is None else min(0.5, upcoming - time.monotonic())
+            if wait > 0:
+                self._stop_event.wait(wait)
@@ -0,0 +1,264 @@
+import time
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox
+from collections import OrderedDict
+from basic.device_grid import DeviceGrid
+
+# FX5U device ranges reachable through the Ext Device Modbus mapping
+DEVICE_LIMITS = {"M": 7680, "D": 8000}
+
+
+class PageCache:
+    def __init__(self, page_size: int = 100, ttl: float = 5.0, max_pages: int = 128):
+        """
+        LRU of recently read device pages.
+
+        A page older than `ttl` seconds is still returned for display when
+        asked with fresh=False, but counts as missing for prefetch decisions.
+        """
+        self.page_size = page_size
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self._pages = OrderedDict()  # (device, page) -> (timestamp, values)
+        self._lock = threading.Lock()
+
+    def get(self, device: str, page: int, fresh: bool = True):
+        with self._lock:
+            entry = self._pages.get((device, page))
+            if entry is None:
+                return None
+            if fresh and time.monotonic() - entry[0] > self.ttl:
+                return None
+            self._pages.move_to_end((device, page))
+            return entry[1]
+
+    def put(self, device: str, page: int, values: list):
+        with self._lock:
+            self._pages[(device, page)] = (time.monotonic(), list(values))
+            self._pages.move_to_end((device, page))
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def store_range(self, device: str, start: int, values: list):
+        """Split a page-aligned ranged read into cache pages."""
+        for i in range(0, len(values), self.page_size):
+            self.put(device, (start + i) // self.page_size, values[i:i + self.page_size])
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+class PageFetcher:
+    def __init__(self, plc, cache: PageCache, interval: float = 0.5, prefetch_pages: int = 1):
+        """
+        Worker that polls only the visible pages (one ranged read per cycle)
+        and warms the cache with neighbouring pages between cycles.
+        Visible results are queued on `results` as (device, start, values).
+        """
+        self.plc = plc
+        self.cache = cache
+        self.interval = interval
+        self.prefetch_pages = prefetch_pages
+        self.results = queue.Queue()
+
+        self._view = None   # (device, first_page, last_page)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def set_view(self, device: str, first_page: int, last_page: int):
+        with self._lock:
+            self._view = (device, first_page, last_page)
+        self._wake.set()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="PageFetcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def _page_read(self, device: str, first_page: int, last_page: int):
+        size = self.cache.page_size
+        start = first_page * size
+        count = min(DEVICE_LIMITS[device], (last_page + 1) * size) - start
+        if count <= 0:
+            return None
+        values, ok = self.plc.read_device_range(device, start, count)
+        if not ok:
+            return None
+        self.cache.store_range(device, start, values)
+        return start, values
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            with self._lock:
+                view = self._view
+
+            if view is not None:
+                device, first_page, last_page = view
+                result = self._page_read(device, first_page, last_page)
+                if result is not None:
+                    self.results.put((device,) + result)
+
+                # Warm the pages just outside the viewport, only if not fresh already
+                last_valid = (DEVICE_LIMITS[device] - 1) // self.cache.page_size
+                for n in range(1, self.prefetch_pages + 1):
+                    for page in (last_page + n, first_page - n):
+                        if self._wake.is_set():
+                            break
+                        if 0 <= page <= last_valid and self.cache.get(device, page) is None:
+                            self._page_read(device, page, page)
+
+            remaining = self.interval - (time.monotonic() - started)
+            if remaining > 0:
+                self._wake.wait(remaining)
+            self._wake.clear()
+
+
+class DeviceBrowser:
+    FRAME_MS = 30
+
+    def __init__(self, master, plc_controller, page_size: int = 100):
+        """
+        Browser over the full FX5U M and D ranges.
+
+        The grid only draws the rows in view, and only the visible pages are
+        polled; recently viewed pages come back from the cache immediately.
+        """
+        self.master = master
+        self.plc = plc_controller
+        self.cache = PageCache(page_size=page_size)
+        self.fetcher = PageFetcher(self.plc, self.cache)
+        self.device = tk.StringVar(value="D")
+
+        if isinstance(self.master, tk.Tk) or isinstance(self.master, tk.Toplevel):
+            self.master.title("PLC Device Browser")
+            self.master.geometry("820x520")
+            self.master.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.setup_ui()
+        self.switch_device()
+        self.fetcher.start()
+        self.update_view()
+
+    def setup_ui(self):
+        top = ttk.Frame(self.master, padding=10)
+        top.pack(fill="x")
+
+        ttk.Label(top, text="Device:").pack(side="left", padx=5)
+        device_cb = ttk.Combobox(top, textvariable=self.device, values=list(DEVICE_LIMITS),
+                                 state="readonly", width=4)
+        device_cb.pack(side="left", padx=5)
+        device_cb.bind("<<ComboboxSelected>>", lambda event: self.switch_device())
+
+        ttk.Label(top, text="Go to (e.g. D1234, M100):").pack(side="left", padx=(20, 5))
+        self.jump_entry = ttk.Entry(top, width=10)
+        self.jump_entry.pack(side="left", padx=5)
+        self.jump_entry.bind("<Return>", lambda event: self.jump())
+        ttk.Button(top, text="Go", command=self.jump).pack(side="left", padx=5)
+
+        ttk.Label(top, text="Refresh (ms):").pack(side="left", padx=(20, 5))
+        self.refresh_entry = ttk.Entry(top, width=6)
+        self.refresh_entry.insert(0, "500")
+        self.refresh_entry.pack(side="left", padx=5)
+
+        self.grid = DeviceGrid(self.master, style=self.cell_style, columns=10, visible_rows=12)
+        self.grid.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.grid.on_view_change = self.on_view_change
+
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(self.master, textvariable=self.status_var).pack(anchor="w", padx=10, pady=(0, 5))
+
+    def cell_style(self, address, value):
+        device = self.device.get()
+        if device == "M":
+            return ("orange" if value else "gray"), "white", f"M{address}"
+        int_val = int(value or 0)
+        if int_val > 32767:
+            int_val -= 65536
+        return "white", "black", f"D{address}\n{int_val}"
+
+    def switch_device(self):
+        self.grid.set_range(0, DEVICE_LIMITS[self.device.get()])
+
+    def on_view_change(self, first: int, count: int):
+        if count <= 0:
+            return
+        device = self.device.get()
+        size = self.cache.page_size
+        first_page = first // size
+        last_page = (first + count - 1) // size
+
+        # Show whatever we already have for these pages, then poll them live
+        for page in range(first_page, last_page + 1):
+            values = self.cache.get(device, page, fresh=False)
+            if values is not None:
+                start = page * size
+                self.grid.apply({start + i: v for i, v in enumerate(values)})
+        self.fetcher.set_view(device, first_page, last_page)
+        self.status_var.set(f"Viewing {device}{first} - {device}{first + count - 1}")
+
+    def jump(self):
+        text = self.jump_entry.get().strip().upper()
+        try:
+            if text[:1] in DEVICE_LIMITS:
+                device, address = text[0], int(text[1:])
+            else:
+                device, address = self.device.get(), int(text)
+            if not 0 <= address < DEVICE_LIMITS[device]:
+                raise ValueError
+        except (ValueError, IndexError):
+            messagebox.showerror("Error", f"Invalid address: '{text}'")
+            return
+
+        if device != self.device.get():
+            self.device.set(device)
+            self.switch_device()
+        self.grid.scroll_to(address)
+
+    def update_view(self):
+        try:
+            refresh_rate = int(self.refresh_entry.get())
+            if refresh_rate < 50: refresh_rate = 50
+        except ValueError:
+            refresh_rate = 500
+        self.fetcher.interval = refresh_rate / 1000.0
+
+        device = self.device.get()
+        while True:
+            try:
+                res_device, start, values = self.fetcher.results.get_nowait()
+            except queue.Empty:
+                break
+            if res_device == device:
+                self.grid.apply({start + i: v for i, v in enumerate(values)})
+
+        self.master.after(self.FRAME_MS, self.update_view)
+
+    def close(self):
+        self.fetcher.stop()
+        self.master.destroy()
+
+
+if __name__ == "__main__":
+    from basic.plc_module import PLCController
+
+    test_plc = PLCController(config_print=False)
+    test_plc.plcConnect("192.168.3.250", 502)
+
+    root = tk.Tk()
+    app = DeviceBrowser(root, test_plc)
+    root.mainloop()
@@ -0,0 +1,147 @@
+import tkinter as tk
+
+
+class DeviceGrid(tk.Frame):
+    def __init__(self, master, style, columns: int = 8, cell_width: int = 72,
+                 cell_height: int = 36, visible_rows: int = 2, **kwargs):
+        """
+        Canvas-backed grid for a device range (X, Y, M or D).
+
+        Only cells inside the viewport own canvas items; scrolling recycles
+        them, so a range of thousands of devices costs the same as one screen.
+        style(address, value) -> (fill, fg, text), value is None before the
+        first read.
+        """
+        super().__init__(master, **kwargs)
+        self.style = style
+        self.columns = columns
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+
+        self.start = 0
+        self.count = 0
+        self.values = {}
+        self.marker = None
+        self._cells = {}  # address -> (rect_id, text_id), visible cells only
+        self._view = None
+
+        # Called with (first, count) whenever the set of visible cells changes
+        self.on_view_change = None
+
+        self.canvas = tk.Canvas(self, width=columns * cell_width, height=visible_rows * cell_height,
+                                highlightthickness=0, yscrollincrement=cell_height)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scroll)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.canvas.bind("<Configure>", lambda event: self._render())
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", self._on_wheel)
+        self.canvas.bind("<Button-5>", self._on_wheel)
+
+    def set_range(self, start: int, count: int):
+        self.start = start
+        self.count = max(0, count)
+        self.values.clear()
+        self.marker = None
+        self.canvas.delete("all")
+        self._cells.clear()
+        self._view = None
+
+        rows = -(-self.count // self.columns)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.cell_width, rows * self.cell_height))
+        self.canvas.yview_moveto(0)
+        self._render()
+
+    def visible_range(self) -> tuple[int, int]:
+        """(first address, count) of the cells currently inside the viewport."""
+        height = self.canvas.winfo_height()
+        if height <= 1:
+            height = int(self.canvas.cget("height"))
+        top = self.canvas.canvasy(0)
+        first_row = int(top // self.cell_height)
+        last_row = int((top + height - 1) // self.cell_height)
+
+        first = self.start + first_row * self.columns
+        end = min(self.start + self.count, self.start + (last_row + 1) * self.columns)
+        return first, max(0, end - first)
+
+    def apply(self, changes: dict):
+        """Store new values and repaint only the visible cells that received one."""
+        end = self.start + self.count
+        for address, value in changes.items():
+            if not self.start <= address < end:
+                continue
+            if address in self.values and self.values[address] == value:
+                continue
+            self.values[address] = value
+            if address in self._cells:
+                self._paint(address)
+
+    def scroll_to(self, address: int):
+        """Bring address into view (top row) and mark it."""
+        if not self.start <= address < self.start + self.count:
+            return
+        rows = -(-self.count // self.columns)
+        row = (address - self.start) // self.columns
+        self.canvas.yview_moveto(row / rows)
+
+        previous, self.marker = self.marker, address
+        if previous in self._cells:
+            self._paint(previous)
+        self._render()
+        if address in self._cells:
+            self._paint(address)
+
+    def reset(self):
+        self.values.clear()
+        for address in self._cells:
+            self._paint(address)
+
+    def _render(self):
+        first, count = self.visible_range()
+        wanted = range(first, first + count)
+
+        for address in [a for a in self._cells if a not in wanted]:
+            for item in self._cells.pop(address):
+                self.canvas.delete(item)
+
+        for address in wanted:
+            if address not in self._cells:
+                self._create_cell(address)
+
+        if (first, count) != self._view:
+            self._view = (first, count)
+            if self.on_view_change is not None:
+                self.on_view_change(first, count)
+
+    def _create_cell(self, address: int):
+        row, col = divmod(address - self.start, self.columns)
+        x0 = col * self.cell_width + 2
+        y0 = row * self.cell_height + 2
+        x1 = x0 + self.cell_width - 4
+        y1 = y0 + self.cell_height - 4
+
+        rect = self.canvas.create_rectangle(x0, y0, x1, y1, outline="black")
+        text = self.canvas.create_text((x0 + x1) / 2, (y0 + y1) / 2, font=("Arial", 8), justify=tk.CENTER)
+        self._cells[address] = (rect, text)
+        self._paint(address)
+
+    def _paint(self, address: int):
+        rect, text = self._cells[address]
+        fill, fg, label = self.style(address, self.values.get(address))
+        marked = address == self.marker
+        self.canvas.itemconfigure(rect, fill=fill, outline="blue" if marked else "black", width=3 if marked else 1)
+        self.canvas.itemconfigure(text, text=label, fill=fg)
+
+    def _on_scroll(self, *args):
+        self.canvas.yview(*args)
+        self._render()
+
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.canvas.yview_scroll(-1, "units")
+        else:
+            self.canvas.yview_scroll(1, "units")
+        self._render()
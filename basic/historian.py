@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import mmap
+import time
+import bisect
+import struct
+import threading
+from collections import OrderedDict
+from basic.plc_module import coalesce_ranges, words_to_int32
+
+# On-disk layout (one directory per tag):
+#   raw/<chunk_start>.bin   (timestamp, value) float64 pairs, one file per CHUNK_SECONDS
+#   rollup_<seconds>.bin    (bucket_start, min, max, avg, count) float64 records
+# Every file is append-only and sorted by time, so a range query is two
+# binary searches over a memory map and a slice.
+RAW_RECORD = struct.Struct("<dd")
+ROLLUP_RECORD = struct.Struct("<ddddd")
+ROLLUP_LEVELS = (1, 60, 3600)
+CHUNK_SECONDS = 3600
+
+TYPE_WORDS = {"int16": 1, "uint16": 1, "int32": 2, "bit": 1}
+
+
+class _Timestamps:
+    """Sequence view of the first field of every record, for bisect."""
+    def __init__(self, buffer, record: struct.Struct, count: int):
+        self.buffer = buffer
+        self.record = record
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.record.unpack_from(self.buffer, index * self.record.size)[0]
+
+
+def _read_records(path: str, record: struct.Struct, t0: float, t1: float) -> list:
+    """Records with t0 <= timestamp < t1 from one append-only file."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return []
+    count = size // record.size
+    if count == 0:
+        return []
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        stamps = _Timestamps(mm, record, count)
+        lo = bisect.bisect_left(stamps, t0)
+        hi = bisect.bisect_left(stamps, t1, lo)
+        return list(record.iter_unpack(mm[lo * record.size:hi * record.size]))
+
+
+class HistorianStore:
+    def __init__(self, path: str, flush_interval: float = 1.0, max_open_files: int = 256):
+        """Append-only time-series store with 1 s / 1 min / 1 h min-max-avg rollups."""
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_open_files = max_open_files
+        os.makedirs(path, exist_ok=True)
+
+        self._files = OrderedDict()   # file path -> open append handle, least recently used first
+        self._raw_chunks = {}         # tag -> path of the raw chunk being written
+        self._buckets = {}   # (tag, level) -> [bucket_start, min, max, sum, count]
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _tag_dir(self, tag: str) -> str:
+        return os.path.join(self.path, tag)
+
+    def _append(self, path: str, data: bytes):
+        handle = self._files.get(path)
+        if handle is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handle = self._files[path] = open(path, "ab")
+            # Files are append-only, so an evicted handle is simply reopened later
+            while len(self._files) > self.max_open_files:
+                self._files.popitem(last=False)[1].close()
+        else:
+            self._files.move_to_end(path)
+        handle.write(data)
+
+    def _close_file(self, path: str):
+        handle = self._files.pop(path, None)
+        if handle is not None:
+            handle.close()
+
+    def append_raw(self, tag: str, timestamp: float, value: float):
+        """Store one compressed (post-deadband) sample."""
+        chunk = int(timestamp // CHUNK_SECONDS) * CHUNK_SECONDS
+        path = os.path.join(self._tag_dir(tag), "raw", f"{chunk}.bin")
+        with self._lock:
+            previous = self._raw_chunks.get(tag)
+            if previous != path:
+                # A new hour: the previous chunk is complete
+                if previous is not None:
+                    self._close_file(previous)
+                self._raw_chunks[tag] = path
+            self._append(path, RAW_RECORD.pack(timestamp, value))
+
+    def add_to_rollups(self, tag: str, timestamp: float, value: float):
+        """Feed every acquired sample (before deadband) into the rollup buckets."""
+        with self._lock:
+            for level in ROLLUP_LEVELS:
+                start = timestamp - (timestamp % level)
+                bucket = self._buckets.get((tag, level))
+                if bucket is not None and bucket[0] != start:
+                    self._close_bucket(tag, level, bucket)
+                    bucket = None
+                if bucket is None:
+                    self._buckets[(tag, level)] = [start, value, value, value, 1]
+                else:
+                    bucket[1] = min(bucket[1], value)
+                    bucket[2] = max(bucket[2], value)
+                    bucket[3] += value
+                    bucket[4] += 1
+
+    def _close_bucket(self, tag: str, level: int, bucket: list):
+        start, vmin, vmax, total, count = bucket
+        path = os.path.join(self._tag_dir(tag), f"rollup_{level}.bin")
+        self._append(path, ROLLUP_RECORD.pack(start, vmin, vmax, total / count, count))
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            for handle in self._files.values():
+                handle.flush()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            for (tag, level), bucket in self._buckets.items():
+                self._close_bucket(tag, level, bucket)
+            self._buckets.clear()
+            for handle in self._files.values():
+                handle.close()
+            self._files.clear()
+            self._raw_chunks.clear()
+
+    def query_raw(self, tag: str, t0: float, t1: float) -> list:
+        """[(timestamp, value), ...] stored between t0 and t1."""
+        raw_dir = os.path.join(self._tag_dir(tag), "raw")
+        first = int(t0 // CHUNK_SECONDS) * CHUNK_SECONDS
+        rows = []
+        for chunk in range(first, int(t1) + 1, CHUNK_SECONDS):
+            rows.extend(_read_records(os.path.join(raw_dir, f"{chunk}.bin"), RAW_RECORD, t0, t1))
+        return rows
+
+    def query_rollup(self, tag: str, t0: float, t1: float, level: int) -> list:
+        """[(bucket_start, min, max, avg, count), ...] for closed buckets between t0 and t1."""
+        path = os.path.join(self._tag_dir(tag), f"rollup_{level}.bin")
+        return _read_records(path, ROLLUP_RECORD, t0 - (t0 % level), t1)
+
+    def query(self, tag: str, t0: float, t1: float, max_points: int = 2000):
+        """
+        Pick the finest resolution that keeps the answer under max_points.
+        Returns (level, rows); level 0 means raw samples.
+        """
+        span = max(t1 - t0, 0.0)
+        if span * 100 <= max_points:
+            # Raw samples are 100 Hz at most, so short windows fit the budget
+            return 0, self.query_raw(tag, t0, t1)
+        for level in ROLLUP_LEVELS:
+            if span / level <= max_points:
+                return level, self.query_rollup(tag, t0, t1, level)
+        return ROLLUP_LEVELS[-1], self.query_rollup(tag, t0, t1, ROLLUP_LEVELS[-1])
+
+
+class Historian:
+    def __init__(self, plc, tags: list, path: str, rate_hz: float = 10.0):
+        """
+        Logs configured tags from a PLCController into a HistorianStore.
+
+        tags: [{"name": "axis1_pos", "device": "D", "address": 5500,
+                "type": "int32", "deadband": 5, "heartbeat": 60}, ...]
+        type is int16 / uint16 / int32 (D) or bit (X, Y, M). A raw sample is
+        stored only when the value moves more than deadband from the last
+        stored one, or heartbeat seconds have passed. All tags are fetched
+        with the fewest ranged reads per cycle.
+        """
+        self.plc = plc
+        self.tags = tags
+        self.store = HistorianStore(path)
+        self.interval = 1.0 / min(rate_hz, 100.0)
+
+        self._last_stored = {}   # name -> (timestamp, value)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.cycle_count = 0
+        self.overruns = 0
+
+        self.reads = self._plan_reads()
+
+    def _plan_reads(self) -> list:
+        by_device = {}
+        for tag in self.tags:
+            device = tag["device"].upper()
+            words = TYPE_WORDS[tag.get("type", "bit" if device != "D" else "int16")]
+            by_device.setdefault(device, []).append((tag["address"], words))
+
+        reads = []
+        for device, spans in by_device.items():
+            limit = self.plc.MAX_READ_REGS if device == "D" else self.plc.MAX_READ_BITS
+            reads.extend((device, start, count) for start, count in coalesce_ranges(spans, limit))
+        return reads
+
+    def sample(self):
+        """One acquisition cycle: ranged reads, decode, deadband, store."""
+        now = time.time()
+        data = {}
+        for device, start, count in self.reads:
+            values, ok = self.plc.read_device_range(device, start, count)
+            if not ok:
+                return False
+            for i, value in enumerate(values):
+                data[(device, start + i)] = value
+
+        for tag in self.tags:
+            device = tag["device"].upper()
+            address = tag["address"]
+            kind = tag.get("type", "bit" if device != "D" else "int16")
+            if kind == "int32":
+                value = words_to_int32(data[(device, address)], data[(device, address + 1)])
+            elif kind == "int16":
+                value = data[(device, address)]
+                if value > 32767:
+                    value -= 65536
+            else:
+                value = int(data[(device, address)])
+
+            self.store.add_to_rollups(tag["name"], now, value)
+
+            last = self._last_stored.get(tag["name"])
+            if (last is None or abs(value - last[1]) > tag.get("deadband", 0)
+                    or now - last[0] >= tag.get("heartbeat", 60.0)):
+                self.store.append_raw(tag["name"], now, value)
+                self._last_stored[tag["name"]] = (now, value)
+
+        self.store.maybe_flush()
+        self.cycle_count += 1
+        return True
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="Historian", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+        self.store.close()
+
+    def _run(self):
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            self.sample()
+            next_time += self.interval
+            remaining = next_time - time.monotonic()
+            if remaining > 0:
+                self._stop_event.wait(remaining)
+            else:
+                # Fell behind: skip the missed slots instead of bursting
+                self.overruns += 1
+                next_time = time.monotonic()
+
+
+if __name__ == "__main__":
+    from basic.plc_module import PLCController
+
+    # python -m basic.historian config.json
+    # {"ip": "192.168.3.250", "path": "history", "rate_hz": 100, "tags": [...]}
+    with open(sys.argv[1]) as f:
+        config = json.load(f)
+
+    plc = PLCController(config_print=False)
+    if not plc.plcConnect(config.get("ip", "192.168.3.250"), config.get("port", 502)):
+        sys.exit("Connection failed. Please check IP address or LAN cable.")
+
+    historian = Historian(plc, config["tags"], config.get("path", "history"), config.get("rate_hz", 10.0))
+    print(f"Logging {len(historian.tags)} tags with {len(historian.reads)} ranged reads per cycle. Ctrl+C to stop.")
+    historian.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        historian.stop()
+        plc.plcDisconnect()
+        print(f"Stopped after {historian.cycle_count} cycles ({historian.overruns} overruns).")
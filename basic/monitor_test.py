@@ -1,8 +1,15 @@
+import queue
 import tkinter as tk
 from tkinter import messagebox
 from basic.plc_module import PLCController
+from basic.adaptive_poller import AdaptivePoller
+from basic.device_grid import DeviceGrid
+from basic.device_browser import DeviceBrowser
 
 class PLCMonitorGUI:
+    # UI frame period; PLC reads run on the poller thread at the refresh rate
+    FRAME_MS = 30
+
     def __init__(self, root):
         self.root = root
         self.root.title("PLC Modbus Monitor")
@@ -11,15 +18,13 @@ class PLCMonitorGUI:
         # Initialize PLC with config_print=False to avoid flooding the console
         self.plc = PLCController(config_print=False)
         self.is_connected = False
-        
-        self.x_labels = []
-        self.y_labels = []
-        self.m_labels = {}
-        self.d_labels = {}
+        # The refresh setting is the fastest rate; ranges that stay static back off
+        self.poller = AdaptivePoller(self.plc, interval=0.5, max_interval=2.0)
         
         self.blink_state = False
         
         self.create_widgets()
+        self.grids = {"X": self.x_grid, "Y": self.y_grid, "M": self.m_grid, "D": self.d_grid}
         self.update_data()
 
     def create_widgets(self):
@@ -71,54 +76,57 @@ class PLCMonitorGUI:
         self.d_end.pack(side=tk.LEFT, padx=2)
         
         tk.Button(setting_frame, text="Update M, D", command=self.build_dynamic_grids).pack(side=tk.LEFT, padx=10)
+        tk.Button(setting_frame, text="Device Browser", command=self.open_browser).pack(side=tk.LEFT, padx=5)
 
         # --- 3. Display Grids ---
+        # Canvas grids only draw the visible cells, so large M/D ranges stay cheap
         x_frame = tk.LabelFrame(self.root, text="Input (X0 - X15)", padx=10, pady=10)
         x_frame.pack(fill=tk.X, padx=10, pady=5)
-        for i in range(16):
-            lbl = tk.Label(x_frame, text=f"X{i}", width=6, bg="gray", fg="white", relief=tk.RAISED)
-            lbl.grid(row=i//8, column=i%8, padx=2, pady=2)
-            self.x_labels.append(lbl)
+        self.x_grid = DeviceGrid(x_frame, style=bit_style("X", "green"), columns=8, visible_rows=2)
+        self.x_grid.pack(fill=tk.X)
+        self.x_grid.set_range(0, 16)
 
         y_frame = tk.LabelFrame(self.root, text="Output (Y0 - Y15)", padx=10, pady=10)
         y_frame.pack(fill=tk.X, padx=10, pady=5)
-        for i in range(16):
-            lbl = tk.Label(y_frame, text=f"Y{i}", width=6, bg="gray", fg="white", relief=tk.RAISED)
-            lbl.grid(row=i//8, column=i%8, padx=2, pady=2)
-            self.y_labels.append(lbl)
+        self.y_grid = DeviceGrid(y_frame, style=bit_style("Y", "red"), columns=8, visible_rows=2)
+        self.y_grid.pack(fill=tk.X)
+        self.y_grid.set_range(0, 16)
 
         self.m_frame = tk.LabelFrame(self.root, text="Relay (M)", padx=10, pady=10)
         self.m_frame.pack(fill=tk.X, padx=10, pady=5)
-        
+        self.m_grid = DeviceGrid(self.m_frame, style=bit_style("M", "orange"), columns=10, visible_rows=2)
+        self.m_grid.pack(fill=tk.X)
+
         self.d_frame = tk.LabelFrame(self.root, text="Data Register (D)", padx=10, pady=10)
         self.d_frame.pack(fill=tk.X, padx=10, pady=5)
-        
+        self.d_grid = DeviceGrid(self.d_frame, style=word_style("D"), columns=10, visible_rows=3)
+        self.d_grid.pack(fill=tk.X)
+
+        self.poller.set_group("X", "X", 0, 16, critical=True)
+        self.poller.set_group("Y", "Y", 0, 16, critical=True)
         self.build_dynamic_grids()
+        # A change in the M range (e.g. a DDRVI trigger) brings the D range back to full rate
+        self.poller.link("M", "D")
 
     def build_dynamic_grids(self):
-        for widget in self.m_frame.winfo_children(): widget.destroy()
-        for widget in self.d_frame.winfo_children(): widget.destroy()
-        self.m_labels.clear()
-        self.d_labels.clear()
-        
         try:
             a, b = int(self.m_start.get()), int(self.m_end.get())
             c, d = int(self.d_start.get()), int(self.d_end.get())
-            
-            # Loop for M labels
-            for i in range(a, b + 1):
-                lbl = tk.Label(self.m_frame, text=f"M{i}", width=6, bg="gray", fg="white", relief=tk.RAISED)
-                lbl.pack(side=tk.LEFT, padx=2)
-                self.m_labels[i] = lbl
-                
-            # Loop for D labels
-            for i in range(c, d + 1):
-                lbl = tk.Label(self.d_frame, text=f"D{i}\n0", width=8, bg="white", fg="black", relief=tk.SUNKEN)
-                lbl.pack(side=tk.LEFT, padx=2)
-                self.d_labels[i] = lbl
-                
+            if b < a or d < c:
+                raise ValueError
         except ValueError:
             messagebox.showerror("Error", "Please enter valid integers for start and end ranges.")
+            return
+
+        self.m_grid.set_range(a, b - a + 1)
+        self.d_grid.set_range(c, d - c + 1)
+        # Each range is a single ranged read per cycle in the poller thread
+        self.poller.set_group("M", "M", a, b - a + 1)
+        self.poller.set_group("D", "D", c, d - c + 1)
+
+    def open_browser(self):
+        # Shares this PLC connection; the browser polls only the pages in view
+        DeviceBrowser(tk.Toplevel(self.root), self.plc)
 
     def toggle_connect(self):
         if not self.is_connected:
@@ -126,9 +134,11 @@ class PLCMonitorGUI:
             if self.plc.plcConnect(ip):
                 self.is_connected = True
                 self.btn_connect.config(text="Disconnect", bg="green", fg="white")
+                self.poller.start()
             else:
                 messagebox.showerror("Connection Error", "Failed to connect to PLC.")
         else:
+            self.poller.stop()
             self.plc.plcDisconnect()
             self.is_connected = False
             self.btn_connect.config(text="Connect", bg="lightgray", fg="black")
@@ -136,49 +146,60 @@ class PLCMonitorGUI:
             self.reset_colors()
 
     def reset_colors(self):
-        for lbl in self.x_labels + self.y_labels + list(self.m_labels.values()):
-            lbl.config(bg="gray")
-        for i, lbl in self.d_labels.items():
-            lbl.config(text=f"D{i}\n0")
+        # Drop anything the poller queued before it was stopped
+        self.drain_changes()
+        for grid in self.grids.values():
+            grid.reset()
+
+    def drain_changes(self) -> tuple[dict, int]:
+        pending = {}
+        cycles = 0
+        while True:
+            try:
+                name, payload = self.poller.changes.get_nowait()
+            except queue.Empty:
+                return pending, cycles
+            if name == "cycle":
+                cycles += 1
+            else:
+                pending.setdefault(name, {}).update(payload)
 
     def update_data(self):
         try:
             refresh_rate = int(self.refresh_entry.get())
-            if refresh_rate < 50: refresh_rate = 50 
+            if refresh_rate < 50: refresh_rate = 50
         except ValueError:
             refresh_rate = 500
+        self.poller.interval = refresh_rate / 1000.0
 
+        # Apply every change that arrived since the last frame in one batch
+        pending, cycles = self.drain_changes()
         if self.is_connected:
-            # 1. Read X0-X15
-            for i in range(16):
-                val, ok = self.plc.read_input(i)
-                if ok: self.x_labels[i].config(bg="green" if val else "gray")
-                
-            # 2. Read Y0-Y15 (Using read_Y)
-            for i in range(16):
-                val, ok = self.plc.read_Y(i)
-                if ok: self.y_labels[i].config(bg="red" if val else "gray")
-                
-            # 3. Read M (Using read_M)
-            for addr, lbl in self.m_labels.items():
-                val, ok = self.plc.read_M(addr) 
-                if ok: lbl.config(bg="orange" if val else "gray")
-                
-            # 4. Read D (Handling Signed 16-bit)
-            for addr, lbl in self.d_labels.items():
-                val, ok = self.plc.read_holding(addr)
-                if ok:
-                    int_val = int(val)
-                    if int_val > 32767:
-                        int_val -= 65536
-                    lbl.config(text=f"D{addr}\n{int_val}")
-
-            self.blink_state = not self.blink_state
-            self.status_led.config(bg="yellow" if self.blink_state else "gray")
-
-        # Re-schedule the update
-        self.root.after(refresh_rate, self.update_data)
-            
+            for name, changes in pending.items():
+                self.grids[name].apply(changes)
+
+            if cycles:
+                self.blink_state = not self.blink_state
+                self.status_led.config(bg="yellow" if self.blink_state else "gray")
+
+        self.root.after(self.FRAME_MS, self.update_data)
+
+
+def bit_style(prefix: str, on_color: str):
+    def style(address, value):
+        return (on_color if value else "gray"), "white", f"{prefix}{address}"
+    return style
+
+
+def word_style(prefix: str):
+    def style(address, value):
+        # Handling Signed 16-bit
+        int_val = int(value or 0)
+        if int_val > 32767:
+            int_val -= 65536
+        return "white", "black", f"{prefix}{address}\n{int_val}"
+    return style
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = PLCMonitorGUI(root)
@@ -0,0 +1,196 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import csv
+import time
+import struct
+import argparse
+from basic.plc_module import PLCController
+
+# Binary image: MAGIC, then per section a header (device, start, count)
+# followed by uint16 little-endian words (D) or packed bits (X/Y/M, LSB first)
+MAGIC = b"PLCIMG1\0"
+SECTION = struct.Struct("<cII")
+
+
+def parse_range(spec: str) -> tuple[str, int, int]:
+    """"D0-7999" or "D0-D7999" -> ("D", 0, 8000); "M100" -> ("M", 100, 1)."""
+    device = spec[:1].upper()
+    if not device or device not in "XYMD":
+        raise ValueError(f"Unknown device in '{spec}'. Use X, Y, M or D.")
+    start, _, end = spec[1:].partition("-")
+    end = end.strip()
+    if end[:1].isalpha():
+        if end[:1].upper() != device:
+            raise ValueError(f"Invalid range: '{spec}' mixes devices {device} and {end[:1].upper()}")
+        end = end[1:]
+    try:
+        start = int(start)
+        end = int(end) if end else start
+    except ValueError:
+        raise ValueError(f"Invalid range: '{spec}'. Use e.g. D0-7999 or D0-D7999.") from None
+    if end < start:
+        raise ValueError(f"Invalid range: '{spec}'")
+    return device, start, end - start + 1
+
+
+def read_sections(plc: PLCController, ranges: list) -> list:
+    """[(device, start, values), ...]; each range streams as maximal Modbus frames."""
+    sections = []
+    total = 0
+    started = time.perf_counter()
+    for device, start, count in ranges:
+        values, ok = plc.read_device_range(device, start, count)
+        if not ok:
+            raise IOError(f"Read failed for {device}{start}-{device}{start + count - 1}")
+        sections.append((device, start, values))
+        total += count
+    report_throughput("Read", total, time.perf_counter() - started)
+    return sections
+
+
+def write_sections(plc: PLCController, sections: list):
+    writers = {"Y": plc.write_Y_range, "M": plc.write_M_range, "D": plc.write_holding_range}
+    total = 0
+    started = time.perf_counter()
+    for device, start, values in sections:
+        writer = writers.get(device)
+        if writer is None:
+            print(f"   Skipping {device}{start}-{device}{start + len(values) - 1}: inputs are read-only")
+            continue
+        if not writer(start, values):
+            raise IOError(f"Write failed for {device}{start}-{device}{start + len(values) - 1}")
+        total += len(values)
+    report_throughput("Wrote", total, time.perf_counter() - started)
+
+
+def report_throughput(action: str, count: int, seconds: float):
+    rate = count / seconds if seconds > 0 else float("inf")
+    print(f"   {action} {count} devices in {seconds:.3f} s ({rate:,.0f} devices/s)")
+
+
+def save_image(path: str, sections: list):
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["device", "address", "value"])
+            for device, start, values in sections:
+                for i, value in enumerate(values):
+                    writer.writerow([device, start + i, int(value)])
+        return
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        for device, start, values in sections:
+            f.write(SECTION.pack(device.encode(), start, len(values)))
+            if device == "D":
+                f.write(struct.pack(f"<{len(values)}H", *values))
+            else:
+                packed = bytearray((len(values) + 7) // 8)
+                for i, bit in enumerate(values):
+                    if bit:
+                        packed[i >> 3] |= 1 << (i & 7)
+                f.write(bytes(packed))
+
+
+def load_image(path: str) -> list:
+    if path.lower().endswith(".csv"):
+        # Consecutive addresses of one device are merged back into sections
+        sections = []
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                device, address = row["device"].upper(), int(row["address"])
+                value = int(row["value"])
+                value = bool(value) if device != "D" else value
+                if sections and sections[-1][0] == device and sections[-1][1] + len(sections[-1][2]) == address:
+                    sections[-1][2].append(value)
+                else:
+                    sections.append((device, address, [value]))
+        return sections
+
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"'{path}' is not a PLC image file")
+
+    sections = []
+    pos = len(MAGIC)
+    while pos < len(data):
+        device, start, count = SECTION.unpack_from(data, pos)
+        device = device.decode()
+        pos += SECTION.size
+        if device == "D":
+            values = list(struct.unpack_from(f"<{count}H", data, pos))
+            pos += 2 * count
+        else:
+            values = [bool(data[pos + (i >> 3)] >> (i & 7) & 1) for i in range(count)]
+            pos += (count + 7) // 8
+        sections.append((device, start, values))
+    return sections
+
+
+def diff_sections(saved: list, live: list) -> list:
+    """[(device, address, saved_value, live_value), ...] where they differ."""
+    diffs = []
+    for (device, start, old_values), (_, _, new_values) in zip(saved, live):
+        for i, (old, new) in enumerate(zip(old_values, new_values)):
+            if int(old) != int(new):
+                diffs.append((device, start + i, int(old), int(new)))
+    return diffs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dump, restore and compare PLC memory ranges.")
+    parser.add_argument("--ip", default="192.168.3.250")
+    parser.add_argument("--port", type=int, default=502)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    dump = sub.add_parser("dump", help="Read ranges into an image file (.csv or binary)")
+    dump.add_argument("ranges", nargs="+", help="e.g. D0-7999 M0-7679 Y0-15")
+    dump.add_argument("-o", "--output", required=True)
+
+    restore = sub.add_parser("restore", help="Write an image file back to the PLC")
+    restore.add_argument("image")
+
+    diff = sub.add_parser("diff", help="Compare the live PLC against an image file")
+    diff.add_argument("image")
+    diff.add_argument("--limit", type=int, default=50, help="Differences to print (default: 50)")
+
+    args = parser.parse_args(argv)
+
+    plc = PLCController(config_print=False)
+    if not plc.plcConnect(args.ip, port=args.port):
+        print("Connection failed. Please check IP address or LAN cable.")
+        return 2
+
+    try:
+        if args.command == "dump":
+            sections = read_sections(plc, [parse_range(spec) for spec in args.ranges])
+            save_image(args.output, sections)
+            print(f"   Saved {len(sections)} ranges to {args.output}")
+            return 0
+
+        saved = load_image(args.image)
+        if args.command == "restore":
+            write_sections(plc, saved)
+            return 0
+
+        live = read_sections(plc, [(device, start, len(values)) for device, start, values in saved])
+        diffs = diff_sections(saved, live)
+        for device, address, old, new in diffs[:args.limit]:
+            print(f"   {device}{address}: image={old} live={new}")
+        if len(diffs) > args.limit:
+            print(f"   ... {len(diffs) - args.limit} more")
+        print(f"   {len(diffs)} differences")
+        return 1 if diffs else 0
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        return 2
+    finally:
+        plc.plcDisconnect()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import time
+import threading
+
+
+class _Flight:
+    def __init__(self, started: float):
+        self.started = started
+        self.event = threading.Event()
+        self.result = None
+        self.stale = False   # set when a write overlaps while the read is in flight
+
+
+def _copy(result):
+    """A caller's own copy of a cached (value, ok), so mutating it cannot touch the cache."""
+    if result is not None and isinstance(result[0], list):
+        return list(result[0]), result[1]
+    return result
+
+
+class ReadCache:
+    def __init__(self, default_ttl: float = 0.0, device_ttl: dict = None, tag_ttl: dict = None):
+        """
+        Read-through cache for PLCController with single-flight requests.
+
+        TTLs (seconds) are looked up per tag first ({"M110": 0.0}), then per
+        device class ({"D": 0.1, "M": 0.02}), then default_ttl. Entries are
+        keyed by Modbus space and span, so a write to any address inside a
+        cached range invalidates it.
+        """
+        self.default_ttl = default_ttl
+        self.device_ttl = {k.upper(): v for k, v in (device_ttl or {}).items()}
+        self.tag_ttl = {}
+        for tag, ttl in (tag_ttl or {}).items():
+            self.tag_ttl[(tag[0].upper(), int(tag[1:]))] = ttl
+
+        self._entries = {}   # key -> (timestamp, result)
+        self._flights = {}   # key -> _Flight
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+
+    def ttl_for(self, device: str, address: int, count: int = 1) -> float:
+        """Shortest TTL that applies to any tag in the range."""
+        ttl = self.device_ttl.get(device, self.default_ttl)
+        for (tag_device, tag_address), tag_ttl in self.tag_ttl.items():
+            if tag_device == device and address <= tag_address < address + count:
+                ttl = min(ttl, tag_ttl)
+        return ttl
+
+    def read(self, key: tuple, max_age: float, loader):
+        """
+        Return a cached result no older than max_age, join an identical
+        request already in flight, or call loader() once for everyone.
+        key is (space, modbus_address, count, kind); loader returns (value, ok).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= max_age:
+                self.hits += 1
+                return _copy(entry[1])
+
+            flight = self._flights.get(key)
+            # Only join a request that was sent recently enough to satisfy max_age
+            if flight is not None and now - flight.started <= max_age:
+                self.joined += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight(now)
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            flight.event.wait()
+            return _copy(flight.result)
+
+        try:
+            flight.result = loader()
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                if flight.result is not None and flight.result[1] and not flight.stale:
+                    # Age is counted from when the request was sent, not when it returned
+                    self._entries[key] = (flight.started, flight.result)
+            flight.event.set()
+        return _copy(flight.result)
+
+    def invalidate(self, space: str, modbus_address: int, count: int = 1):
+        """Drop every entry (and mark every in-flight read) overlapping the written span."""
+        end = modbus_address + count
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == space and k[1] < end and modbus_address < k[1] + k[2]]:
+                del self._entries[key]
+            # In-flight reads may return pre-write data: their waiters still get it,
+            # but the flight is retired so readers arriving from now on start afresh
+            for key in [k for k in self._flights if k[0] == space and k[1] < end and modbus_address < k[1] + k[2]]:
+                self._flights.pop(key).stale = True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "joined": self.joined, "entries": len(self._entries)}
@@ -0,0 +1,608 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import json
+import time
+import queue
+import socket
+import argparse
+import itertools
+import threading
+import socketserver
+from basic.plc_module import PLCController, coalesce_ranges
+from basic.adaptive_poller import AdaptivePoller
+
+# Protocol: one JSON object per line in each direction, over a local TCP socket.
+#   {"id": 1, "op": "read", "device": "D", "address": 100, "count": 4}
+#   {"id": 2, "op": "write", "device": "M", "address": 110, "values": [false, false]}
+#   {"id": 3, "op": "subscribe", "device": "M", "address": 100, "count": 12, "interval": 0.1}
+#   {"id": 4, "op": "unsubscribe", "sub": 1}
+#   {"id": 5, "op": "stats"}
+# Replies carry the request id: {"id": 1, "ok": true, "values": [...]}; subscriptions
+# push {"event": "update", "sub": 1, "changes": {"100": true}} whenever values change.
+DEFAULT_PORT = 5020
+
+# Same mapping as PLCController defaults, used to turn Modbus addresses back into devices
+OFFSET_M = 8192
+
+
+def validate_request(request: dict) -> dict:
+    """
+    Checked copy of a read / write / subscribe request. Raises ValueError for
+    anything the PLC layer would choke on, so one bad client cannot take
+    down the shared batcher or poller thread.
+    """
+    op = request.get("op")
+    device = request.get("device")
+    if not isinstance(device, str) or device.upper() not in ("X", "Y", "M", "D"):
+        raise ValueError(f"unknown device {device!r}; use X, Y, M or D")
+    device = device.upper()
+    address = request.get("address")
+    if not isinstance(address, int) or isinstance(address, bool) or address < 0:
+        raise ValueError(f"address must be a non-negative integer, got {address!r}")
+
+    checked = dict(request, device=device)
+    if op == "write":
+        if device == "X":
+            raise ValueError("X is read-only")
+        values = request.get("values")
+        if not isinstance(values, list) or not values:
+            raise ValueError("values must be a non-empty list")
+        if not all(isinstance(v, (int, bool)) for v in values):
+            raise ValueError("values must be integers or booleans")
+        count = len(values)
+    else:
+        count = request.get("count")
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            raise ValueError(f"count must be a positive integer, got {count!r}")
+    if address + count > 0x10000:
+        raise ValueError("range runs past the end of the Modbus address space")
+    return checked
+
+
+class RequestBatcher:
+    def __init__(self, plc: PLCController, window: float = 0.005):
+        """
+        รวม request ของทุก client ที่เข้ามาในช่วง window เดียวกันเป็น ranged Modbus operation
+
+        Writes in a batch are applied first, in arrival order (a later value
+        for the same address wins), as contiguous range writes. Reads are
+        then merged per device with coalesce_ranges, so requests for
+        neighbouring addresses share one frame.
+        """
+        self.plc = plc
+        self.window = window
+        self.requests = 0
+        self.batches = 0
+        self.frames = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="RequestBatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, request: dict, reply):
+        """reply(response_dict) is called once, from the batcher thread."""
+        answered = threading.Event()
+        def reply_once(response):
+            if not answered.is_set():
+                answered.set()
+                reply(response)
+        self._queue.put((request, reply_once))
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._execute_safely(batch)
+                    return
+                batch.append(item)
+            self._execute_safely(batch)
+
+    def _execute_safely(self, batch: list):
+        # A failure fails this batch's replies only; the thread keeps serving
+        try:
+            self._execute(batch)
+        except Exception as e:
+            print(f"[RequestBatcher] batch of {len(batch)} failed: {e}")
+            for _, reply in batch:
+                reply({"ok": False, "error": f"batch failed: {e}"})
+
+    def _limit(self, device: str) -> int:
+        return self.plc.MAX_READ_REGS if device == "D" else self.plc.MAX_READ_BITS
+
+    def _execute(self, batch: list):
+        self.requests += len(batch)
+        self.batches += 1
+        writes = [(req, reply) for req, reply in batch if req["op"] == "write"]
+        reads = [(req, reply) for req, reply in batch if req["op"] == "read"]
+        if writes:
+            self._execute_writes(writes)
+        if reads:
+            self._execute_reads(reads)
+
+    def _execute_writes(self, writes: list):
+        writers = {"Y": self.plc.write_Y_range, "M": self.plc.write_M_range, "D": self.plc.write_holding_range}
+        merged = {}   # device -> {address: value}
+        for req, reply in writes:
+            if req["device"] not in writers:
+                reply({"ok": False, "error": f"{req['device']} is read-only"})
+                continue
+            cells = merged.setdefault(req["device"], {})
+            for i, value in enumerate(req["values"]):
+                cells[req["address"] + i] = value
+
+        failed = set()   # (device, address) of runs that failed
+        for device, cells in merged.items():
+            addrs = sorted(cells)
+            run_start = addrs[0]
+            for prev, addr in zip(addrs, addrs[1:] + [None]):
+                if addr == prev + 1:
+                    continue
+                values = [cells[a] for a in range(run_start, prev + 1)]
+                self.frames += -(-len(values) // (self.plc.MAX_WRITE_REGS if device == "D" else self.plc.MAX_WRITE_BITS))
+                if not writers[device](run_start, values):
+                    failed.update((device, a) for a in range(run_start, prev + 1))
+                run_start = addr
+
+        for req, reply in writes:
+            if req["device"] in writers:
+                ok = not any((req["device"], req["address"] + i) in failed for i in range(len(req["values"])))
+                reply({"ok": ok} if ok else {"ok": False, "error": "write failed"})
+
+    def _execute_reads(self, reads: list):
+        by_device = {}
+        for req, reply in reads:
+            by_device.setdefault(req["device"], []).append((req, reply))
+
+        for device, items in by_device.items():
+            limit = self._limit(device)
+            for start, count in coalesce_ranges([(req["address"], req["count"]) for req, _ in items], limit):
+                values, ok = self.plc.read_device_range(device, start, count)
+                self.frames += -(-count // limit)
+                served = set()
+                for item in items:
+                    req, reply = item
+                    offset = req["address"] - start
+                    if not (0 <= offset and offset + req["count"] <= count):
+                        continue
+                    served.add(id(item))
+                    if ok:
+                        reply({"ok": True, "values": values[offset:offset + req["count"]]})
+                    else:
+                        reply({"ok": False, "error": "read failed"})
+                # Identical large spans are read once per copy; each request is answered once
+                items = [item for item in items if id(item) not in served]
+
+
+class _Session:
+    def __init__(self, sock, max_pending: int = 1000):
+        """
+        Outgoing messages go through a bounded queue drained by the session's
+        own writer thread, so the batcher and fan-out threads never block on
+        a slow client. A client that lets max_pending messages pile up is
+        disconnected instead of stalling everyone else.
+        """
+        self.sock = sock
+        self.subs = set()
+        self.closed = False
+        self._outbox = queue.Queue(maxsize=max_pending)
+        self._writer = threading.Thread(target=self._write_loop, name="GatewaySession", daemon=True)
+        self._writer.start()
+
+    def send(self, message: dict):
+        if self.closed:
+            return
+        try:
+            self._outbox.put_nowait((json.dumps(message) + "\n").encode())
+        except queue.Full:
+            print("[PLCGateway] client is not reading its replies; disconnecting it")
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # Unblocks both the handler's read loop and a writer stuck in sendall
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self._outbox.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _write_loop(self):
+        while not self.closed:
+            data = self._outbox.get()
+            if data is None:
+                return
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self.close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        gateway = self.server.gateway
+        session = _Session(self.connection)
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    session.send({"ok": False, "error": "invalid JSON"})
+                    continue
+                gateway.handle(session, request)
+        except OSError:
+            pass
+        finally:
+            session.close()
+            gateway.drop_session(session)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class PLCGateway:
+    def __init__(self, plc: PLCController, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 window: float = 0.005, poll_interval: float = 0.1):
+        """
+        One process that owns the PLC connection for every local tool.
+
+        Reads and writes from all clients go through one RequestBatcher.
+        Subscriptions to the same range share one AdaptivePoller group;
+        its changes are pushed to every subscriber of that range.
+        """
+        self.plc = plc
+        self.batcher = RequestBatcher(plc, window)
+        self.poller = AdaptivePoller(plc, interval=poll_interval)
+
+        self._server = _Server((host, port), _Handler)
+        self._server.gateway = self
+        self.address = self._server.server_address
+
+        self._subs = {}     # sub id -> (session, group, interval)
+        self._groups = {}   # group name -> set of sub ids
+        self._active = set()   # sub ids whose snapshot has been sent
+        self._known = {}    # sub id -> {address: value} as last sent to that subscriber
+        self._sub_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        self.poller.start()
+        for target, name in ((self._server.serve_forever, "GatewayServer"), (self._fan_out, "GatewayFanOut")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.poller.stop()
+        self.poller.changes.put(None)
+        for thread in self._threads:
+            thread.join()
+        self.batcher.stop()
+
+    def handle(self, session: _Session, request: dict):
+        request_id = request.get("id")
+        reply = lambda response: session.send(dict(response, id=request_id))
+        op = request.get("op")
+        try:
+            if op in ("read", "write"):
+                self.batcher.submit(validate_request(request), reply)
+            elif op == "subscribe":
+                self._subscribe(session, request, reply)
+            elif op == "unsubscribe":
+                self._unsubscribe(request["sub"])
+                reply({"ok": True})
+            elif op == "stats":
+                reply({"ok": True, "requests": self.batcher.requests, "batches": self.batcher.batches,
+                       "frames": self.batcher.frames, "subscriptions": len(self._subs)})
+            else:
+                reply({"ok": False, "error": f"unknown op '{op}'"})
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            reply({"ok": False, "error": f"bad request: {e}"})
+
+    def _subscribe(self, session: _Session, request: dict, reply):
+        request = validate_request(request)
+        device, address, count = request["device"], request["address"], request["count"]
+        interval = float(request.get("interval", self.poller.interval))
+        if not interval > 0:
+            raise ValueError(f"interval must be positive, got {interval!r}")
+        group = f"{device}{address}:{count}"
+
+        with self._lock:
+            sub = next(self._sub_ids)
+            self._subs[sub] = (session, group, interval)
+            subscribers = self._groups.setdefault(group, set())
+            subscribers.add(sub)
+            session.subs.add(sub)
+            fastest = min(self._subs[s][2] for s in subscribers)
+            # A subscriber asked for this interval, so quiet ranges must not back off past it
+            if len(subscribers) == 1:
+                self.poller.set_group(group, device, address, count, min_interval=fastest, max_interval=fastest)
+            else:
+                self.poller.set_rate(group, min_interval=fastest, max_interval=fastest)
+
+        # The reply carries a full snapshot; later pushes carry only changes against
+        # what this subscriber was last sent, and are queued after the snapshot.
+        # The group's next poll reports every value, so a change that landed
+        # between the snapshot read and now is still pushed.
+        def snapshot(response):
+            reply(dict(response, sub=sub))
+            if not response["ok"]:
+                self._unsubscribe(sub)
+                return
+            with self._lock:
+                if sub in self._subs:
+                    self._known[sub] = {address + i: v for i, v in enumerate(response["values"])}
+                    self._active.add(sub)
+                    self.poller.refresh(group)
+        self.batcher.submit({"op": "read", "device": device, "address": address, "count": count}, snapshot)
+
+    def _unsubscribe(self, sub: int):
+        with self._lock:
+            entry = self._subs.pop(sub, None)
+            if entry is None:
+                return
+            session, group, _ = entry
+            session.subs.discard(sub)
+            self._active.discard(sub)
+            self._known.pop(sub, None)
+            subscribers = self._groups[group]
+            subscribers.discard(sub)
+            if not subscribers:
+                del self._groups[group]
+                self.poller.remove_group(group)
+            else:
+                fastest = min(self._subs[s][2] for s in subscribers)
+                self.poller.set_rate(group, min_interval=fastest, max_interval=fastest)
+
+    def drop_session(self, session: _Session):
+        for sub in list(session.subs):
+            self._unsubscribe(sub)
+
+    def _fan_out(self):
+        while True:
+            item = self.poller.changes.get()
+            if item is None:
+                return
+            group, changes = item
+            if group == "cycle":
+                continue
+            targets = []
+            with self._lock:
+                for sub in self._groups.get(group, ()):
+                    if sub not in self._active:
+                        continue
+                    known = self._known[sub]
+                    payload = {str(address): value for address, value in changes.items() if known.get(address) != value}
+                    if payload:
+                        known.update(changes)
+                        targets.append((sub, self._subs[sub][0], payload))
+            for sub, session, payload in targets:
+                session.send({"event": "update", "sub": sub, "changes": payload})
+
+
+class GatewayResponse:
+    def __init__(self, bits=None, registers=None, error: str = None):
+        self.bits = bits or []
+        self.registers = registers or []
+        self.error = error
+
+    def isError(self) -> bool:
+        return self.error is not None
+
+
+class GatewayClient:
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, timeout: float = 3.0):
+        """
+        Client for PLCGateway. Requests from several threads are pipelined on
+        one socket, so they can land in the same gateway batch.
+
+        It also has the pymodbus calls PLCController uses, so an existing tool
+        moves onto the gateway with one argument:
+            PLCController(client_factory=lambda ip, port: GatewayClient())
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending = {}        # request id -> [Event, response, on_reply]
+        self._callbacks = {}      # sub id -> callback(changes)
+        self._lock = threading.Lock()
+        self._reader = None
+
+    def connect(self) -> bool:
+        try:
+            self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self._sock.settimeout(None)
+        except OSError:
+            self._sock = None
+            return False
+        self._reader = threading.Thread(target=self._read_loop, name="GatewayClient", daemon=True)
+        self._reader.start()
+        return True
+
+    def close(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def is_socket_open(self) -> bool:
+        return self._sock is not None
+
+    def request(self, op: str, on_reply=None, **fields) -> dict:
+        """on_reply(response) runs on the reader thread before any later message is handled."""
+        request_id = next(self._ids)
+        waiter = [threading.Event(), None, on_reply]
+        with self._lock:
+            self._pending[request_id] = waiter
+        try:
+            data = (json.dumps(dict(fields, id=request_id, op=op)) + "\n").encode()
+            with self._send_lock:
+                if self._sock is None:
+                    return {"ok": False, "error": "not connected"}
+                self._sock.sendall(data)
+            if not waiter[0].wait(self.timeout):
+                return {"ok": False, "error": "timeout"}
+            return waiter[1]
+        except OSError as e:
+            return {"ok": False, "error": str(e)}
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    def _read_loop(self):
+        sock = self._sock
+        try:
+            for line in sock.makefile("rb"):
+                message = json.loads(line)
+                if message.get("event") == "update":
+                    callback = self._callbacks.get(message["sub"])
+                    if callback is not None:
+                        callback({int(k): v for k, v in message["changes"].items()})
+                    continue
+                with self._lock:
+                    waiter = self._pending.get(message.get("id"))
+                if waiter is not None:
+                    if waiter[2] is not None:
+                        waiter[2](message)
+                    waiter[1] = message
+                    waiter[0].set()
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._sock = None
+            with self._lock:
+                for waiter in self._pending.values():
+                    waiter[1] = {"ok": False, "error": "connection closed"}
+                    waiter[0].set()
+
+    # --- device-level API ---
+    def read(self, device: str, address: int, count: int = 1) -> tuple[list, bool]:
+        response = self.request("read", device=device, address=address, count=count)
+        return response.get("values", []), response["ok"]
+
+    def write(self, device: str, address: int, values: list) -> bool:
+        return self.request("write", device=device, address=address, values=list(values))["ok"]
+
+    def subscribe(self, device: str, address: int, count: int, callback, interval: float = 0.1):
+        """callback({address: value}) runs on the reader thread, first with the full range."""
+        def on_reply(response):
+            # Registered on the reader thread, so no update after the snapshot is missed
+            if response.get("ok"):
+                self._callbacks[response["sub"]] = callback
+                callback({address + i: v for i, v in enumerate(response["values"])})
+
+        response = self.request("subscribe", on_reply=on_reply, device=device, address=address,
+                                count=count, interval=interval)
+        return response["sub"] if response["ok"] else None
+
+    def unsubscribe(self, sub: int) -> bool:
+        self._callbacks.pop(sub, None)
+        return self.request("unsubscribe", sub=sub)["ok"]
+
+    # --- pymodbus-compatible calls used by PLCController ---
+    def _coil_device(self, address: int) -> tuple[str, int]:
+        return ("M", address - OFFSET_M) if address >= OFFSET_M else ("Y", address)
+
+    def _bits(self, device: str, address: int, count: int) -> GatewayResponse:
+        values, ok = self.read(device, address, count)
+        return GatewayResponse(bits=[bool(v) for v in values]) if ok else GatewayResponse(error="read failed")
+
+    def read_coils(self, address, count=1, **kwargs):
+        return self._bits(*self._coil_device(address), count)
+
+    def read_discrete_inputs(self, address, count=1, **kwargs):
+        return self._bits("X", address, count)
+
+    def read_holding_registers(self, address, count=1, **kwargs):
+        values, ok = self.read("D", address, count)
+        return GatewayResponse(registers=values) if ok else GatewayResponse(error="read failed")
+
+    def write_coil(self, address, value, **kwargs):
+        return self.write_coils(address, [value])
+
+    def write_coils(self, address, values, **kwargs):
+        device, start = self._coil_device(address)
+        ok = self.write(device, start, [bool(v) for v in values])
+        return GatewayResponse() if ok else GatewayResponse(error="write failed")
+
+    def write_register(self, address, value, **kwargs):
+        return self.write_registers(address, [value])
+
+    def write_registers(self, address, values, **kwargs):
+        ok = self.write("D", address, [int(v) for v in values])
+        return GatewayResponse() if ok else GatewayResponse(error="write failed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Share one PLC connection between local tools.")
+    parser.add_argument("--ip", default="192.168.3.250")
+    parser.add_argument("--port", type=int, default=502)
+    parser.add_argument("--listen", default=f"127.0.0.1:{DEFAULT_PORT}", help="host:port to serve on")
+    parser.add_argument("--window", type=float, default=0.005, help="Batching window in seconds (default: 0.005)")
+    parser.add_argument("--simulate", action="store_true", help="Serve the in-process PLC simulator")
+    args = parser.parse_args(argv)
+
+    client_factory = None
+    if args.simulate:
+        from basic.plc_simulator import SimulatedPLC
+
+        client_factory = SimulatedPLC().client
+    plc = PLCController(config_print=False, client_factory=client_factory)
+    if not plc.plcConnect(args.ip, port=args.port):
+        print("Connection failed. Please check IP address or LAN cable.")
+        return 2
+
+    host, _, port = args.listen.rpartition(":")
+    gateway = PLCGateway(plc, host=host or "127.0.0.1", port=int(port), window=args.window)
+    gateway.start()
+    print(f">> Gateway for {args.ip}:{args.port} listening on {gateway.address[0]}:{gateway.address[1]}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway.stop()
+        plc.plcDisconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
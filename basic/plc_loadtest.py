@@ -0,0 +1,349 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import csv
+import json
+import time
+import random
+import socket
+import struct
+import argparse
+import itertools
+import threading
+from basic.plc_module import PLCController
+
+# Functions a step can mix; writes only ever go to the --scratch range
+READS = ("fc1", "fc3")
+WRITES = ("fc15", "fc16")
+
+
+def parse_mix(spec: str) -> dict:
+    """"fc3=8,fc1=1,fc16=1" -> {"fc3": 0.8, "fc1": 0.1, "fc16": 0.1}."""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip().lower()
+        if name not in READS + WRITES:
+            raise ValueError(f"Unknown function '{name}'. Use {', '.join(READS + WRITES)}.")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class PipelinedConnection:
+    def __init__(self, host: str, port: int = 502, unit: int = 1, timeout: float = 3.0):
+        """
+        Raw Modbus TCP socket that keeps up to `depth` transactions in
+        flight, matched by transaction id. PLCController (pymodbus sync)
+        always waits for each reply, so this is only used for depth > 1.
+        """
+        self.host = host
+        self.port = port
+        self.unit = unit
+        self.timeout = timeout
+        self.sock = None
+        self._tid = 0
+
+    def connect(self) -> bool:
+        try:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return True
+        except OSError:
+            self.sock = None
+            return False
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def send(self, pdu: bytes) -> int:
+        self._tid = (self._tid + 1) & 0xFFFF
+        self.sock.sendall(struct.pack(">HHHB", self._tid, 0, len(pdu) + 1, self.unit) + pdu)
+        return self._tid
+
+    def _recv(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Connection closed by PLC")
+            data += chunk
+        return data
+
+    def receive(self) -> tuple[int, bool]:
+        """(transaction id, ok) of the next reply."""
+        tid, _, length, _ = struct.unpack(">HHHB", self._recv(7))
+        pdu = self._recv(length - 1)
+        return tid, not pdu[0] & 0x80
+
+
+def build_pdu(function: str, address: int, size: int) -> bytes:
+    if function == "fc3":
+        return struct.pack(">BHH", 3, address, size)
+    if function == "fc1":
+        return struct.pack(">BHH", 1, address, size)
+    if function == "fc16":
+        return struct.pack(f">BHHB{size}H", 16, address, size, 2 * size, *range(size))
+    packed = bytes((size + 7) // 8)
+    return struct.pack(">BHHB", 15, address, size, len(packed)) + packed
+
+
+class LoadTest:
+    def __init__(self, host: str, port: int = 502, base: int = 0, scratch: int = None,
+                 duration: float = 5.0, timeout: float = 3.0):
+        """
+        Load generator for the FX5U Modbus server.
+
+        Each step opens `connections` sockets and keeps every one of them
+        busy for `duration` seconds with `size`-register requests drawn from
+        the function mix, `depth` in flight per socket. Reads cover
+        D[base]/M[base]; writes (fc15/fc16) only go to D/M[scratch], which
+        must be given explicitly because they overwrite live memory.
+        """
+        self.host = host
+        self.port = port
+        self.base = base
+        self.scratch = scratch
+        self.duration = duration
+        self.timeout = timeout
+
+    def run_step(self, connections: int, size: int, depth: int, mix: dict) -> dict:
+        if any(name in WRITES for name in mix) and self.scratch is None:
+            raise ValueError("fc15/fc16 in the mix need --scratch (a D/M range that may be overwritten)")
+
+        latencies = []
+        counters = {"requests": 0, "errors": 0, "connect_errors": 0}
+        lock = threading.Lock()
+        start_gate = threading.Barrier(connections + 1)
+
+        def worker(seed: int):
+            rng = random.Random(seed)
+            names, weights = zip(*mix.items())
+            local = []
+            requests = errors = 0
+            runner = self._run_controller if depth == 1 else self._run_pipelined
+            try:
+                requests, errors = runner(size, depth, rng, names, weights, local, start_gate)
+            except (OSError, ConnectionError, threading.BrokenBarrierError):
+                errors += 1
+            with lock:
+                latencies.extend(local)
+                if requests == 0 and errors:
+                    # Never got a connection (or lost it before the first reply)
+                    counters["connect_errors"] += 1
+                    return
+                counters["requests"] += requests
+                counters["errors"] += errors
+
+        threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(connections)]
+        for t in threads:
+            t.start()
+        try:
+            start_gate.wait(timeout=self.timeout * 2)
+        except threading.BrokenBarrierError:
+            pass
+        started = time.perf_counter()
+        for t in threads:
+            t.join()
+        # A socket the PLC dropped early still counts against the whole step
+        elapsed = max(time.perf_counter() - started, self.duration)
+
+        latencies.sort()
+        total = counters["requests"]
+        ok = total - counters["errors"]
+        return {
+            "connections": connections,
+            "size": size,
+            "depth": depth,
+            "mix": ",".join(f"{name}={weight:.2f}" for name, weight in mix.items()),
+            "requests": total,
+            "errors": counters["errors"],
+            "connect_errors": counters["connect_errors"],
+            "error_rate": round(counters["errors"] / total, 4) if total else 1.0,
+            "throughput_rps": round(ok / elapsed, 1) if elapsed > 0 else 0.0,
+            "registers_per_s": round(ok * size / elapsed, 1) if elapsed > 0 else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3) if latencies else float("nan"),
+        }
+
+    def _run_controller(self, size, depth, rng, names, weights, latencies, start_gate):
+        # One outstanding request, exactly as every tool built on PLCController behaves
+        plc = PLCController(config_print=False)
+        if not plc.plcConnect(self.host, port=self.port):
+            start_gate.wait(timeout=self.timeout * 2)
+            return 0, 1
+        calls = {
+            "fc3": lambda: plc.read_holding_range(self.base, size)[1],
+            "fc1": lambda: plc.read_M_range(self.base, size)[1],
+            "fc16": lambda: plc.write_holding_range(self.scratch, list(range(size))),
+            "fc15": lambda: plc.write_M_range(self.scratch, [False] * size),
+        }
+        requests = errors = 0
+        try:
+            start_gate.wait(timeout=self.timeout * 2)
+            deadline = time.perf_counter() + self.duration
+            while time.perf_counter() < deadline:
+                call = calls[rng.choices(names, weights)[0]]
+                sent = time.perf_counter()
+                ok = call()
+                requests += 1
+                if ok:
+                    latencies.append(time.perf_counter() - sent)
+                else:
+                    errors += 1
+        finally:
+            plc.plcDisconnect()
+        return requests, errors
+
+    def _run_pipelined(self, size, depth, rng, names, weights, latencies, start_gate):
+        conn = PipelinedConnection(self.host, self.port, timeout=self.timeout)
+        if not conn.connect():
+            start_gate.wait(timeout=self.timeout * 2)
+            return 0, 1
+        offsets = {"fc3": self.base, "fc1": self.base + 8192,
+                   "fc16": self.scratch, "fc15": None if self.scratch is None else self.scratch + 8192}
+        in_flight = {}   # tid -> send time
+        requests = errors = 0
+
+        def send_one():
+            name = rng.choices(names, weights)[0]
+            tid = conn.send(build_pdu(name, offsets[name], size))
+            in_flight[tid] = time.perf_counter()
+
+        try:
+            start_gate.wait(timeout=self.timeout * 2)
+            deadline = time.perf_counter() + self.duration
+            try:
+                for _ in range(depth):
+                    send_one()
+                while in_flight:
+                    tid, ok = conn.receive()
+                    sent = in_flight.pop(tid, None)
+                    if sent is None:
+                        continue
+                    requests += 1
+                    if ok:
+                        latencies.append(time.perf_counter() - sent)
+                    else:
+                        errors += 1
+                    if time.perf_counter() < deadline:
+                        send_one()
+            except OSError:
+                # Timeout or the PLC dropped the socket: the transactions still
+                # outstanding are lost, the ones already answered still count
+                requests += len(in_flight)
+                errors += len(in_flight)
+        finally:
+            conn.close()
+        return requests, errors
+
+
+def best_step(results: list, max_error_rate: float, latency_budget_ms: float):
+    fit = [row for row in results if row["error_rate"] <= max_error_rate and row["p95_ms"] <= latency_budget_ms]
+    return max(fit, key=lambda row: row["registers_per_s"], default=None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ramp load against a Modbus TCP PLC and record its capacity curve.")
+    parser.add_argument("--ip", default="192.168.3.250")
+    parser.add_argument("--port", type=int, default=502)
+    parser.add_argument("--connections", default="1,2,4", help="Connection counts to ramp (default: 1,2,4)")
+    parser.add_argument("--sizes", default="1,16,64,125", help="Registers per request (default: 1,16,64,125)")
+    parser.add_argument("--depth", default="1", help="Transactions in flight per connection (default: 1)")
+    parser.add_argument("--mix", action="append", default=[],
+                        help="Function mix, e.g. fc3=8,fc1=2 (repeatable; default: fc3)")
+    parser.add_argument("--base", type=int, default=0, help="First D/M address to read (default: 0)")
+    parser.add_argument("--scratch", type=int, help="D/M address that fc15/fc16 may overwrite")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per step (default: 5)")
+    parser.add_argument("--stop-error-rate", type=float, default=0.5,
+                        help="Stop ramping a mix and size once a step's error rate exceeds this (default: 0.5)")
+    parser.add_argument("--latency-budget", type=float, default=50.0,
+                        help="p95 ms a usable step must stay under; a mix and size stops ramping past it (default: 50)")
+    parser.add_argument("--csv", help="Write the capacity curve as CSV")
+    parser.add_argument("--json", help="Write the capacity curve as JSON")
+    parser.add_argument("--simulate", action="store_true", help="Run against the PLC simulator over local TCP")
+    args = parser.parse_args(argv)
+
+    to_ints = lambda spec: [int(v) for v in spec.split(",")]
+    sizes = to_ints(args.sizes)
+    mixes = [parse_mix(spec) for spec in (args.mix or ["fc3"])]
+    writes = any(name in WRITES for mix in mixes for name in mix)
+    limit = PLCController.MAX_WRITE_REGS if writes else PLCController.MAX_READ_REGS
+    if any(not 1 <= size <= limit for size in sizes):
+        print(f"Error: sizes must be 1-{limit} registers")
+        return 2
+    if writes and args.scratch is None:
+        print("Error: fc15/fc16 in the mix need --scratch (a D/M range that may be overwritten)")
+        return 2
+
+    server = None
+    host, port = args.ip, args.port
+    if args.simulate:
+        from basic.plc_simulator import SimulatedPLC
+
+        server = SimulatedPLC().serve_tcp("127.0.0.1", 0)
+        host, port = server.server_address
+
+    test = LoadTest(host, port, base=args.base, scratch=args.scratch, duration=args.duration)
+    results = []
+    print(f"{'Conn':>4} {'Size':>4} {'Depth':>5} {'Mix':<16} {'Req/s':>9} {'Reg/s':>10} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'Err%':>6}")
+    steps = itertools.product(enumerate(mixes), to_ints(args.depth), to_ints(args.connections), sizes)
+    # (mix index, size) -> [(depth, connections)] of steps that breached a limit; any step
+    # with at least that depth and that many connections is only more load, so it is skipped
+    breached = {}
+    skipped = 0
+    try:
+        for (m, mix), depth, connections, size in steps:
+            if any(depth >= d and connections >= c for d, c in breached.get((m, size), ())):
+                skipped += 1
+                continue
+            row = test.run_step(connections, size, depth, mix)
+            results.append(row)
+            print(f"{connections:>4} {size:>4} {depth:>5} {row['mix']:<16} {row['throughput_rps']:>9.1f} "
+                  f"{row['registers_per_s']:>10.1f} {row['p50_ms']:>7.2f} {row['p95_ms']:>7.2f} "
+                  f"{row['p99_ms']:>7.2f} {row['error_rate'] * 100:>6.2f}")
+            if row["error_rate"] > args.stop_error_rate:
+                print(f">> Error rate limit reached, no more load for {row['mix']} x {size} registers.")
+                breached.setdefault((m, size), []).append((depth, connections))
+            elif row["p95_ms"] > args.latency_budget:
+                print(f">> Latency budget exceeded, no more load for {row['mix']} x {size} registers.")
+                breached.setdefault((m, size), []).append((depth, connections))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    if skipped:
+        print(f"\n>> Skipped {skipped} steps above a mix and size that had already hit its limit.")
+    best = best_step(results, 0.01, args.latency_budget)
+    if best is not None:
+        print(f"\n>> Best under {args.latency_budget:g} ms p95 / 1% errors: {best['connections']} connections x "
+              f"depth {best['depth']}, {best['size']} registers -> {best['throughput_rps']:.0f} req/s, "
+              f"{best['registers_per_s']:.0f} registers/s")
+
+    if args.csv and results:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"target": f"{args.ip}:{args.port}", "simulated": args.simulate, "steps": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
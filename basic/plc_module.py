@@ -1,24 +1,152 @@
 import time
 import threading
-from pymodbus.client import ModbusTcpClient
+
+def words_to_int32(low_word: int, high_word: int) -> int:
+    """Signed 32-bit value from a low/high word pair (D[n], D[n+1])."""
+    val_32 = ((high_word & 0xFFFF) << 16) | (low_word & 0xFFFF)
+    if val_32 > 0x7FFFFFFF:
+        val_32 -= 0x100000000
+    return val_32
+
+
+def int32_to_words(value: int) -> list[int]:
+    """[low_word, high_word] for a signed 32-bit value."""
+    val_32 = int(value) & 0xFFFFFFFF
+    return [val_32 & 0xFFFF, (val_32 >> 16) & 0xFFFF]
+
+
+def coalesce_ranges(spans: list, max_count: int) -> list[tuple[int, int]]:
+    """
+    Merge (start, count) spans into as few (start, count) reads as possible,
+    each no longer than max_count. Gaps between spans are read through when
+    that still fits in the same request.
+    """
+    reads = []
+    for start, count in sorted(spans):
+        end = start + count
+        if reads:
+            r_start, r_count = reads[-1]
+            if end - r_start <= max_count:
+                reads[-1] = (r_start, max(r_count, end - r_start))
+                continue
+        reads.append((start, count))
+    return reads
+
 
 class PLCController:
-    def __init__(self, config_print: bool = False):
+    # Modbus per-request limits (FC1/FC2 bits, FC3 registers)
+    MAX_READ_BITS = 2000
+    MAX_READ_REGS = 125
+    MAX_WRITE_BITS = 1968
+    MAX_WRITE_REGS = 123
+    # A non-blocking pulse re-triggered right after its OFF keeps OFF this long
+    # (a few FX5U scans), so the program sees the falling and the new rising edge
+    MIN_PULSE_OFF = 0.02
+
+    def __init__(self, config_print: bool = False, client_factory=None, timeout: float = 3.0, retries: int = 3):
         self.client = None
         self.config_print = config_print
+        # client_factory(ip, port) -> pymodbus-compatible client (e.g. the simulator)
+        self.client_factory = client_factory
+        # A request to a dead PLC blocks for up to timeout * (retries + 1) seconds
+        self.timeout = timeout
+        self.retries = retries
         
         self.offset_y = 0
         self.offset_m = 8192
         self.offset_d = 0
         self.offset_x = 0
 
+        # pymodbus sync client is not thread-safe; the pulse scheduler and
+        # ddrvi_sync threads all share this one socket
+        self._io_lock = threading.RLock()
+        self._pulse_scheduler = None
+        self._cache = None
+        self._recorder = None
+
     def _display(self, message: str):
         if self.config_print:
             print(f"[PLC] {message}")
             
+    def enable_cache(self, default_ttl: float = 0.0, device_ttl: dict = None, tag_ttl: dict = None):
+        """
+        Turn on the read-through cache (off by default).
+
+        TTLs are in seconds: tag_ttl={"M110": 0.0}, device_ttl={"D": 0.1}, then
+        default_ttl. Every read also takes max_age to override them per call:
+        max_age=0 always goes to the PLC (interlocks), a larger value accepts
+        older data (dashboards). Identical reads in flight are shared, and
+        writes invalidate any cached range they touch.
+        """
+        # The cache, pulse scheduler and recorder are imported where first used,
+        # so a plain read/write tool loads none of them
+        from basic.plc_cache import ReadCache
+
+        self._cache = ReadCache(default_ttl, device_ttl, tag_ttl)
+        return self._cache
+
+    def disable_cache(self):
+        self._cache = None
+
+    def start_recording(self, path: str):
+        """
+        Log every Modbus request and response, with timestamps and round-trip
+        times, to a binary session file. Play it back offline with
+        PLCController(client_factory=lambda ip, port: ReplayClient(path)).
+        """
+        from basic.plc_replay import RecordingClient, SessionWriter
+
+        with self._io_lock:
+            self.stop_recording()
+            self._recorder = SessionWriter(path)
+            if self.client is not None:
+                self.client = RecordingClient(self.client, self._recorder)
+            self._display(f"Recording session to {path}")
+
+    def stop_recording(self):
+        with self._io_lock:
+            if self._recorder is None:
+                return
+            from basic.plc_replay import RecordingClient
+
+            if isinstance(self.client, RecordingClient):
+                self.client = self.client.inner
+            self._display(f"Recorded {self._recorder.records} requests to {self._recorder.path}")
+            self._recorder.close()
+            self._recorder = None
+
+    def _read_through(self, device: str, address: int, count: int, kind: str, max_age, loader):
+        cache = self._cache
+        if cache is None:
+            return loader()
+        if max_age is None:
+            max_age = cache.ttl_for(device, address, count)
+
+        space, offset = {
+            "X": ("input", self.offset_x),
+            "Y": ("coil", self.offset_y),
+            "M": ("coil", self.offset_m),
+            "D": ("reg", self.offset_d),
+        }[device]
+        return cache.read((space, address + offset, count, kind), max_age, loader)
+
+    def _invalidate(self, space: str, modbus_address: int, count: int = 1):
+        if self._cache is not None:
+            self._cache.invalidate(space, modbus_address, count)
+
     def plcConnect(self, ip: str, port: int = 502) -> bool:
         try:
-            self.client = ModbusTcpClient(host=ip, port=port, timeout=3)
+            if self.client_factory is not None:
+                self.client = self.client_factory(ip, port)
+            else:
+                # Imported here so that importing this module stays cheap and works offline
+                from pymodbus.client import ModbusTcpClient
+
+                self.client = ModbusTcpClient(host=ip, port=port, timeout=self.timeout, retries=self.retries)
+            if self._recorder is not None:
+                from basic.plc_replay import RecordingClient
+
+                self.client = RecordingClient(self.client, self._recorder)
             if self.client.connect():
                 self._display(f"Connected to {ip}:{port}")
                 return True
@@ -29,6 +157,10 @@ class PLCController:
             return False
         
     def plcDisconnect(self) -> bool:
+        if self._pulse_scheduler is not None:
+            # Release every pulse that is still ON before the socket goes away
+            self._pulse_scheduler.stop(flush_pending=True)
+            self._pulse_scheduler = None
         if self.client:
             self.client.close()
             self.client = None
@@ -50,7 +182,9 @@ class PLCController:
             return False
         
         try:
-            result = self.client.write_coil(modbus_address, status)
+            with self._io_lock:
+                result = self.client.write_coil(modbus_address, status)
+            self._invalidate("coil", modbus_address)
             if not result.isError():
                 state_str = "ON" if status else "OFF"
                 self._display(f"Wrote {label} (Addr: {modbus_address}) -> {state_str}")
@@ -62,19 +196,86 @@ class PLCController:
             self._display(f"Exception writing {label}: {e}")
             return False
 
+    def _execute_write_coils(self, modbus_address: int, values: list, label: str) -> bool:
+        if not self.client or not self.client.is_socket_open():
+            self._display("Error: Not connected!")
+            return False
+
+        try:
+            with self._io_lock:
+                result = self.client.write_coils(modbus_address, [bool(v) for v in values])
+            self._invalidate("coil", modbus_address, len(values))
+            if not result.isError():
+                self._display(f"Wrote {label} (Addr: {modbus_address}, Count: {len(values)})")
+                return True
+            else:
+                self._display(f"Modbus Error writing {label}")
+                return False
+        except Exception as e:
+            self._display(f"Exception writing {label}: {e}")
+            return False
+
+    def write_Y_range(self, address: int, values: list) -> bool:
+        return self._execute_write_coil_range(address + self.offset_y, values, f"Output Y{address}")
+
+    def write_M_range(self, address: int, values: list) -> bool:
+        return self._execute_write_coil_range(address + self.offset_m, values, f"Relay M{address}")
+
+    def _execute_write_coil_range(self, modbus_address: int, values: list, label: str) -> bool:
+        for offset in range(0, len(values), self.MAX_WRITE_BITS):
+            chunk = values[offset:offset + self.MAX_WRITE_BITS]
+            if not self._execute_write_coils(modbus_address + offset, chunk, label):
+                return False
+        return True
+
     def pulse_Y(self, address: int, duration: float = 0.5, blocking: bool = True) -> bool:
         if blocking:
             return self._execute_pulse(self.write_Y, address, duration)
-        else:
-            threading.Thread(target=self._execute_pulse, args=(self.write_Y, address, duration), daemon=True).start()
-            return True
+        return self._schedule_pulse(self.write_Y, address, address + self.offset_y, duration)
 
     def pulse_M(self, address: int, duration: float = 0.5, blocking: bool = True) -> bool:
         if blocking:
             return self._execute_pulse(self.write_M, address, duration)
-        else:
-            threading.Thread(target=self._execute_pulse, args=(self.write_M, address, duration), daemon=True).start()
-            return True
+        return self._schedule_pulse(self.write_M, address, address + self.offset_m, duration)
+
+    def cancel_pulse_Y(self, address: int) -> bool:
+        """Switch a pending non-blocking Y pulse OFF now. Returns False if none was pending."""
+        return self._cancel_pulse(address + self.offset_y)
+
+    def cancel_pulse_M(self, address: int) -> bool:
+        """Switch a pending non-blocking M pulse OFF now. Returns False if none was pending."""
+        return self._cancel_pulse(address + self.offset_m)
+
+    def _schedule_pulse(self, write_func, address: int, modbus_address: int, duration: float) -> bool:
+        # Y and M are both coils, so the scheduler is keyed by raw Modbus address
+        if self._pulse_scheduler is None:
+            from basic.pulse_scheduler import PulseScheduler
+
+            self._pulse_scheduler = PulseScheduler(self._flush_pulse_off, min_off=self.MIN_PULSE_OFF)
+
+        # Retrigger while still ON: the coil is already set, only the OFF time moves
+        return self._pulse_scheduler.trigger(modbus_address, duration, lambda: write_func(address, True))
+
+    def _cancel_pulse(self, modbus_address: int) -> bool:
+        if self._pulse_scheduler is None:
+            return False
+        return self._pulse_scheduler.cancel(modbus_address, fire=True)
+
+    def _flush_pulse_off(self, modbus_addresses: list):
+        # Pulses that fall due together are written as contiguous FC15 runs
+        addrs = sorted(set(modbus_addresses))
+        start = prev = addrs[0]
+        for addr in addrs[1:] + [None]:
+            if addr is not None and addr == prev + 1:
+                prev = addr
+                continue
+            count = prev - start + 1
+            if count == 1:
+                self._execute_write_coil(start, False, f"Pulse OFF (Addr: {start})")
+            else:
+                self._execute_write_coils(start, [False] * count, f"Pulse OFF x{count}")
+            if addr is not None:
+                start = prev = addr
 
     def _execute_pulse(self, write_func, address: int, duration: float) -> bool:
         # สั่ง ON
@@ -92,7 +293,9 @@ class PLCController:
             
         modbus_addr = address + self.offset_d
         try:
-            result = self.client.write_register(modbus_addr, int(value))
+            with self._io_lock:
+                result = self.client.write_register(modbus_addr, int(value))
+            self._invalidate("reg", modbus_addr)
             if not result.isError():
                 self._display(f"Wrote Holding Reg D{address} (Addr: {modbus_addr}) -> {int(value)}")
                 return True
@@ -114,7 +317,9 @@ class PLCController:
             low_word = val_32 & 0xFFFF
             high_word = (val_32 >> 16) & 0xFFFF
             
-            result = self.client.write_registers(modbus_addr, [low_word, high_word])
+            with self._io_lock:
+                result = self.client.write_registers(modbus_addr, [low_word, high_word])
+            self._invalidate("reg", modbus_addr, 2)
             
             if not result.isError():
                 self._display(f"Wrote 32-bit Reg D{address} (Addr: {modbus_addr}) -> {int(value)}")
@@ -126,14 +331,41 @@ class PLCController:
             self._display(f"Write 32-bit Exception: {e}")
             return False
 
-    def read_holding(self, address: int) -> tuple[float, bool]:
+    def write_holding_range(self, address: int, values: list) -> bool:
+        """Write raw 16-bit words to D[address] onwards in maximal FC16 frames."""
+        if not self.client or not self.client.is_socket_open():
+            self._display("Error: Not connected!")
+            return False
+
+        modbus_addr = address + self.offset_d
+        words = [int(v) & 0xFFFF for v in values]
+        try:
+            for offset in range(0, len(words), self.MAX_WRITE_REGS):
+                chunk = words[offset:offset + self.MAX_WRITE_REGS]
+                with self._io_lock:
+                    result = self.client.write_registers(modbus_addr + offset, chunk)
+                self._invalidate("reg", modbus_addr + offset, len(chunk))
+                if result.isError():
+                    self._display(f"Write Range Error at D{address + offset}")
+                    return False
+            self._display(f"Wrote Reg D{address} (Addr: {modbus_addr}, Count: {len(words)})")
+            return True
+        except Exception as e:
+            self._display(f"Write Range Exception: {e}")
+            return False
+
+    def read_holding(self, address: int, max_age: float = None) -> tuple[float, bool]:
+        return self._read_through("D", address, 1, "holding", max_age, lambda: self._read_holding(address))
+
+    def _read_holding(self, address: int) -> tuple[float, bool]:
         if not self.client or not self.client.is_socket_open():
             self._display("Error: Not connected!")
             return 0.0, False
             
         modbus_addr = address + self.offset_d
         try:
-            result = self.client.read_holding_registers(modbus_addr, count=1)
+            with self._io_lock:
+                result = self.client.read_holding_registers(modbus_addr, count=1)
             if not result.isError():
                 val = float(result.registers[0])
                 self._display(f"Read Reg D{address} (Addr: {modbus_addr}) -> {val}")
@@ -145,14 +377,18 @@ class PLCController:
             self._display(f"Read Exception: {e}")
             return 0.0, False
 
-    def read_holding_32bit(self, address: int) -> tuple[int, bool]:
+    def read_holding_32bit(self, address: int, max_age: float = None) -> tuple[int, bool]:
+        return self._read_through("D", address, 2, "int32", max_age, lambda: self._read_holding_32bit(address))
+
+    def _read_holding_32bit(self, address: int) -> tuple[int, bool]:
         if not self.client or not self.client.is_socket_open():
             self._display("Error: Not connected!")
             return 0, False
             
         modbus_addr = address + self.offset_d
         try:
-            result = self.client.read_holding_registers(modbus_addr, count=2)
+            with self._io_lock:
+                result = self.client.read_holding_registers(modbus_addr, count=2)
             if not result.isError():
                 low_word = result.registers[0]
                 high_word = result.registers[1]
@@ -168,13 +404,15 @@ class PLCController:
             self._display(f"Read 32-bit Exception: {e}")
             return 0, False
 
-    def read_Y(self, address: int) -> tuple[bool, bool]:
+    def read_Y(self, address: int, max_age: float = None) -> tuple[bool, bool]:
         modbus_addr = address + self.offset_y
-        return self._execute_read_coil(modbus_addr, f"Output Y{address}")
+        return self._read_through("Y", address, 1, "bit", max_age,
+                                  lambda: self._execute_read_coil(modbus_addr, f"Output Y{address}"))
 
-    def read_M(self, address: int) -> tuple[bool, bool]:
+    def read_M(self, address: int, max_age: float = None) -> tuple[bool, bool]:
         modbus_addr = address + self.offset_m
-        return self._execute_read_coil(modbus_addr, f"Relay M{address}")
+        return self._read_through("M", address, 1, "bit", max_age,
+                                  lambda: self._execute_read_coil(modbus_addr, f"Relay M{address}"))
 
     def _execute_read_coil(self, modbus_address: int, label: str) -> tuple[bool, bool]:
         if not self.client or not self.client.is_socket_open():
@@ -182,7 +420,8 @@ class PLCController:
             return False, False
             
         try:
-            result = self.client.read_coils(modbus_address, count=1)
+            with self._io_lock:
+                result = self.client.read_coils(modbus_address, count=1)
             if not result.isError():
                 val = result.bits[0]
                 self._display(f"Read {label} (Addr: {modbus_address}) -> {'ON' if val else 'OFF'}")
@@ -194,14 +433,18 @@ class PLCController:
             self._display(f"Read Exception: {e}")
             return False, False
 
-    def read_input(self, address: int) -> tuple[bool, bool]:
+    def read_input(self, address: int, max_age: float = None) -> tuple[bool, bool]:
+        return self._read_through("X", address, 1, "bit", max_age, lambda: self._read_input(address))
+
+    def _read_input(self, address: int) -> tuple[bool, bool]:
         if not self.client or not self.client.is_socket_open():
             self._display("Error: Not connected!")
             return False, False
             
         modbus_addr = address + self.offset_x
         try:
-            result = self.client.read_discrete_inputs(modbus_addr, count=1)
+            with self._io_lock:
+                result = self.client.read_discrete_inputs(modbus_addr, count=1)
             if not result.isError():
                 val = result.bits[0]
                 self._display(f"Read Input X{address} (Addr: {modbus_addr}) -> {'ON' if val else 'OFF'}")
@@ -212,6 +455,62 @@ class PLCController:
         except Exception as e:
             self._display(f"Read Exception: {e}")
             return False, False
-        
+
+    def read_input_range(self, address: int, count: int, max_age: float = None) -> tuple[list[bool], bool]:
+        return self._read_through("X", address, count, "range", max_age, lambda: self._execute_read_range(
+            "read_discrete_inputs", address + self.offset_x, count, self.MAX_READ_BITS, f"Input X{address}"))
+
+    def read_Y_range(self, address: int, count: int, max_age: float = None) -> tuple[list[bool], bool]:
+        return self._read_through("Y", address, count, "range", max_age, lambda: self._execute_read_range(
+            "read_coils", address + self.offset_y, count, self.MAX_READ_BITS, f"Output Y{address}"))
+
+    def read_M_range(self, address: int, count: int, max_age: float = None) -> tuple[list[bool], bool]:
+        return self._read_through("M", address, count, "range", max_age, lambda: self._execute_read_range(
+            "read_coils", address + self.offset_m, count, self.MAX_READ_BITS, f"Relay M{address}"))
+
+    def read_holding_range(self, address: int, count: int, max_age: float = None) -> tuple[list[int], bool]:
+        """Raw unsigned 16-bit words D[address] .. D[address + count - 1]."""
+        return self._read_through("D", address, count, "range", max_age, lambda: self._execute_read_range(
+            "read_holding_registers", address + self.offset_d, count, self.MAX_READ_REGS, f"Reg D{address}"))
+
+    def read_device_range(self, device: str, address: int, count: int, max_age: float = None) -> tuple[list, bool]:
+        """Ranged read by device letter ("X", "Y", "M" or "D")."""
+        readers = {
+            "X": self.read_input_range,
+            "Y": self.read_Y_range,
+            "M": self.read_M_range,
+            "D": self.read_holding_range,
+        }
+        reader = readers.get(device.upper())
+        if reader is None:
+            raise ValueError(f"Unknown device: '{device}'. Use 'X', 'Y', 'M' or 'D'.")
+        return reader(address, count, max_age=max_age)
+
+    def _execute_read_range(self, method: str, modbus_address: int, count: int,
+                            max_per_request: int, label: str) -> tuple[list, bool]:
+        if not self.client or not self.client.is_socket_open():
+            self._display("Error: Not connected!")
+            return [], False
+
+        values = []
+        try:
+            # Ranges larger than one Modbus frame are read as consecutive maximal chunks
+            for offset in range(0, count, max_per_request):
+                chunk = min(max_per_request, count - offset)
+                with self._io_lock:
+                    result = getattr(self.client, method)(modbus_address + offset, count=chunk)
+                if result.isError():
+                    self._display(f"Read Error at {label} (+{offset}, Count: {chunk})")
+                    return [], False
+                if method == "read_holding_registers":
+                    values.extend(result.registers[:chunk])
+                else:
+                    values.extend(bool(b) for b in result.bits[:chunk])
+            self._display(f"Read {label} (Addr: {modbus_address}, Count: {count})")
+            return values, True
+        except Exception as e:
+            self._display(f"Read Exception: {e}")
+            return [], False
+
 if __name__ == "__main__":
     plc = PLCController()
@@ -0,0 +1,98 @@
+import time
+import queue
+import threading
+
+
+class PLCPoller:
+    def __init__(self, plc, interval: float = 0.5):
+        """
+        Background scan loop for a PLCController.
+
+        Each named group is one ranged read (device, start, count). After every
+        cycle only the values that changed since the previous cycle are pushed
+        to `changes` as (group, {address: value}), followed by ("cycle", n), so
+        a UI thread can drain the queue and touch only what actually moved.
+        """
+        self.plc = plc
+        self.interval = interval
+        self.changes = queue.Queue()
+
+        self._groups = {}   # name -> (device, start, count)
+        self._last = {}     # name -> list of values from the previous cycle
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.cycle_count = 0
+
+    def set_group(self, name: str, device: str, start: int, count: int):
+        with self._lock:
+            self._groups[name] = (device, start, count)
+            # Force a full snapshot for a redefined range
+            self._last.pop(name, None)
+
+    def refresh(self, name: str):
+        """Make the next poll of a group report every value, not just changes."""
+        with self._lock:
+            self._last.pop(name, None)
+
+    def remove_group(self, name: str):
+        with self._lock:
+            self._groups.pop(name, None)
+            self._last.pop(name, None)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="PLCPoller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        with self._lock:
+            self._last.clear()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def poll_once(self):
+        with self._lock:
+            groups = list(self._groups.items())
+
+        for name, (device, start, count) in groups:
+            self._poll_group(name, device, start, count)
+
+        self.cycle_count += 1
+        self.changes.put(("cycle", self.cycle_count))
+
+    def _poll_group(self, name: str, device: str, start: int, count: int):
+        """Read one group and queue its changes. Returns None on a failed read, else whether anything changed."""
+        values, ok = self.plc.read_device_range(device, start, count)
+        if not ok:
+            return None
+
+        with self._lock:
+            if self._groups.get(name) != (device, start, count):
+                return None  # Range was redefined while this read was in flight
+            last = self._last.get(name)
+            self._last[name] = values
+
+        if last is None:
+            diff = {start + i: v for i, v in enumerate(values)}
+        else:
+            diff = {start + i: v for i, (v, old) in enumerate(zip(values, last)) if v != old}
+        if diff:
+            self.changes.put((name, diff))
+        return last is not None and bool(diff)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            self.poll_once()
+            # Keep a fixed cadence regardless of how long the reads took
+            remaining = self.interval - (time.monotonic() - started)
+            if remaining > 0:
+                self._stop_event.wait(remaining)
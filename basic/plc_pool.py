@@ -0,0 +1,50 @@
+import threading
+from basic.plc_module import PLCController
+
+
+class PLCPool:
+    def __init__(self, config_print: bool = False, client_factory=None):
+        """
+        One shared PLCController (one socket) per PLC address.
+
+        Every thread working against the same PLC gets the same controller;
+        its I/O lock serialises the requests, so N axes on one PLC never open
+        N connections. client_factory is passed to each controller
+        (e.g. SimulatedPLC.client for offline runs).
+        """
+        self.config_print = config_print
+        self.client_factory = client_factory
+        self._controllers = {}  # (ip, port) -> PLCController
+        self._lock = threading.Lock()
+
+    def get(self, ip: str, port: int = 502):
+        """Connected controller for ip:port, or None if the connection failed."""
+        key = (ip, port)
+        with self._lock:
+            plc = self._controllers.get(key)
+            if plc is not None and plc.client is not None and plc.client.is_socket_open():
+                return plc
+            if plc is not None:
+                # Dead connection: release its socket and pulse scheduler before replacing it
+                self._controllers.pop(key)
+                self._disconnect(plc)
+
+            plc = PLCController(config_print=self.config_print, client_factory=self.client_factory)
+            if not plc.plcConnect(ip, port=port):
+                self._disconnect(plc)
+                return None
+            self._controllers[key] = plc
+            return plc
+
+    @staticmethod
+    def _disconnect(plc: PLCController):
+        try:
+            plc.plcDisconnect()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            for plc in self._controllers.values():
+                plc.plcDisconnect()
+            self._controllers.clear()
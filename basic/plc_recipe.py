@@ -0,0 +1,211 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import re
+import csv
+import json
+import time
+import argparse
+from basic.plc_module import PLCController, coalesce_ranges, int32_to_words
+
+# Parameter keys: "D100" is one 16-bit word, "D100:32" a 32-bit value in D100/D101
+PARAM_KEY = re.compile(r"^D(\d+)(?::(16|32))?$", re.IGNORECASE)
+
+# Modbus TCP FC16 request: MBAP header 7 + function 1 + address 2 + quantity 2 + byte count 1, then the words
+FC16_OVERHEAD = 13
+
+
+def address_blocks(addresses) -> list[tuple[int, int]]:
+    """Contiguous (start, count) runs of a set of register addresses."""
+    blocks = []
+    for address in sorted(addresses):
+        if blocks and blocks[-1][0] + blocks[-1][1] == address:
+            blocks[-1] = (blocks[-1][0], blocks[-1][1] + 1)
+        else:
+            blocks.append((address, 1))
+    return blocks
+
+
+class Recipe:
+    def __init__(self, name: str, params: dict):
+        """A named parameter set; params maps "D100" / "D100:32" to integers."""
+        self.name = name
+        self.params = params
+        self.words = {}   # D address -> unsigned 16-bit word
+        for key, value in params.items():
+            match = PARAM_KEY.match(key.strip())
+            if not match:
+                raise ValueError(f"Recipe '{name}': invalid parameter '{key}'. Use 'D100' or 'D100:32'.")
+            address = int(match.group(1))
+            words = int32_to_words(int(value)) if match.group(2) == "32" else [int(value) & 0xFFFF]
+            for i, word in enumerate(words):
+                if address + i in self.words:
+                    raise ValueError(f"Recipe '{name}': D{address + i} is set twice")
+                self.words[address + i] = word
+
+    def blocks(self) -> list[tuple[int, int]]:
+        return address_blocks(self.words)
+
+
+def load_recipes(path: str) -> dict:
+    """
+    {name: Recipe} from a file.
+      JSON: {"partA": {"D100:32": 36000, "D104": 1}, "partB": {...}}
+      CSV:  recipe,parameter,value  (one row per parameter)
+    """
+    params = {}
+    if path.lower().endswith(".csv"):
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                params.setdefault(row["recipe"], {})[row["parameter"]] = int(row["value"])
+    else:
+        with open(path) as f:
+            params = json.load(f)
+    return {name: Recipe(name, values) for name, values in params.items()}
+
+
+class RecipeLoader:
+    def __init__(self, plc: PLCController):
+        """
+        ดาวน์โหลด recipe ลง PLC: เขียนเฉพาะ register ที่เปลี่ยน แล้วอ่านกลับตรวจสอบ
+
+        `state` caches what the PLC holds for every register a recipe has
+        touched (from the last read-back), so a changeover only sends the
+        difference. refresh=True re-reads it first, e.g. after someone
+        edited parameters on the HMI.
+        """
+        self.plc = plc
+        self.state = {}
+
+    def invalidate(self):
+        self.state.clear()
+
+    def _read_blocks(self, blocks: list) -> tuple[dict, int, bool]:
+        """Read blocks in as few FC3 frames as possible: ({address: word}, frames, ok)."""
+        values = {}
+        frames = 0
+        for start, count in coalesce_ranges(blocks, self.plc.MAX_READ_REGS):
+            words, ok = self.plc.read_holding_range(start, count, max_age=0)
+            frames += -(-count // self.plc.MAX_READ_REGS)
+            if not ok:
+                return values, frames, False
+            for i, word in enumerate(words):
+                values[start + i] = word
+        return values, frames, True
+
+    def diff(self, recipe: Recipe, refresh: bool = False) -> dict:
+        """{address: (plc word or None, recipe word)} for every register that must change."""
+        unknown = [a for a in recipe.words if a not in self.state]
+        if refresh or unknown:
+            values, _, ok = self._read_blocks(recipe.blocks() if refresh else address_blocks(unknown))
+            if ok:
+                self.state.update(values)
+        return {a: (self.state.get(a), word) for a, word in recipe.words.items() if self.state.get(a) != word}
+
+    def download(self, recipe: Recipe, refresh: bool = False, verify: bool = True, dry_run: bool = False) -> dict:
+        """
+        Write the changed registers and verify the whole recipe with one
+        ranged read-back. Within a contiguous block of recipe registers the
+        span from the first to the last change is written as one FC16 frame
+        (the recipe owns every word in it); registers outside the recipe are
+        never written.
+        """
+        started = time.perf_counter()
+        changes = self.diff(recipe, refresh)
+
+        spans = []
+        for start, count in recipe.blocks():
+            changed = [a for a in range(start, start + count) if a in changes]
+            if changed:
+                spans.append((changed[0], changed[-1] - changed[0] + 1))
+
+        report = {
+            "recipe": recipe.name,
+            "parameters": len(recipe.params),
+            "registers": len(recipe.words),
+            "changed": len(changes),
+            "words_written": 0,
+            "frames_written": 0,
+            "bytes_written": 0,
+            "ok": True,
+            "verified": None,
+            "mismatches": [],
+        }
+
+        if not dry_run:
+            for start, count in spans:
+                words = [recipe.words[a] for a in range(start, start + count)]
+                frames = -(-count // self.plc.MAX_WRITE_REGS)
+                report["frames_written"] += frames
+                report["words_written"] += count
+                report["bytes_written"] += FC16_OVERHEAD * frames + 2 * count
+                if not self.plc.write_holding_range(start, words):
+                    report["ok"] = False
+                    break
+            # Unknown until the read-back below
+            for start, count in spans:
+                for a in range(start, start + count):
+                    self.state.pop(a, None)
+
+            if verify:
+                values, frames, ok = self._read_blocks(recipe.blocks())
+                report["frames_read"] = frames
+                self.state.update(values)
+                report["mismatches"] = [(a, values.get(a), word) for a, word in sorted(recipe.words.items())
+                                        if values.get(a) != word]
+                report["verified"] = ok and not report["mismatches"]
+                report["ok"] = report["ok"] and report["verified"]
+
+        report["duration_s"] = round(time.perf_counter() - started, 4)
+        return report
+
+
+def print_report(report: dict):
+    status = "OK" if report["ok"] else "FAILED"
+    print(f"   Recipe '{report['recipe']}': {report['changed']}/{report['registers']} registers changed, "
+          f"{report['words_written']} words in {report['frames_written']} frames "
+          f"({report['bytes_written']} bytes), {report['duration_s'] * 1000:.1f} ms -> {status}")
+    for address, plc_word, recipe_word in report["mismatches"][:20]:
+        print(f"   D{address}: PLC={plc_word} recipe={recipe_word}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download named parameter sets to the PLC and verify them.")
+    parser.add_argument("file", help="Recipe file (.json or .csv)")
+    parser.add_argument("recipe", nargs="?", help="Recipe name (omit to list recipes)")
+    parser.add_argument("--ip", default="192.168.3.250")
+    parser.add_argument("--port", type=int, default=502)
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would change")
+    parser.add_argument("--no-verify", action="store_true", help="Skip the read-back")
+    args = parser.parse_args(argv)
+
+    recipes = load_recipes(args.file)
+    if not args.recipe:
+        for name, recipe in recipes.items():
+            print(f"   {name}: {len(recipe.params)} parameters, {len(recipe.words)} registers")
+        return 0
+    if args.recipe not in recipes:
+        print(f"Error: no recipe '{args.recipe}' in {args.file}")
+        return 2
+
+    plc = PLCController(config_print=False)
+    if not plc.plcConnect(args.ip, port=args.port):
+        print("Connection failed. Please check IP address or LAN cable.")
+        return 2
+    try:
+        loader = RecipeLoader(plc)
+        if args.dry_run:
+            for address, (plc_word, word) in sorted(loader.diff(recipes[args.recipe], refresh=True).items()):
+                print(f"   D{address}: {plc_word} -> {word}")
+        report = loader.download(recipes[args.recipe], refresh=True, verify=not args.no_verify,
+                                 dry_run=args.dry_run)
+        print_report(report)
+        return 0 if report["ok"] else 1
+    finally:
+        plc.plcDisconnect()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import time
+import struct
+import bisect
+import argparse
+import itertools
+import threading
+from collections import deque
+from basic.plc_simulator import SimResponse
+
+# Session log: MAGIC, wall-clock start (f8), then one record per Modbus request:
+#   t (f8, s since start), duration (f4, s), function code, status, address, count
+# followed by the values (uint16 little-endian words, or packed bits LSB first):
+# the response for reads, the written values for writes.
+MAGIC = b"PLCREC1\0"
+HEADER = struct.Struct("<d")
+RECORD = struct.Struct("<dfBBHH")
+
+OK, ERROR, EXCEPTION = 0, 1, 2
+
+READ_COILS, READ_INPUTS, READ_REGS = 1, 2, 3
+WRITE_COIL, WRITE_REG, WRITE_COILS, WRITE_REGS = 5, 6, 15, 16
+WORD_FUNCS = (READ_REGS, WRITE_REG, WRITE_REGS)
+FUNC_NAMES = {
+    READ_COILS: "read_coils", READ_INPUTS: "read_discrete_inputs", READ_REGS: "read_holding_registers",
+    WRITE_COIL: "write_coil", WRITE_REG: "write_register", WRITE_COILS: "write_coils", WRITE_REGS: "write_registers",
+}
+# Which address space a function reads or writes (coils, inputs, registers)
+SPACE = {READ_COILS: 0, WRITE_COIL: 0, WRITE_COILS: 0, READ_INPUTS: 1, READ_REGS: 2, WRITE_REG: 2, WRITE_REGS: 2}
+
+
+def _pack(func: int, values: list) -> bytes:
+    if func in WORD_FUNCS:
+        return struct.pack(f"<{len(values)}H", *(int(v) & 0xFFFF for v in values))
+    packed = bytearray((len(values) + 7) // 8)
+    for i, bit in enumerate(values):
+        if bit:
+            packed[i >> 3] |= 1 << (i & 7)
+    return bytes(packed)
+
+
+def _payload_size(func: int, count: int) -> int:
+    return 2 * count if func in WORD_FUNCS else (count + 7) // 8
+
+
+class SessionWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = open(path, "wb")
+        self._file.write(MAGIC + HEADER.pack(time.time()))
+
+    def record(self, func: int, address: int, count: int, started: float, duration: float,
+               status: int, values: list = None):
+        data = RECORD.pack(started - self._t0, duration, func, status, address, count)
+        if values is not None:
+            data += _pack(func, values)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(data)
+                self.records += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_session(path: str) -> tuple[float, list]:
+    """(wall-clock start, [(t, duration, func, status, address, count, values or None), ...])."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"'{path}' is not a PLC session log")
+
+    (started,) = HEADER.unpack_from(data, len(MAGIC))
+    records = []
+    pos = len(MAGIC) + HEADER.size
+    while pos + RECORD.size <= len(data):
+        t, duration, func, status, address, count = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        values = None
+        # Failed reads carry no payload; writes always carry what was sent
+        if status == OK or func not in (READ_COILS, READ_INPUTS, READ_REGS):
+            size = _payload_size(func, count)
+            if pos + size > len(data):
+                break  # Log cut off mid-record
+            if func in WORD_FUNCS:
+                values = list(struct.unpack_from(f"<{count}H", data, pos))
+            else:
+                values = [bool(data[pos + (i >> 3)] >> (i & 7) & 1) for i in range(count)]
+            pos += size
+        records.append((t, duration, func, status, address, count, values))
+    return started, records
+
+
+class RecordingClient:
+    def __init__(self, inner, writer: SessionWriter):
+        """Wraps a pymodbus-compatible client and logs every call to writer."""
+        self.inner = inner
+        self.writer = writer
+
+    def connect(self) -> bool:
+        return self.inner.connect()
+
+    def close(self):
+        return self.inner.close()
+
+    def is_socket_open(self) -> bool:
+        return self.inner.is_socket_open()
+
+    def _call(self, func: int, address: int, count: int, call, values: list = None):
+        started = time.monotonic()
+        try:
+            result = call()
+        except Exception:
+            self.writer.record(func, address, count, started, time.monotonic() - started, EXCEPTION, values)
+            raise
+        duration = time.monotonic() - started
+        status = ERROR if result.isError() else OK
+        if values is None and status == OK:
+            values = list(result.registers[:count]) if func == READ_REGS else list(result.bits[:count])
+        self.writer.record(func, address, count, started, duration, status, values)
+        return result
+
+    def read_coils(self, address, count=1, **kwargs):
+        return self._call(READ_COILS, address, count, lambda: self.inner.read_coils(address, count=count, **kwargs))
+
+    def read_discrete_inputs(self, address, count=1, **kwargs):
+        return self._call(READ_INPUTS, address, count,
+                          lambda: self.inner.read_discrete_inputs(address, count=count, **kwargs))
+
+    def read_holding_registers(self, address, count=1, **kwargs):
+        return self._call(READ_REGS, address, count,
+                          lambda: self.inner.read_holding_registers(address, count=count, **kwargs))
+
+    def write_coil(self, address, value, **kwargs):
+        return self._call(WRITE_COIL, address, 1, lambda: self.inner.write_coil(address, value, **kwargs), [value])
+
+    def write_coils(self, address, values, **kwargs):
+        return self._call(WRITE_COILS, address, len(values),
+                          lambda: self.inner.write_coils(address, values, **kwargs), list(values))
+
+    def write_register(self, address, value, **kwargs):
+        return self._call(WRITE_REG, address, 1, lambda: self.inner.write_register(address, value, **kwargs), [value])
+
+    def write_registers(self, address, values, **kwargs):
+        return self._call(WRITE_REGS, address, len(values),
+                          lambda: self.inner.write_registers(address, values, **kwargs), list(values))
+
+
+class ReplayClient:
+    def __init__(self, path: str, speed: float = 1.0, mode: str = "timeline", latency: bool = True):
+        """
+        เล่นซ้ำ session ที่บันทึกไว้แทน PLC จริง: PLCController(client_factory=lambda ip, port: ReplayClient(path))
+
+        mode="timeline": the PLC state is rebuilt from the recorded reads,
+          and a read returns each address' last recorded value at the
+          current replay time, unless the replaying code wrote that address
+          more recently. Code that polls differently (or reads merged
+          ranges) still sees done bits and positions change when they did
+          in the field.
+        mode="sequence": each (function, address, count) gets its recorded
+          responses back in order, for an exact re-run of the same code.
+
+        The replay clock starts at the first recorded request and runs
+        `speed` times faster than real time. With latency=True every
+        request also takes its recorded round trip, divided by speed.
+        """
+        if mode not in ("timeline", "sequence"):
+            raise ValueError(f"Unknown mode: '{mode}'. Use 'timeline' or 'sequence'.")
+        self.path = path
+        self.speed = speed
+        self.mode = mode
+        self.latency = latency
+        self.served = 0
+        self.misses = 0
+
+        _, self.records = load_session(path)
+        self._first_t = self.records[0][0] if self.records else 0.0
+        self._t0 = None
+        self._lock = threading.Lock()
+
+        # timeline: per address space, recorded read responses in time order,
+        # plus what the replaying code itself wrote ({address: (t, value)})
+        self._times = {0: [], 1: [], 2: []}
+        self._observed = {0: [], 1: [], 2: []}   # (address, values, duration)
+        self._written = {0: {}, 1: {}, 2: {}}
+        # sequence: per (func, address, count), recorded records in order
+        self._queues = {}
+        for record in self.records:
+            t, duration, func, status, address, count, values = record
+            self._queues.setdefault((func, address, count), deque()).append(record)
+            if values is not None and status == OK and func in (READ_COILS, READ_INPUTS, READ_REGS):
+                space = SPACE[func]
+                self._times[space].append(t)
+                self._observed[space].append((address, values, duration))
+
+    def connect(self) -> bool:
+        self._t0 = time.monotonic()
+        return True
+
+    def close(self):
+        self._t0 = None
+
+    def is_socket_open(self) -> bool:
+        return self._t0 is not None
+
+    def now(self) -> float:
+        """Current position on the recording's time axis."""
+        return self._first_t + (time.monotonic() - self._t0) * self.speed
+
+    def _wait(self, duration: float):
+        if self.latency and duration > 0:
+            time.sleep(duration / self.speed)
+
+    def _state(self, space: int, address: int, count: int) -> tuple[list, float]:
+        """Last recorded value of each address at now(); before its first sighting, that first value."""
+        times = self._times[space]
+        observed = self._observed[space]
+        values = [None] * count
+        seen = [-1.0] * count   # when each value was observed; a future sighting counts as oldest
+        missing = count
+        duration = 0.0
+        now = self.now()
+        split = bisect.bisect_right(times, now)
+        for i in itertools.chain(range(split - 1, -1, -1), range(split, len(times))):
+            obs_address, obs_values, obs_duration = observed[i]
+            lo = max(address, obs_address)
+            hi = min(address + count, obs_address + len(obs_values))
+            if lo >= hi:
+                continue
+            if missing == count:
+                duration = obs_duration
+            for a in range(lo, hi):
+                if values[a - address] is None:
+                    values[a - address] = obs_values[a - obs_address]
+                    seen[a - address] = times[i] if i < split else -1.0
+                    missing -= 1
+            if not missing:
+                break
+        if missing:
+            self.misses += 1
+
+        written = self._written[space]
+        for i in range(count):
+            write = written.get(address + i)
+            if write is not None and write[0] >= seen[i]:
+                values[i] = write[1]
+        return values, duration
+
+    def _read(self, func: int, address: int, count: int) -> SimResponse:
+        with self._lock:
+            self.served += 1
+            if self.mode == "sequence":
+                record = self._next(func, address, count)
+                if record is None:
+                    return SimResponse(error=True)
+                values, duration, status = record[6], record[1], record[3]
+            else:
+                values, duration = self._state(SPACE[func], address, count)
+                status = OK
+        self._wait(duration)
+        if status == EXCEPTION:
+            raise IOError(f"Recorded exception for {FUNC_NAMES[func]} at {address}")
+        if status == ERROR:
+            return SimResponse(error=True)
+        if func == READ_REGS:
+            return SimResponse(registers=[v or 0 for v in values])
+        return SimResponse(bits=[bool(v) for v in values])
+
+    def _write(self, func: int, address: int, values: list) -> SimResponse:
+        # Acknowledged as recorded; in timeline mode the value also shows in later reads
+        with self._lock:
+            self.served += 1
+            record = self._next(func, address, len(values))
+            if self.mode == "timeline":
+                now = self.now()
+                written = self._written[SPACE[func]]
+                for i, value in enumerate(values):
+                    written[address + i] = (now, value)
+        if record is None:
+            return SimResponse(error=True) if self.mode == "sequence" else SimResponse()
+        self._wait(record[1])
+        if record[3] == EXCEPTION:
+            raise IOError(f"Recorded exception for {FUNC_NAMES[func]} at {address}")
+        return SimResponse(error=record[3] == ERROR)
+
+    def _next(self, func: int, address: int, count: int):
+        queue = self._queues.get((func, address, count))
+        if not queue:
+            self.misses += 1
+            return None
+        return queue.popleft()
+
+    def read_coils(self, address, count=1, **kwargs):
+        return self._read(READ_COILS, address, count)
+
+    def read_discrete_inputs(self, address, count=1, **kwargs):
+        return self._read(READ_INPUTS, address, count)
+
+    def read_holding_registers(self, address, count=1, **kwargs):
+        return self._read(READ_REGS, address, count)
+
+    def write_coil(self, address, value, **kwargs):
+        return self._write(WRITE_COIL, address, [bool(value)])
+
+    def write_coils(self, address, values, **kwargs):
+        return self._write(WRITE_COILS, address, [bool(v) for v in values])
+
+    def write_register(self, address, value, **kwargs):
+        return self._write(WRITE_REG, address, [int(value) & 0xFFFF])
+
+    def write_registers(self, address, values, **kwargs):
+        return self._write(WRITE_REGS, address, [int(v) & 0xFFFF for v in values])
+
+
+def summarize(records: list) -> list:
+    """[(function name, requests, errors, mean ms, p95 ms, max ms), ...]"""
+    rows = []
+    for func in sorted({record[2] for record in records}):
+        durations = sorted(record[1] * 1000 for record in records if record[2] == func)
+        errors = sum(1 for record in records if record[2] == func and record[3] != OK)
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        rows.append((FUNC_NAMES.get(func, str(func)), len(durations), errors,
+                     sum(durations) / len(durations), p95, durations[-1]))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a recorded PLC session log.")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    started, records = load_session(args.path)
+    span = records[-1][0] - records[0][0] if records else 0.0
+    print(f"   Recorded {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}, "
+          f"{len(records)} requests over {span:.2f} s")
+    print(f"   {'Function':<24} {'Count':>7} {'Errors':>6} {'Mean ms':>8} {'P95 ms':>8} {'Max ms':>8}")
+    for name, count, errors, mean, p95, peak in summarize(records):
+        print(f"   {name:<24} {count:>7} {errors:>6} {mean:>8.2f} {p95:>8.2f} {peak:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
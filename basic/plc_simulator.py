@@ -0,0 +1,248 @@
+import time
+import struct
+import threading
+import socketserver
+
+# Same mapping as PLCController defaults
+OFFSET_M = 8192
+
+# DDRVI handshake used by servo/mj4r_servo.ddrvi:
+#   D[axis*100] position (32-bit), D[axis*100+2] speed (32-bit), M[axis*100] start,
+#   M[axis*100+10] done, M[axis*100+11] error, D5500+(axis-1)*40 monitor block
+MONITOR_BASE = 5500
+MONITOR_STRIDE = 40
+
+
+class SimResponse:
+    def __init__(self, bits=None, registers=None, error: bool = False):
+        self.bits = bits or []
+        self.registers = registers or []
+        self._error = error
+
+    def isError(self) -> bool:
+        return self._error
+
+
+class SimulatedPLC:
+    def __init__(self, axis_count: int = 4, time_scale: float = 1.0, latency: float = 0.0,
+                 stop_offset: int = None):
+        """
+        In-memory FX5U stand-in for offline runs and CI.
+
+        Holds coils, discrete inputs and holding registers, and plays back the
+        DDRVI start/done handshake for axis_count axes. Moves take
+        |position| / speed seconds multiplied by time_scale. latency adds a
+        fixed delay per request to mimic the network round trip.
+        stop_offset models a PLC program with an abort relay: a rising edge
+        on M[axis*100+stop_offset] ends that axis' move where it is. The
+        stock program has none, so it is off by default.
+        """
+        self.axis_count = axis_count
+        self.time_scale = time_scale
+        self.latency = latency
+        self.stop_offset = stop_offset
+
+        self.coils = {}
+        self.inputs = {}
+        self.registers = {}
+        self._moves = {}   # axis -> (t_start, t_end, start_pos, distance, speed)
+        self._lock = threading.RLock()
+
+    def client(self, ip: str = "sim", port: int = 502) -> "SimulatedClient":
+        """Matches PLCController(client_factory=...)."""
+        return SimulatedClient(self)
+
+    def serve_tcp(self, host: str = "127.0.0.1", port: int = 5502) -> socketserver.ThreadingTCPServer:
+        """
+        Serve this simulator as a Modbus TCP server (FC1/2/3/5/6/15/16) on a
+        background thread, for tools that open their own sockets. Stop it
+        with server.shutdown(); server.server_close().
+        """
+        server = _ModbusServer((host, port), _ModbusHandler)
+        server.plc = self
+        threading.Thread(target=server.serve_forever, name="SimulatedPLC-TCP", daemon=True).start()
+        return server
+
+    # --- register helpers ---
+    def _get32(self, address: int) -> int:
+        low = self.registers.get(address, 0)
+        high = self.registers.get(address + 1, 0)
+        val_32 = (high << 16) | low
+        return val_32 - 0x100000000 if val_32 > 0x7FFFFFFF else val_32
+
+    def _set32(self, address: int, value: int):
+        val_32 = int(value) & 0xFFFFFFFF
+        self.registers[address] = val_32 & 0xFFFF
+        self.registers[address + 1] = (val_32 >> 16) & 0xFFFF
+
+    # --- motion model ---
+    def _start_move(self, axis: int):
+        distance = self._get32(axis * 100)
+        speed = abs(self._get32(axis * 100 + 2))
+        done_addr = OFFSET_M + axis * 100 + 10
+
+        if speed == 0:
+            self.coils[done_addr + 1] = True  # err bit
+            return
+
+        monitor = MONITOR_BASE + (axis - 1) * MONITOR_STRIDE
+        now = time.monotonic()
+        duration = abs(distance) / speed * self.time_scale
+        self._moves[axis] = (now, now + duration, self._get32(monitor), distance, speed)
+        self.coils[done_addr] = False
+
+    def _stop_move(self, axis: int):
+        # Decelerate-to-stop is modelled as an immediate stop where the axis is now
+        self.advance()
+        move = self._moves.pop(axis, None)
+        if move is not None:
+            monitor = MONITOR_BASE + (axis - 1) * MONITOR_STRIDE
+            self._set32(monitor + 4, 0)
+            self.coils[OFFSET_M + axis * 100 + 10] = True
+
+    def advance(self):
+        """Bring monitor registers and done bits up to the current time."""
+        now = time.monotonic()
+        with self._lock:
+            for axis, (t_start, t_end, start_pos, distance, speed) in list(self._moves.items()):
+                monitor = MONITOR_BASE + (axis - 1) * MONITOR_STRIDE
+                if now >= t_end:
+                    self._set32(monitor, start_pos + distance)
+                    self._set32(monitor + 4, 0)
+                    self.coils[OFFSET_M + axis * 100 + 10] = True
+                    del self._moves[axis]
+                else:
+                    fraction = (now - t_start) / (t_end - t_start)
+                    self._set32(monitor, start_pos + round(distance * fraction))
+                    self._set32(monitor + 4, speed if distance >= 0 else -speed)
+
+    def _write_coil(self, address: int, value: bool):
+        value = bool(value)
+        previous = self.coils.get(address, False)
+        self.coils[address] = value
+        axis, rem = divmod(address - OFFSET_M, 100)
+        if value and not previous and 1 <= axis <= self.axis_count:
+            if rem == 0:
+                self._start_move(axis)
+            elif self.stop_offset is not None and rem == self.stop_offset:
+                self._stop_move(axis)
+
+
+class SimulatedClient:
+    def __init__(self, plc: SimulatedPLC):
+        """One connection to a SimulatedPLC, with the pymodbus sync client calls PLCController uses."""
+        self.plc = plc
+        self._open = False
+
+    def connect(self) -> bool:
+        self._open = True
+        return True
+
+    def close(self):
+        self._open = False
+
+    def is_socket_open(self) -> bool:
+        return self._open
+
+    def _request(self):
+        if self.plc.latency:
+            time.sleep(self.plc.latency)
+        self.plc.advance()
+
+    def read_coils(self, address: int, count: int = 1, **kwargs) -> SimResponse:
+        self._request()
+        with self.plc._lock:
+            return SimResponse(bits=[self.plc.coils.get(address + i, False) for i in range(count)])
+
+    def read_discrete_inputs(self, address: int, count: int = 1, **kwargs) -> SimResponse:
+        self._request()
+        with self.plc._lock:
+            return SimResponse(bits=[self.plc.inputs.get(address + i, False) for i in range(count)])
+
+    def read_holding_registers(self, address: int, count: int = 1, **kwargs) -> SimResponse:
+        self._request()
+        with self.plc._lock:
+            return SimResponse(registers=[self.plc.registers.get(address + i, 0) for i in range(count)])
+
+    def write_coil(self, address: int, value: bool, **kwargs) -> SimResponse:
+        self._request()
+        with self.plc._lock:
+            self.plc._write_coil(address, value)
+        return SimResponse()
+
+    def write_coils(self, address: int, values: list, **kwargs) -> SimResponse:
+        self._request()
+        with self.plc._lock:
+            for i, value in enumerate(values):
+                self.plc._write_coil(address + i, value)
+        return SimResponse()
+
+    def write_register(self, address: int, value: int, **kwargs) -> SimResponse:
+        self._request()
+        with self.plc._lock:
+            self.plc.registers[address] = int(value) & 0xFFFF
+        return SimResponse()
+
+    def write_registers(self, address: int, values: list, **kwargs) -> SimResponse:
+        self._request()
+        with self.plc._lock:
+            for i, value in enumerate(values):
+                self.plc.registers[address + i] = int(value) & 0xFFFF
+        return SimResponse()
+
+
+class _ModbusServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _ModbusHandler(socketserver.BaseRequestHandler):
+    def _recv(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("closed")
+            data += chunk
+        return data
+
+    def handle(self):
+        client = SimulatedClient(self.server.plc)
+        client.connect()
+        try:
+            while True:
+                tid, _, length, unit = struct.unpack(">HHHB", self._recv(7))
+                pdu = self._recv(length - 1)
+                reply = self._dispatch(client, pdu)
+                self.request.sendall(struct.pack(">HHHB", tid, 0, len(reply) + 1, unit) + reply)
+        except (ConnectionError, OSError):
+            pass
+
+    def _dispatch(self, client, pdu: bytes) -> bytes:
+        fc = pdu[0]
+        if fc in (1, 2, 3):
+            address, count = struct.unpack(">HH", pdu[1:5])
+            if fc == 3:
+                words = client.read_holding_registers(address, count=count).registers
+                return struct.pack(f">BB{count}H", fc, 2 * count, *words)
+            bits = (client.read_coils if fc == 1 else client.read_discrete_inputs)(address, count=count).bits
+            packed = bytearray((count + 7) // 8)
+            for i, bit in enumerate(bits):
+                if bit:
+                    packed[i >> 3] |= 1 << (i & 7)
+            return struct.pack(">BB", fc, len(packed)) + bytes(packed)
+        if fc in (5, 6):
+            address, value = struct.unpack(">HH", pdu[1:5])
+            if fc == 5:
+                client.write_coil(address, value == 0xFF00)
+            else:
+                client.write_register(address, value)
+            return pdu[:5]
+        if fc in (15, 16):
+            address, count, _ = struct.unpack(">HHB", pdu[1:6])
+            if fc == 16:
+                client.write_registers(address, list(struct.unpack(f">{count}H", pdu[6:6 + 2 * count])))
+            else:
+                client.write_coils(address, [bool(pdu[6 + (i >> 3)] >> (i & 7) & 1) for i in range(count)])
+            return pdu[:5]
+        return struct.pack(">BB", fc | 0x80, 1)  # Illegal function
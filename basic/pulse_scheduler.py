@@ -0,0 +1,169 @@
+import heapq
+import threading
+import time
+
+
+class PulseScheduler:
+    def __init__(self, flush, resolution: float = 0.001, min_off: float = 0.0):
+        """
+        Single-thread timer for the OFF edge of every non-blocking pulse.
+
+        flush(keys) is called with all keys that fall due within the same
+        resolution window, so the owner can batch the OFF writes. A key
+        triggered again within min_off of its OFF write waits out the rest,
+        so the PLC scan sees the OFF and the new rising edge.
+        """
+        self._flush = flush
+        self._resolution = resolution
+        self.min_off = min_off
+        self._off_at = {}    # key -> monotonic time of its last OFF write
+
+        self._heap = []      # (due, seq, key), stale entries are skipped lazily
+        self._pending = {}   # key -> (due, seq)
+        self._seq = 0
+        self._generation = {}   # key -> times armed; a popped OFF is dropped if this moved on
+
+        # Held while an ON edge is written and armed, and while a due OFF edge
+        # is re-checked and written, so a stale OFF can never land after a new ON
+        self._fire_lock = threading.RLock()
+
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def schedule(self, key, duration: float):
+        """Arm (or re-arm) the OFF action for key, duration seconds from now."""
+        with self._cond:
+            self._arm(key, time.monotonic() + max(duration, 0.0))
+
+    def trigger(self, key, duration: float, switch_on) -> bool:
+        """
+        Start a pulse: retrigger it if still ON, otherwise call switch_on()
+        and arm the OFF edge only when that write succeeded.
+        """
+        with self._fire_lock:
+            if self.extend(key, duration):
+                return True
+            off_at = self._off_at.get(key)
+            if off_at is not None:
+                remaining = self.min_off - (time.monotonic() - off_at)
+                if remaining > 0:
+                    time.sleep(remaining)
+            if not switch_on():
+                return False
+            self.schedule(key, duration)
+            return True
+
+    def extend(self, key, duration: float) -> bool:
+        """Retrigger a pulse that is still ON. Returns False if key is not pending."""
+        with self._cond:
+            entry = self._pending.get(key)
+            if entry is None:
+                return False
+            # Retrigger never shortens a pulse that is already running
+            self._arm(key, max(entry[0], time.monotonic() + max(duration, 0.0)))
+            return True
+
+    def cancel(self, key, fire: bool = False) -> bool:
+        """Drop a pending pulse. With fire=True the OFF action runs immediately."""
+        with self._fire_lock:
+            with self._cond:
+                if self._pending.pop(key, None) is None:
+                    return False
+            if fire:
+                self._safe_flush([key])
+        return True
+
+    def is_pending(self, key) -> bool:
+        with self._cond:
+            return key in self._pending
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def stop(self, flush_pending: bool = True):
+        """Stop the worker thread. Pending pulses are switched OFF unless told otherwise."""
+        with self._cond:
+            self._running = False
+            keys = list(self._pending)
+            self._pending.clear()
+            self._heap.clear()
+            self._cond.notify()
+            thread = self._thread
+            self._thread = None
+
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        if flush_pending and keys:
+            self._safe_flush(keys)
+
+    def _arm(self, key, due: float):
+        self._seq += 1
+        self._pending[key] = (due, self._seq)
+        self._generation[key] = self._generation.get(key, 0) + 1
+        heapq.heappush(self._heap, (due, self._seq, key))
+
+        # Retriggers leave stale heap entries behind; rebuild once they dominate
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = [(d, s, k) for k, (d, s) in self._pending.items()]
+            heapq.heapify(self._heap)
+
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="PulseScheduler", daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def _pop_due(self) -> list:
+        """Block until something is due, then pop every key inside the resolution window."""
+        while self._running and self._thread is threading.current_thread():
+            while self._heap:
+                due, seq, key = self._heap[0]
+                entry = self._pending.get(key)
+                if entry is not None and entry[1] == seq:
+                    break
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                self._cond.wait()
+                continue
+
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+
+            horizon = time.monotonic() + self._resolution
+            keys = []
+            while self._heap and self._heap[0][0] <= horizon:
+                due, seq, key = heapq.heappop(self._heap)
+                entry = self._pending.get(key)
+                if entry is not None and entry[1] == seq:
+                    del self._pending[key]
+                    keys.append((key, self._generation[key]))
+            if keys:
+                return keys
+        return []
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._pop_due()
+            if not due:
+                return
+            with self._fire_lock:
+                # A key re-armed between the pop and here belongs to a new pulse
+                with self._cond:
+                    keys = [key for key, generation in due if self._generation.get(key) == generation]
+                if keys:
+                    self._safe_flush(keys)
+
+    def _safe_flush(self, keys: list):
+        try:
+            self._flush(keys)
+            now = time.monotonic()
+            for key in keys:
+                self._off_at[key] = now
+        except Exception as e:
+            print(f"[PulseScheduler] flush failed for {keys}: {e}")
@@ -0,0 +1,130 @@
+from functools import lru_cache
+
+# Speed unit that goes with each position unit
+SPEED_UNITS = {"pulse": "pps", "rev": "rpm", "deg": "deg/s"}
+
+
+class AxisProfile:
+    # Resolved (position, speed) tuples kept per profile for repeated moves
+    COMMAND_CACHE_SIZE = 256
+
+    def __init__(self, ppr: int = 10000, unit: str = "pulse", gear_ratio: float = 1.0,
+                 max_travel: float = None, max_speed: float = None):
+        """
+        Unit conversion for one axis, compiled once.
+
+        unit is "pulse" (speed in pps), "rev" (rpm) or "deg" (deg/s).
+        gear_ratio is motor revs per load rev, so pulses per load rev are
+        ppr * gear_ratio. max_travel (per move) and max_speed are given in
+        the profile unit and checked before anything is sent to the PLC.
+
+        Profiles are treated as immutable; build a new one to change them.
+        """
+        unit = unit.lower()
+        if unit not in SPEED_UNITS:
+            raise ValueError(f"Unknown MODE: '{unit}'. Use 'pulse', 'rev', or 'deg'.")
+
+        self.ppr = ppr
+        self.unit = unit
+        self.gear_ratio = gear_ratio
+
+        pulses_per_rev = ppr * gear_ratio
+        if unit == "pulse":
+            self.position_factor, self.speed_factor = 1.0, 1.0
+        elif unit == "rev":
+            self.position_factor, self.speed_factor = pulses_per_rev, pulses_per_rev / 60.0
+        else:
+            self.position_factor, self.speed_factor = pulses_per_rev / 360.0, pulses_per_rev / 360.0
+
+        # Pulse mode keeps ddrvi's historical truncation; other units round
+        self._round = int if unit == "pulse" else round
+
+        self.max_travel_pulses = None if max_travel is None else abs(max_travel) * self.position_factor
+        self.max_speed_pps = None if max_speed is None else abs(max_speed) * self.speed_factor
+        self._commands = {}
+
+    @classmethod
+    @lru_cache(maxsize=64)
+    def for_mode(cls, ppr: int, mode: str) -> "AxisProfile":
+        """Shared profile for ddrvi-style (PPR, MODE) arguments."""
+        return cls(ppr=ppr, unit=mode)
+
+    def with_unit(self, unit: str) -> "AxisProfile":
+        if unit.lower() == self.unit:
+            return self
+        profile = AxisProfile(self.ppr, unit, self.gear_ratio)
+        # Limits are physical, so they carry over unchanged in pulses / pps
+        profile.max_travel_pulses = self.max_travel_pulses
+        profile.max_speed_pps = self.max_speed_pps
+        return profile
+
+    @property
+    def speed_unit(self) -> str:
+        return SPEED_UNITS[self.unit]
+
+    def to_pulses(self, position):
+        """Position in profile unit -> pulses. Accepts a scalar, a list or a NumPy array."""
+        return self._convert(position, self.position_factor)
+
+    def to_pps(self, speed):
+        """Speed in profile unit -> pps. Accepts a scalar, a list or a NumPy array."""
+        return self._convert(speed, self.speed_factor)
+
+    def from_pulses(self, pulses):
+        return self._scale(pulses, 1.0 / self.position_factor)
+
+    def from_pps(self, pps):
+        return self._scale(pps, 1.0 / self.speed_factor)
+
+    def command(self, target, speed) -> tuple[int, int]:
+        """Resolved (pulses, pps) for one move, validated against the limits and memoized."""
+        key = (target, speed)
+        resolved = self._commands.get(key)
+        if resolved is None:
+            resolved = (self.to_pulses(target), self.to_pps(speed))
+            self.check(*resolved)
+            if len(self._commands) >= self.COMMAND_CACHE_SIZE:
+                self._commands.clear()
+            self._commands[key] = resolved
+        return resolved
+
+    def compile_moves(self, targets, speeds):
+        """Bulk version of command() for streamed segments. Returns (pulses, pps) arrays."""
+        import numpy as np
+
+        pulses = self.to_pulses(np.asarray(targets, dtype=float))
+        pps = self.to_pps(np.asarray(speeds, dtype=float))
+        if self.max_travel_pulses is not None and np.any(np.abs(pulses) > self.max_travel_pulses):
+            raise ValueError(f"Travel limit exceeded: {self.max_travel_pulses:.0f} pulses per move")
+        if self.max_speed_pps is not None and np.any(np.abs(pps) > self.max_speed_pps):
+            raise ValueError(f"Speed limit exceeded: {self.max_speed_pps:.0f} pps")
+        return pulses, pps
+
+    def check(self, pulses: int, pps: int):
+        if self.max_travel_pulses is not None and abs(pulses) > self.max_travel_pulses:
+            raise ValueError(f"Travel {pulses} pulses exceeds limit of {self.max_travel_pulses:.0f} pulses")
+        if self.max_speed_pps is not None and abs(pps) > self.max_speed_pps:
+            raise ValueError(f"Speed {pps} pps exceeds limit of {self.max_speed_pps:.0f} pps")
+
+    def _convert(self, value, factor):
+        if isinstance(value, (int, float)):
+            return self._round(value * factor)
+        if hasattr(value, "__array__"):
+            import numpy as np
+
+            scaled = np.asarray(value, dtype=float) * factor
+            return (np.trunc(scaled) if self.unit == "pulse" else np.rint(scaled)).astype(np.int64)
+        return [self._round(v * factor) for v in value]
+
+    @staticmethod
+    def _scale(value, factor):
+        if isinstance(value, (int, float)):
+            return value * factor
+        if hasattr(value, "__array__"):
+            import numpy as np
+
+            return np.asarray(value, dtype=float) * factor
+        return [v * factor for v in value]
+
+    def __repr__(self):
+        return f"AxisProfile(ppr={self.ppr}, unit='{self.unit}', gear_ratio={self.gear_ratio})"
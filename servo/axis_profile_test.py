@@ -0,0 +1,28 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from servo.axis_profile import AxisProfile
+
+
+def test_with_unit_keeps_limits():
+    profile = AxisProfile(ppr=10000, unit="rev", max_travel=2, max_speed=600)
+    for unit in ("pulse", "deg", "rev"):
+        converted = profile.with_unit(unit)
+        assert converted.max_travel_pulses == profile.max_travel_pulses
+        assert converted.max_speed_pps == profile.max_speed_pps
+
+    deg = profile.with_unit("deg")
+    deg.command(720, 3600)          # exactly 2 rev at 600 rpm
+    for target, speed in ((721, 3600), (720, 3601)):
+        try:
+            deg.command(target, speed)
+        except ValueError:
+            continue
+        raise AssertionError(f"{target} deg at {speed} deg/s should exceed the limits")
+
+
+if __name__ == "__main__":
+    test_with_unit_keeps_limits()
+    print("axis_profile: OK")
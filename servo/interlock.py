@@ -0,0 +1,360 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import re
+import ast
+import json
+import time
+import queue
+import argparse
+import threading
+from basic.plc_module import PLCController, coalesce_ranges, words_to_int32
+from servo.mj4r_servo import ddrvi_addresses
+
+# Same monitor block as servo.position_monitor: position (32-bit) at +0, speed (32-bit) at +4
+MONITOR_BASE = 5500
+MONITOR_STRIDE = 40
+MONITOR_WORDS = 6
+
+# Names a rule can use, per axis n: pos<n>, spd<n>, moving<n>, trig<n>, done<n>, err<n>;
+# across axes: any_err, moving_count; and raw devices such as X0, Y3, M500 or D100 (16-bit word)
+AXIS_FIELDS = ("pos", "spd", "moving", "trig", "done", "err")
+AXIS_NAME = re.compile(r"^(pos|spd|moving|trig|done|err)(\d+)$")
+DEVICE_NAME = re.compile(r"^([XYMD])(\d+)$")
+FUNCTIONS = {"abs": abs, "min": min, "max": max}
+
+# Index of the built-in rule that trips when the PLC cannot be read
+COMM_LOSS = -1
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Compare, ast.Lt, ast.LtE,
+    ast.Gt, ast.GtE, ast.Eq, ast.NotEq, ast.Name, ast.Load, ast.Constant, ast.Call,
+)
+
+
+class Rule:
+    def __init__(self, name: str, when: str, stop=None, set_relays=None):
+        """
+        One interlock: when `when` is true the rule trips.
+
+        stop: axes whose stop relay is set (default: every axis the rule mentions)
+        set_relays: extra M relays to switch ON, e.g. [900] for a common alarm
+        """
+        self.name = name
+        self.when = when
+        self.tree = ast.parse(when, mode="eval")
+        for node in ast.walk(self.tree):
+            if not isinstance(node, ALLOWED_NODES):
+                raise ValueError(f"Rule '{name}': '{type(node).__name__}' is not allowed in '{when}'")
+            if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS):
+                raise ValueError(f"Rule '{name}': only {', '.join(FUNCTIONS)} can be called")
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, bool)):
+                raise ValueError(f"Rule '{name}': only numeric constants are allowed")
+
+        self.names = {node.id for node in ast.walk(self.tree)
+                      if isinstance(node, ast.Name) and node.id not in FUNCTIONS}
+        mentioned = sorted({int(AXIS_NAME.match(n).group(2)) for n in self.names if AXIS_NAME.match(n)})
+        self.stop = list(stop) if stop is not None else mentioned
+        self.set_relays = list(set_relays or [])
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Rule":
+        return cls(data["name"], data["when"], data.get("stop"), data.get("set"))
+
+
+def compile_rules(rules: list, axes: list):
+    """
+    Turn every rule into one generated function, so a scan costs one call
+    with each variable loaded once, whatever the number of rules:
+
+        def evaluate(v):
+            pos1 = v["pos1"]; err2 = v["err2"]; ...
+            tripped = []
+            try:
+                if (pos1 > 500000): tripped.append(0)
+            except Exception:
+                tripped.append(0)
+            ...
+            return tripped
+
+    A rule that raises (e.g. pos1 / spd1 with the axis at rest) trips: an
+    interlock that cannot be evaluated is treated as broken.
+    """
+    known = {f"{field}{axis}" for field in AXIS_FIELDS for axis in axes} | {"any_err", "moving_count"}
+    names = set()
+    for rule in rules:
+        for name in rule.names:
+            if name not in known and not DEVICE_NAME.match(name):
+                raise ValueError(f"Rule '{rule.name}': unknown name '{name}'")
+        names |= rule.names
+
+    lines = ["def evaluate(v):"]
+    lines += [f"    {name} = v[{name!r}]" for name in sorted(names)]
+    lines.append("    tripped = []")
+    for index, rule in enumerate(rules):
+        lines.append("    try:")
+        lines.append(f"        if ({ast.unparse(rule.tree.body)}): tripped.append({index})")
+        lines.append("    except Exception:")
+        lines.append(f"        tripped.append({index})")
+    lines.append("    return tripped")
+
+    namespace = dict(FUNCTIONS)
+    exec(compile("\n".join(lines), "<interlock rules>", "exec"), namespace)
+    return namespace["evaluate"], names
+
+
+class InterlockEvaluator:
+    def __init__(self, plc: PLCController, rules: list, axes=(1, 2, 3, 4),
+                 stop_relays: dict = None, interval: float = 0.02, comm_timeout: float = 0.1):
+        """
+        ตรวจ interlock ของทุกแกนจาก snapshot เดียวต่อรอบสแกน
+
+        Each scan reads the monitor blocks, the DDRVI handshake bits and any
+        device a rule names in as few ranged reads as possible; the number
+        of rules does not change the I/O. Rules whose condition is true trip
+        (latched until reset()); in the same scan the stop relays of their
+        axes (stop_relays={axis: M address}) and their own relays are
+        switched ON with contiguous FC15 writes, retried every scan until
+        they succeed. If no scan has read the PLC for comm_timeout seconds
+        the built-in "comm_loss" rule trips every stop relay, or every
+        relay the rules set when there are no stop relays. Trips are also
+        queued on `events` as (rule name, time, values).
+
+        A dead link is only noticed once a read gives up, so build the
+        PLCController with timeout=comm_timeout and retries=0.
+        """
+        self.plc = plc
+        self.rules = [rule if isinstance(rule, Rule) else Rule.from_dict(rule) for rule in rules]
+        self.axes = list(axes)
+        self.stop_relays = dict(stop_relays or {})
+        self.interval = interval
+        self.comm_timeout = comm_timeout
+        self.events = queue.Queue()
+
+        self.evaluate, names = compile_rules(self.rules, self.axes)
+        for rule in self.rules:
+            missing = [axis for axis in rule.stop if axis not in self.stop_relays]
+            if missing and not rule.set_relays:
+                raise ValueError(f"Rule '{rule.name}': no stop relay for axis {missing} and no relay to set")
+        fallback = [] if self.stop_relays else sorted({relay for rule in self.rules for relay in rule.set_relays})
+        if not self.stop_relays and not fallback:
+            raise ValueError("comm_loss has nothing to switch: configure stop_relays or rules with relays to set")
+        self.comm_rule = Rule("comm_loss", "False", stop=sorted(self.stop_relays), set_relays=fallback)
+        # Only a real Modbus client blocks on a dead link; simulator and replay clients answer at once
+        blocking = getattr(plc, "timeout", 0) * (getattr(plc, "retries", 0) + 1)
+        if getattr(plc, "client_factory", None) is None and blocking > comm_timeout:
+            print(f"[Interlock] A failed read blocks for up to {blocking:.1f} s, so comm loss trips "
+                  f"after that, not after comm_timeout={comm_timeout} s")
+
+        self.monitor_reads = coalesce_ranges(
+            [(MONITOR_BASE + (axis - 1) * MONITOR_STRIDE, MONITOR_WORDS) for axis in self.axes], plc.MAX_READ_REGS)
+        self.bit_reads = coalesce_ranges(
+            [(ddrvi_addresses(axis)["trigger"], 12) for axis in self.axes], plc.MAX_READ_BITS)
+        self.device_tags = {}   # device -> [(name, address)]
+        for name in sorted(names):
+            match = DEVICE_NAME.match(name)
+            if match:
+                self.device_tags.setdefault(match.group(1), []).append((name, int(match.group(2))))
+        self.device_reads = {
+            device: coalesce_ranges([(address, 1) for _, address in tags],
+                                    plc.MAX_READ_REGS if device == "D" else plc.MAX_READ_BITS)
+            for device, tags in self.device_tags.items()
+        }
+
+        self.tripped = {}         # rule index -> time it tripped
+        self._unwritten = set()   # tripped rules whose relays have not been written yet
+        self._last_read = time.monotonic()
+        self.scans = 0
+        self.last_scan_s = 0.0    # read + evaluate + stop writes
+        self.last_eval_s = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _rule(self, index: int) -> Rule:
+        return self.comm_rule if index == COMM_LOSS else self.rules[index]
+
+    def _relays(self, indexes) -> set:
+        relays = set()
+        for index in indexes:
+            rule = self._rule(index)
+            relays.update(self.stop_relays[axis] for axis in rule.stop if axis in self.stop_relays)
+            relays.update(rule.set_relays)
+        return relays
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._last_read = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="InterlockEvaluator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _read(self, device: str, reads: list) -> dict:
+        values = {}
+        for start, count in reads:
+            chunk, ok = self.plc.read_device_range(device, start, count, max_age=0)
+            if not ok:
+                return None
+            for i, value in enumerate(chunk):
+                values[start + i] = value
+        return values
+
+    def snapshot(self) -> dict:
+        """Every variable the rules can use, from one scan. None if a read failed."""
+        words = self._read("D", self.monitor_reads)
+        bits = words is not None and self._read("M", self.bit_reads)
+        if not bits:
+            return None
+
+        values = {}
+        for axis in self.axes:
+            base = MONITOR_BASE + (axis - 1) * MONITOR_STRIDE
+            addr = ddrvi_addresses(axis)
+            values[f"pos{axis}"] = words_to_int32(words[base], words[base + 1])
+            values[f"spd{axis}"] = words_to_int32(words[base + 4], words[base + 5])
+            values[f"moving{axis}"] = values[f"spd{axis}"] != 0
+            values[f"trig{axis}"] = bits[addr["trigger"]]
+            values[f"done{axis}"] = bits[addr["done"]]
+            values[f"err{axis}"] = bits[addr["err"]]
+        values["any_err"] = any(values[f"err{axis}"] for axis in self.axes)
+        values["moving_count"] = sum(values[f"moving{axis}"] for axis in self.axes)
+
+        for device, tags in self.device_tags.items():
+            raw = self._read(device, self.device_reads[device])
+            if raw is None:
+                return None
+            for name, address in tags:
+                values[name] = raw[address]
+        return values
+
+    def scan_once(self) -> list:
+        """Read, evaluate and act. Returns the names of rules that tripped in this scan."""
+        started = time.perf_counter()
+        values = self.snapshot()
+        if values is None:
+            # Lost comms is a fault: past comm_timeout the axes are stopped
+            hits = [COMM_LOSS] if time.monotonic() - self._last_read >= self.comm_timeout else []
+            values = {}
+        else:
+            self._last_read = time.monotonic()
+            evaluated = time.perf_counter()
+            try:
+                hits = self.evaluate(values)
+            except Exception:
+                hits = list(range(len(self.rules)))
+            self.last_eval_s = time.perf_counter() - evaluated
+
+        with self._lock:
+            new = [index for index in hits if index not in self.tripped]
+            now = time.time()
+            for index in new:
+                self.tripped[index] = now
+            self._unwritten.update(new)
+            pending = sorted(self._unwritten)
+        if pending:
+            # A failed write stays pending and is sent again on the next scan
+            if self._write_relays(sorted(self._relays(pending)), True):
+                with self._lock:
+                    self._unwritten.difference_update(pending)
+        for index in new:
+            self.events.put((self._rule(index).name, now, values))
+
+        self.scans += 1
+        self.last_scan_s = time.perf_counter() - started
+        return [self._rule(index).name for index in new]
+
+    def _write_relays(self, addresses: list, status: bool) -> bool:
+        # Contiguous relays go out as one FC15 write
+        ok = True
+        run = []
+        for address in addresses + [None]:
+            if run and address == run[-1] + 1:
+                run.append(address)
+                continue
+            if run:
+                ok = self.plc.write_M_range(run[0], [status] * len(run)) and ok
+            run = [address]
+        return ok
+
+    def reset(self, names: list = None) -> bool:
+        """Clear latched trips (all, or by rule name) and release relays no other trip holds."""
+        with self._lock:
+            cleared = [index for index in self.tripped
+                       if names is None or self._rule(index).name in names]
+            for index in cleared:
+                del self.tripped[index]
+                self._unwritten.discard(index)
+            held = self._relays(self.tripped)
+        return self._write_relays(sorted(self._relays(cleared) - held), False)
+
+    def tripped_rules(self) -> list:
+        with self._lock:
+            return [self._rule(index).name for index in self.tripped]
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            self.scan_once()
+            remaining = self.interval - (time.monotonic() - started)
+            if remaining > 0:
+                self._stop_event.wait(remaining)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch interlock rules on every scan and stop axes that break them.")
+    parser.add_argument("rules", help='JSON: {"axes": [1, 2], "stop_relays": {"1": 150}, "rules": [...]}')
+    parser.add_argument("--ip", default="192.168.3.250")
+    parser.add_argument("--port", type=int, default=502)
+    parser.add_argument("--interval", type=float, default=0.02, help="Scan period in seconds (default: 0.02)")
+    parser.add_argument("--comm-timeout", type=float, default=0.1,
+                        help="Trip comm_loss after this long without a good read (default: 0.1)")
+    parser.add_argument("--simulate", action="store_true", help="Run against the in-process PLC simulator")
+    args = parser.parse_args(argv)
+
+    with open(args.rules) as f:
+        config = json.load(f)
+
+    client_factory = None
+    if args.simulate:
+        from basic.plc_simulator import SimulatedPLC
+
+        client_factory = SimulatedPLC(axis_count=max(config.get("axes", [4]))).client
+    # Reads give up after comm_timeout, so a dead link trips comm_loss on time
+    plc = PLCController(config_print=False, client_factory=client_factory, timeout=args.comm_timeout, retries=0)
+    if not plc.plcConnect(args.ip, port=args.port):
+        print("Connection failed. Please check IP address or LAN cable.")
+        return 2
+
+    evaluator = InterlockEvaluator(
+        plc, config["rules"], axes=config.get("axes", [1, 2, 3, 4]),
+        stop_relays={int(axis): address for axis, address in config.get("stop_relays", {}).items()},
+        interval=args.interval, comm_timeout=args.comm_timeout)
+    evaluator.start()
+    print(f">> Watching {len(evaluator.rules)} rules on axes {evaluator.axes} every {args.interval * 1000:.0f} ms")
+    try:
+        while True:
+            try:
+                name, when, _ = evaluator.events.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            print(f">> [{time.strftime('%H:%M:%S', time.localtime(when))}] TRIPPED: {name}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        evaluator.stop()
+        plc.plcDisconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
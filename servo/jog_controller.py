@@ -0,0 +1,127 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import threading
+from servo.mj4r_servo import execute_move, get_plc
+
+
+class JogController:
+    def __init__(self, axis: int, plc=None, stream_period: float = 0.05, stop_addr: int = None):
+        """
+        One persistent jog worker per axis.
+
+        step() queues a single relative move. hold() streams short DDRVI
+        segments, each about stream_period long at the current speed, until
+        release(), so motion ends within one segment after the button is let
+        go. Only the newest command is kept: a new step or hold replaces
+        anything still pending.
+
+        The DDRVI handshake cannot queue a move behind a running one, so a
+        hold is back-to-back segments with a short stop between them (one
+        done poll plus the setup writes). Truly continuous jogging needs a
+        speed-mode command in the PLC program.
+
+        stop_addr: M relay the PLC program uses to abort the DDRVI, if it
+        has one; it is pulsed on release. Without it release() stops
+        streaming and waits for the running segment's done.
+        """
+        self.axis = axis
+        self.stream_period = stream_period
+        self.stop_addr = stop_addr
+        self.last_status = None
+
+        self._plc = plc
+        self._pending = None   # (pulses, pps) for a single step
+        self._held = None      # (direction, pps) while a jog button is held
+        self._closed = False
+        self._moving = False   # a segment or step is running on the PLC
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"Jog-Axis{axis}", daemon=True)
+        self._thread.start()
+
+    @property
+    def plc(self):
+        if self._plc is None:
+            self._plc = get_plc()
+        return self._plc
+
+    def step(self, pulses: int, pps: int):
+        with self._cond:
+            self._held = None
+            self._pending = (pulses, pps)
+            self._cond.notify()
+
+    def hold(self, direction: int, pps: int):
+        with self._cond:
+            self._pending = None
+            self._held = (1 if direction >= 0 else -1, pps)
+            self._cond.notify()
+
+    def update_speed(self, pps: int):
+        """Change the streamed speed while held; takes effect on the next segment."""
+        with self._cond:
+            if self._held is not None:
+                self._held = (self._held[0], pps)
+
+    def release(self, timeout: float = 2.0) -> bool:
+        """Stop streaming. Returns once the axis has stopped (False if that took longer than timeout)."""
+        with self._cond:
+            was_held = self._held is not None
+            self._held = None
+            self._pending = None
+        if was_held and self.stop_addr is not None:
+            self.plc.pulse_M(address=self.stop_addr, duration=0.05, blocking=False)
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._moving, timeout)
+
+    def is_busy(self) -> bool:
+        with self._cond:
+            return self._held is not None or self._pending is not None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._held = None
+            self._pending = None
+            self._cond.notify()
+
+    def _next_command(self):
+        with self._cond:
+            while not self._closed and self._pending is None and self._held is None:
+                self._cond.wait()
+            if self._closed:
+                return None
+            self._moving = True
+            if self._held is not None:
+                direction, pps = self._held
+                return direction * max(1, round(pps * self.stream_period)), pps
+            command, self._pending = self._pending, None
+            return command
+
+    def _finished(self):
+        with self._cond:
+            self._moving = False
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            command = self._next_command()
+            if command is None:
+                return
+            pulses, pps = command
+            if pps <= 0:
+                self._finished()
+                continue
+
+            # Fast done polling keeps the stop between segments short; the trigger
+            # pulse ends mid-segment so the next start sees a clean rising edge
+            status, _ = execute_move(self.plc, self.axis, pulses, pps, poll=0.002,
+                                     pulse=self.stream_period / 2)
+            self._finished()
+            self.last_status = status
+            if status != "done":
+                print(f">> [Jog Axis {self.axis}] Segment failed: {status}. Jog stopped.")
+                with self._cond:
+                    self._held = None
@@ -1,23 +1,27 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
 import tkinter as tk
 from tkinter import ttk, messagebox
-import threading
-
-# Import the ddrvi function from your main control file
-try:
-    from mj4r_servo import ddrvi
-except ImportError:
-    print("Warning: Could not import 'ddrvi' from mj4r_servo_controll. Make sure the file exists.")
-    # Dummy function for testing UI without the real file
-    def ddrvi(*args, **kwargs):
-        print(f"[DUMMY] Executing DDRVI: {kwargs}")
-        return True
+from servo.axis_profile import AxisProfile
+from servo.jog_controller import JogController
 
 class ServoJogUI:
-    def __init__(self, master, ppr=3600, axis=1, sig_addr=110):
+    # A press longer than this becomes hold-to-run; a shorter click is one step
+    HOLD_DELAY_MS = 250
+
+    def __init__(self, master, ppr=3600, axis=1, plc=None, stop_addr=None):
         self.master = master
         self.ppr = ppr
         self.axis = axis
-        self.sig_addr = sig_addr
+
+        # Single persistent worker for this axis; the PLC connects on first jog
+        self.jog = JogController(axis, plc=plc, stop_addr=stop_addr)
+        self._hold_job = None
+        self._holding = False
+        self._held_var = None   # speed entry of the row being held
         
         # Frame container
         self.frame = ttk.LabelFrame(master, text=f"Axis {self.axis} Jog Control", padding=10)
@@ -31,6 +35,13 @@ class ServoJogUI:
         self.speed1_var = tk.StringVar(value="36000.0")
         self.speed2_var = tk.StringVar(value="180000.0")
         self.speed3_var = tk.StringVar(value="360000.0")
+        self.override_var = tk.IntVar(value=100)   # speed override in %, applied to every jog
+
+        # Speed changes while a button is held are streamed to the worker
+        for var in (self.speed1_var, self.speed2_var, self.speed3_var, self.override_var):
+            var.trace_add("write", lambda *args: self.stream_speed())
+        master.bind("<Up>", lambda event: self.nudge_override(10))
+        master.bind("<Down>", lambda event: self.nudge_override(-10))
 
         self.setup_ui()
 
@@ -54,6 +65,15 @@ class ServoJogUI:
         ttk.Label(step_frame, text="Jog Step Dist:").pack(side="left", padx=5)
         ttk.Entry(step_frame, textvariable=self.step_var, width=15).pack(side="left", padx=5)
 
+        # --- Speed Override (Up/Down keys also change it while jogging) ---
+        override_frame = ttk.Frame(self.frame)
+        override_frame.pack(fill="x", pady=5)
+        ttk.Label(override_frame, text="Speed Override:").pack(side="left", padx=5)
+        ttk.Scale(override_frame, from_=10, to=200, orient="horizontal", length=150,
+                  command=lambda value: self.override_var.set(int(float(value)))).pack(side="left", padx=5)
+        ttk.Label(override_frame, textvariable=self.override_var).pack(side="left")
+        ttk.Label(override_frame, text="%").pack(side="left")
+
         # --- Jog Speeds Rows ---
         self.create_jog_row("Jog Speed 1:", self.speed1_var)
         self.create_jog_row("Jog Speed 2:", self.speed2_var)
@@ -66,11 +86,11 @@ class ServoJogUI:
         ttk.Label(row, text=label_text, width=12).pack(side="left", padx=5)
         ttk.Entry(row, textvariable=speed_var, width=15).pack(side="left", padx=5)
         
-        btn_neg = ttk.Button(row, text="Jog -", command=lambda: self.execute_jog(speed_var.get(), direction=-1))
-        btn_neg.pack(side="left", padx=5)
-        
-        btn_pos = ttk.Button(row, text="Jog +", command=lambda: self.execute_jog(speed_var.get(), direction=1))
-        btn_pos.pack(side="left", padx=5)
+        for text, direction in (("Jog -", -1), ("Jog +", 1)):
+            btn = ttk.Button(row, text=text)
+            btn.pack(side="left", padx=5)
+            btn.bind("<ButtonPress-1>", lambda event, d=direction: self.on_press(speed_var, d))
+            btn.bind("<ButtonRelease-1>", lambda event, d=direction: self.on_release(speed_var, d))
 
     def on_unit_change(self, event):
         new_unit = self.current_unit.get()
@@ -83,44 +103,31 @@ class ServoJogUI:
         if old_unit == new_unit:
             return
 
+        old_profile = AxisProfile.for_mode(self.ppr, old_unit)
+        new_profile = AxisProfile.for_mode(self.ppr, new_unit)
+
         # Update labels
-        unit_map = {"pulse": "pps", "rev": "rpm", "deg": "deg/s"}
-        self.lbl_step_unit.config(text=f"[Step: {new_unit} | Speed: {unit_map[new_unit]}]")
+        self.lbl_step_unit.config(text=f"[Step: {new_unit} | Speed: {new_profile.speed_unit}]")
 
         # Convert Values
-        self.convert_entry_var(self.step_var, old_unit, new_unit, is_speed=False)
-        self.convert_entry_var(self.speed1_var, old_unit, new_unit, is_speed=True)
-        self.convert_entry_var(self.speed2_var, old_unit, new_unit, is_speed=True)
-        self.convert_entry_var(self.speed3_var, old_unit, new_unit, is_speed=True)
+        self.convert_entry_var(self.step_var, old_profile, new_profile, is_speed=False)
+        self.convert_entry_var(self.speed1_var, old_profile, new_profile, is_speed=True)
+        self.convert_entry_var(self.speed2_var, old_profile, new_profile, is_speed=True)
+        self.convert_entry_var(self.speed3_var, old_profile, new_profile, is_speed=True)
 
-    def convert_entry_var(self, var, old_unit, new_unit, is_speed=False):
+    def convert_entry_var(self, var, old_profile, new_profile, is_speed=False):
         try:
             val = float(var.get())
         except ValueError:
             var.set("0.0")
             return
 
-        # 1. Convert everything to Base (Pulse or PPS)
-        base_val = 0.0
-        if old_unit == "pulse":
-            base_val = val
-        elif old_unit == "rev":
-            if is_speed: base_val = (val * self.ppr) / 60.0 # RPM to PPS
-            else: base_val = val * self.ppr # Rev to Pulse
-        elif old_unit == "deg":
-            if is_speed: base_val = (val / 360.0) * self.ppr # Deg/s to PPS
-            else: base_val = (val / 360.0) * self.ppr # Deg to Pulse
-
-        # 2. Convert Base to New Unit
-        new_val = 0.0
-        if new_unit == "pulse":
-            new_val = base_val
-        elif new_unit == "rev":
-            if is_speed: new_val = (base_val * 60.0) / self.ppr # PPS to RPM
-            else: new_val = base_val / self.ppr # Pulse to Rev
-        elif new_unit == "deg":
-            if is_speed: new_val = (base_val * 360.0) / self.ppr # PPS to Deg/s
-            else: new_val = (base_val / self.ppr) * 360.0 # Pulse to Deg
+        # Convert through the base unit (pulse or pps) without rounding in between
+        if is_speed:
+            new_val = new_profile.from_pps(val * old_profile.speed_factor)
+        else:
+            new_val = new_profile.from_pulses(val * old_profile.position_factor)
+        new_unit = new_profile.unit
 
         # Format to 2 decimal places to avoid float mess (or 0 for pulse)
         if new_unit == "pulse":
@@ -128,34 +135,70 @@ class ServoJogUI:
         else:
             var.set(f"{new_val:.2f}")
 
-    def execute_jog(self, speed_str, direction):
+    def resolve(self, speed_str, step_str="0"):
+        """(pulses, pps) for the entries in the current unit, or None after showing an error."""
         try:
-            speed_val = float(speed_str)
-            step_val = float(self.step_var.get())
+            profile = AxisProfile.for_mode(self.ppr, self.current_unit.get())
+            return profile.command(float(step_str), float(speed_str))
         except ValueError:
             messagebox.showerror("Input Error", "Please enter valid numeric values for Speed and Step.")
+            return None
+
+    def override_pps(self, pps):
+        return max(1, round(pps * self.override_var.get() / 100))
+
+    def nudge_override(self, delta):
+        self.override_var.set(min(200, max(10, self.override_var.get() + delta)))
+
+    def stream_speed(self):
+        """Push the held row's current speed to the worker; the next segment uses it."""
+        if not self._holding or self._held_var is None:
+            return
+        try:
+            profile = AxisProfile.for_mode(self.ppr, self.current_unit.get())
+            _, pps = profile.command(0, float(self._held_var.get()))
+        except ValueError:
+            return   # half-typed entry: keep the current speed
+        if pps > 0:
+            self.jog.update_speed(self.override_pps(pps))
+
+    def on_press(self, speed_var, direction):
+        self._holding = False
+        self._hold_job = self.master.after(self.HOLD_DELAY_MS, lambda: self.begin_hold(speed_var, direction))
+
+    def begin_hold(self, speed_var, direction):
+        self._hold_job = None
+        resolved = self.resolve(speed_var.get())
+        if resolved is None:
             return
+        self._holding = True
+        self._held_var = speed_var
+        pps = self.override_pps(resolved[1])
+        print(f"\n[UI JOG] Hold | Axis {self.axis}, Direction: {direction:+d}, Speed: {pps} pps")
+        self.jog.hold(direction, pps)
+
+    def on_release(self, speed_var, direction):
+        if self._hold_job is not None:
+            # Released before the hold delay: a normal step jog
+            self.master.after_cancel(self._hold_job)
+            self._hold_job = None
+            self.execute_jog(speed_var.get(), direction)
+        elif self._holding:
+            self._holding = False
+            self._held_var = None
+            self.jog.release()
+            print(f"[UI JOG] Release | Axis {self.axis}")
+
+    def execute_jog(self, speed_str, direction):
+        resolved = self.resolve(speed_str, self.step_var.get())
+        if resolved is None:
+            return
+        pulses, pps = resolved[0], self.override_pps(resolved[1])
+
+        print(f"\n[UI JOG] Triggered | Mode: {self.current_unit.get()}, Target: {pulses * direction} pulses, Speed: {pps} pps")
 
-        mode = self.current_unit.get()
-        target = step_val * direction
-
-        print(f"\n[UI JOG] Triggered | Mode: {mode}, Target: {target}, Speed: {speed_val}")
-
-        # Run DDRVI in a separate thread so UI doesn't freeze
-        threading.Thread(
-            target=ddrvi, 
-            kwargs={
-                "ENO": True, 
-                "MODE": mode, 
-                "TARGET": target, 
-                "SPEED": speed_val, 
-                "PPR": self.ppr, 
-                "AXIS": self.axis, 
-                "SIG": self.sig_addr, 
-                "REPORT": False
-            }, 
-            daemon=True
-        ).start()
+        # Hand over to the axis worker; a newer click replaces a step still waiting
+        self.jog.step(pulses * direction, pps)
 
 # ========================================================
 # Example of how to run this file standalone for testing
@@ -4,114 +4,169 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
 import time
-from tkinter import messagebox
-from basic.plc_module import PLCController 
-from position_monitor import ServoMonitorUI
-
-import tkinter as tk
+import threading
+from servo.axis_profile import AxisProfile
+from basic.plc_module import int32_to_words
 
-# Initialize PLC Connection
-plc = PLCController(config_print=True)
+# Importing this module has no side effects: the PLC connection is made on
+# first use, and tkinter / the monitor UI are only imported when needed.
 IP_ADDRESS = "192.168.3.250"
 PORT = 502
-plc.plcConnect(IP_ADDRESS, port=PORT)
-def ddrvi(ENO=True, MODE="pulse", TARGET=0, SPEED=0, PPR=10000, AXIS=1, REPORT=False):
+
+_default_plc = None
+_default_plc_lock = threading.Lock()
+
+# Per-axis count of commanded moves, written with every setup so trace tools
+# can tell moves apart even when a done pulse falls between two samples
+_move_ids = {}
+_move_ids_lock = threading.Lock()
+
+def set_plc(controller):
+    """Use an already created PLCController for every call that gets no explicit PLC."""
+    global _default_plc
+    with _default_plc_lock:
+        _default_plc = controller
+
+def get_plc():
+    """Shared PLCController, created and connected to IP_ADDRESS on first use."""
+    global _default_plc
+    with _default_plc_lock:
+        if _default_plc is None:
+            from basic.plc_module import PLCController
+            _default_plc = PLCController(config_print=True)
+            _default_plc.plcConnect(IP_ADDRESS, port=PORT)
+        return _default_plc
+
+def _show_message(kind, title, message):
+    from tkinter import messagebox
+    if kind == "error":
+        messagebox.showerror(title, message)
+    else:
+        messagebox.showinfo(title, message)
+
+def ddrvi(ENO=True, MODE="pulse", TARGET=0, SPEED=0, PPR=10000, AXIS=1, REPORT=False, PLC=None, PROFILE=None):
     if not ENO:
         print(f">> [Axis {AXIS}] ENO is False. Command aborted.")
         return False
 
+    plc = PLC if PLC is not None else get_plc()
+
     def calculate_motion_params():
-        if MODE.lower() == "pulse":
-            pos = int(TARGET)
-            spd = int(SPEED)
-        elif MODE.lower() == "rev":
-            pos = round(TARGET * PPR)
-            spd = round((SPEED * PPR) / 60.0)
-        elif MODE.lower() == "deg":
-            pos = round((TARGET / 360.0) * PPR)
-            spd = round((SPEED / 360.0) * PPR)
-        else:
-            raise ValueError(f"Unknown MODE: '{MODE}'. Use 'pulse', 'rev', or 'deg'.")
-        return pos, spd
+        # PROFILE (with gear ratio / limits) wins over the plain MODE + PPR pair
+        profile = PROFILE if PROFILE is not None else AxisProfile.for_mode(PPR, MODE.lower())
+        return profile.command(TARGET, SPEED)
 
     def report_status(message, msgtype=None):
         if REPORT:
             if msgtype == -1:
-                messagebox.showerror("DDRVI Status", message)
+                _show_message("error", "DDRVI Status", message)
             elif msgtype == 0:
-                messagebox.showinfo("DDRVI Status", message)
+                _show_message("info", "DDRVI Status", message)
 
     try:
         final_position, final_speed = calculate_motion_params()
     except Exception as e:
         if REPORT:
-            messagebox.showerror("DDRVI Error", str(e))
+            _show_message("error", "DDRVI Error", str(e))
         print(f">> [Axis {AXIS}] Error: {str(e)}")
         return False
 
     if final_speed == 0:
         if REPORT:
-            messagebox.showerror("DDRVI Error", f"Calculated speed cannot be zero on Axis {AXIS}!")
+            _show_message("error", "DDRVI Error", f"Calculated speed cannot be zero on Axis {AXIS}!")
         return False
 
-    timeout = (abs(final_position) / final_speed) * 2.0 + 5.0 
-    
-    trigger_addr = AXIS * 100        # M100, M200, M300, M400
-    pos_addr = AXIS * 100            # D100, D200, D300, D400
-    spd_addr = (AXIS * 100) + 2      # D102, D202, D302, D402
-    axis_reg_addr = (AXIS * 100) + 4 # D104, D204, D304, D404
-    sig_addr = (AXIS * 100) + 10     # M110, M210, M310, M410
-
-    PLCDATA = {
-        "position": pos_addr, 
-        "speed": spd_addr,  
-        "axis_reg": axis_reg_addr,
-        "done": sig_addr,        
-        "err": sig_addr + 1      
+    addr = ddrvi_addresses(AXIS)
+    mode_name = PROFILE.unit if PROFILE is not None else MODE
+    print(f">> [Axis {AXIS}] Mode: {mode_name.upper()} | Target: {TARGET}, Speed: {SPEED}")
+    print(f">> [Axis {AXIS}] Sending Start Command (M{addr['trigger']}): Pos(D{addr['position']})={final_position}, Speed(D{addr['speed']})={final_speed}, AxisReg(D{addr['axis_reg']})={AXIS}")
+
+    status, elapsed = execute_move(plc, AXIS, final_position, final_speed)
+
+    if status == "timeout":
+        _show_message("error", "Timeout Error", f"Axis {AXIS} operation timed out!")
+        return False
+
+    if status == "comm_error":
+        print(f">> [Axis {AXIS}] Error: PLC communication failed.")
+        return False
+
+    if status == "error":
+        report_status(f"Error occurred during servo operation on Axis {AXIS}!", msgtype=-1)
+        return False
+
+    report_status(f"Servo operation completed successfully on Axis {AXIS}!", msgtype=0)
+    print(f">> [Axis {AXIS}] Movement Finished ({elapsed:.3f} s).\n")
+    return True
+
+def ddrvi_addresses(axis):
+    """Handshake devices used by ddrvi for one axis."""
+    return {
+        "trigger": axis * 100,          # M100, M200, M300, M400
+        "position": axis * 100,         # D100, D200, D300, D400
+        "speed": (axis * 100) + 2,      # D102, D202, D302, D402
+        "axis_reg": (axis * 100) + 4,   # D104, D204, D304, D404
+        "done": (axis * 100) + 10,      # M110, M210, M310, M410
+        "err": (axis * 100) + 11        # M111, M211, M311, M411
     }
-    
-    plc.write_M(address=PLCDATA["done"], status=False)
-    plc.write_M(address=PLCDATA["err"], status=False)
-    
-    plc.write_holding_32bit(address=PLCDATA["position"], value=final_position)
-    plc.write_holding_32bit(address=PLCDATA["speed"], value=final_speed)
-    plc.write_holding_32bit(address=PLCDATA["axis_reg"], value=AXIS)
-    
-    print(f">> [Axis {AXIS}] Mode: {MODE.upper()} | Target: {TARGET}, Speed: {SPEED}")
-    print(f">> [Axis {AXIS}] Sending Start Command (M{trigger_addr}): Pos(D{pos_addr})={final_position}, Speed(D{spd_addr})={final_speed}, AxisReg(D{axis_reg_addr})={AXIS}")
-    
-    plc.pulse_M(address=trigger_addr, duration=0.1, blocking=True)  
-    
-    start_time = time.time()
+
+def execute_move(plc, axis, position, speed, timeout=None, poll=0.1, pulse=0.1, move_id_addr=None):
+    """
+    Run one DDRVI handshake (position in pulses, speed in pps) and wait on the done / err bits.
+    pulse is how long the trigger stays ON; keep it shorter than the move when moves run
+    back to back, so its OFF has already landed when the next move starts.
+    move_id_addr, if given, is a free 32-bit D register that gets a per-axis counter (+1 per
+    move) with the command, for trace_recorder; nothing is written there otherwise.
+    Returns (status, elapsed seconds); status is "done", "error", "timeout" or "comm_error".
+    """
+    addr = ddrvi_addresses(axis)
+    if timeout is None:
+        timeout = (abs(position) / speed) * 2.0 + 5.0
+
+    # done/err are adjacent coils and position/speed/axis_reg adjacent 32-bit
+    # registers, so the whole setup is one coil write and one register write
+    if not plc.write_M_range(addr["done"], [False, False]):
+        return "comm_error", 0.0
+    words = int32_to_words(position) + int32_to_words(speed) + int32_to_words(axis)
+    if move_id_addr is not None:
+        with _move_ids_lock:
+            move_id = _move_ids[axis] = (_move_ids.get(axis, 0) + 1) & 0x7FFFFFFF
+        if move_id_addr == addr["position"] + len(words):
+            words += int32_to_words(move_id)
+        elif not plc.write_holding_range(move_id_addr, int32_to_words(move_id)):
+            return "comm_error", 0.0
+    if not plc.write_holding_range(addr["position"], words):
+        return "comm_error", 0.0
+
+    # Force a fresh rising edge if the previous move's trigger pulse is still ON,
+    # then hand the OFF edge to the pulse scheduler instead of sleeping here
+    plc.cancel_pulse_M(address=addr["trigger"])
+    start_time = time.monotonic()
+    if not plc.pulse_M(address=addr["trigger"], duration=pulse, blocking=False):
+        return "comm_error", 0.0
+
     while True:
-        curr_speed = plc.read_holding_32bit(PLCDATA["speed"])[0]
-        if (time.time() - start_time) > timeout:
-            messagebox.showerror("Timeout Error", f"Axis {AXIS} operation timed out!")
-            return False
-            
-        is_done, _ = plc.read_M(address=PLCDATA["done"])
-        is_err, _ = plc.read_M(address=PLCDATA["err"])
-        
-        if is_err:
-            report_status(f"Error occurred during servo operation on Axis {AXIS}!", msgtype=-1)
-            return False
-            
-        if is_done:
-            plc.write_M(address=PLCDATA["done"], status=False)
-            report_status(f"Servo operation completed successfully on Axis {AXIS}!", msgtype=0)
-            print(f">> [Axis {AXIS}] Movement Finished.\n")
-            return True
-            
-        time.sleep(0.1)
-        
-import threading
+        bits, ok = plc.read_M_range(addr["done"], 2)
+        elapsed = time.monotonic() - start_time
+        if ok:
+            is_done, is_err = bits
+            if is_err:
+                return "error", elapsed
+            if is_done:
+                plc.write_M(address=addr["done"], status=False)
+                return "done", elapsed
+
+        if elapsed > timeout:
+            return "timeout", elapsed
 
-def ddrvi_sync(commands):
+        time.sleep(poll)
+        
+def ddrvi_sync(commands, plc=None):
 
     threads = []
     
     for cmd in commands:
-        t = threading.Thread(target=ddrvi, kwargs=cmd)
+        t = threading.Thread(target=ddrvi, kwargs={"PLC": plc, **cmd})
         threads.append(t)
         
     for t in threads:
@@ -122,19 +177,7 @@ def ddrvi_sync(commands):
         
     print(">> [SYNC] All synchronized axes have completed their movements.\n")
 
-def ddrvi_sync_intp(commands):
-    def get_pulse(mode, target, ppr):
-        if mode == "pulse": return int(target)
-        if mode == "rev": return round(target * ppr)
-        if mode == "deg": return round((target / 360.0) * ppr)
-        raise ValueError(f"Unknown MODE: '{mode}'")
-
-    def get_pps(mode, speed, ppr):
-        if mode == "pulse": return int(speed)
-        if mode == "rev": return round((speed * ppr) / 60.0)
-        if mode == "deg": return round((speed / 360.0) * ppr)
-        raise ValueError(f"Unknown MODE: '{mode}'")
-
+def ddrvi_sync_intp(commands, plc=None):
     ref_cmd = None
     speed_count = 0
     
@@ -152,8 +195,7 @@ def ddrvi_sync_intp(commands):
     ref_speed = ref_cmd["SPEED"]
     ref_ppr = ref_cmd.get("PPR", 10000)
     
-    ref_pulse = get_pulse(ref_mode, ref_target, ref_ppr)
-    ref_pps = get_pps(ref_mode, ref_speed, ref_ppr)
+    ref_pulse, ref_pps = AxisProfile.for_mode(ref_ppr, ref_mode).command(ref_target, ref_speed)
     
     if ref_pulse == 0:
         raise ValueError("Interpolation Error: Reference Axis Position (TARGET) must not be 0")
@@ -173,7 +215,7 @@ def ddrvi_sync_intp(commands):
         ppr = cmd.get("PPR", 10000)
         report = cmd.get("REPORT", False)
         
-        target_pulse = get_pulse(mode, target, ppr)
+        target_pulse = AxisProfile.for_mode(ppr, mode).to_pulses(target)
         
         if cmd == ref_cmd:
             speed_pps = ref_pps
@@ -192,7 +234,8 @@ def ddrvi_sync_intp(commands):
             "SPEED": speed_pps,
             "PPR": ppr,
             "AXIS": axis,
-            "REPORT": report
+            "REPORT": report,
+            "PLC": plc
         }
         
         t = threading.Thread(target=ddrvi, kwargs=sync_kwargs)
@@ -208,8 +251,13 @@ def ddrvi_sync_intp(commands):
         
     print(">> [SYNC INTP] Interpolation movement completed.\n")
 
-def monitoring():
+def monitoring(plc=None):
+    plc = plc if plc is not None else get_plc()
+
     def launch_monitor():
+        import tkinter as tk
+        from servo.position_monitor import ServoMonitorUI
+
         monitor_window = tk.Tk()
         app = ServoMonitorUI(monitor_window, plc)
         monitor_window.mainloop()
@@ -217,7 +265,7 @@ def monitoring():
     ui_thread = threading.Thread(target=launch_monitor, daemon=True)
     ui_thread.start()
     
-def test_servo(axis=1, ppr=3600):
+def test_servo(axis=1, ppr=3600, plc=None):
     def test_low_speed(test_axis, test_ppr, DIRECTION="forward"):
         for i in range(1, 4):
             if DIRECTION == "forward":
@@ -225,7 +273,7 @@ def test_servo(axis=1, ppr=3600):
             else:
                 target = -1
                 
-            ddrvi(MODE="rev", TARGET=target, SPEED=50*i, PPR=test_ppr, AXIS=test_axis, REPORT=False)
+            ddrvi(MODE="rev", TARGET=target, SPEED=50*i, PPR=test_ppr, AXIS=test_axis, REPORT=False, PLC=plc)
             time.sleep(0.5)
             
     def test_high_speed(test_axis, test_ppr, DIRECTION="forward"):
@@ -235,7 +283,7 @@ def test_servo(axis=1, ppr=3600):
             else:
                 target = -2
             
-            ddrvi(MODE="rev", TARGET=target, SPEED=300+100*i, PPR=test_ppr, AXIS=test_axis, REPORT=False)
+            ddrvi(MODE="rev", TARGET=target, SPEED=300+100*i, PPR=test_ppr, AXIS=test_axis, REPORT=False, PLC=plc)
             time.sleep(0.5)
             
     def struggle_test1(test_axis, test_ppr, SECTIONS=4, DIRECTION="forward"):
@@ -244,22 +292,22 @@ def test_servo(axis=1, ppr=3600):
                 target = 1.0/SECTIONS
             else:
                 target = -1.0/SECTIONS
-            ddrvi(MODE="rev", TARGET=target, SPEED=500, PPR=test_ppr, AXIS=test_axis, REPORT=False)
+            ddrvi(MODE="rev", TARGET=target, SPEED=500, PPR=test_ppr, AXIS=test_axis, REPORT=False, PLC=plc)
             time.sleep(0.1)
     
     def struggle_test2(test_axis, test_ppr):
         for i in range(10):
-            ddrvi(MODE="rev", TARGET=0.25, SPEED=150, PPR=test_ppr, AXIS=test_axis, REPORT=False)
+            ddrvi(MODE="rev", TARGET=0.25, SPEED=150, PPR=test_ppr, AXIS=test_axis, REPORT=False, PLC=plc)
             time.sleep(0.1)
             
-            ddrvi(MODE="rev", TARGET=-0.15, SPEED=1000, PPR=test_ppr, AXIS=test_axis, REPORT=False)
+            ddrvi(MODE="rev", TARGET=-0.15, SPEED=1000, PPR=test_ppr, AXIS=test_axis, REPORT=False, PLC=plc)
             time.sleep(0.1)
     
     # basic forward and reverse tests
     print(f">> Running Basic Tests on Axis {axis}...")
-    ddrvi(MODE="rev", TARGET=1, SPEED=20, PPR=ppr*2, AXIS=axis, REPORT=False)
+    ddrvi(MODE="rev", TARGET=1, SPEED=20, PPR=ppr*2, AXIS=axis, REPORT=False, PLC=plc)
     time.sleep(1)
-    ddrvi(MODE="rev", TARGET=-1, SPEED=20, PPR=ppr*2, AXIS=axis, REPORT=False)
+    ddrvi(MODE="rev", TARGET=-1, SPEED=20, PPR=ppr*2, AXIS=axis, REPORT=False, PLC=plc)
     time.sleep(1)
     
     # speed tests
@@ -288,7 +336,7 @@ def test_servo(axis=1, ppr=3600):
     print(f">> Running Rapid Direction Change Test on Axis {axis}...")
     struggle_test2(axis, ppr)
     
-    messagebox.showinfo("Test Completed", f"All servo motion tests on Axis {axis} have been completed successfully!")
+    _show_message("info", "Test Completed", f"All servo motion tests on Axis {axis} have been completed successfully!")
     
     print("\n" + "="*50)
     print(f"TEST SEQUENCE ON AXIS {axis} COMPLETED SUCCESSFULLY")
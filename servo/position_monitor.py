@@ -3,83 +3,228 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
+import time
+import threading
 import tkinter as tk
 from tkinter import ttk
+from basic.plc_module import coalesce_ranges, words_to_int32
+
+# Axis monitor block: D5500 + (axis-1)*40 -> position (32-bit), +4 -> speed (32-bit)
+MONITOR_BASE = 5500
+MONITOR_STRIDE = 40
+MONITOR_WORDS = 6
+MIN_REFRESH_MS = 20
+
+
+class AxisMonitorPoller:
+    def __init__(self, plc_controller, axis_count: int = 4, interval: float = 0.5, smoothing: float = 0.3,
+                 idle_interval: float = None):
+        """
+        อ่านบล็อกมอนิเตอร์ของทุกแกนด้วย ranged read ให้น้อยครั้งที่สุดต่อรอบ (ทำงานบนเธรดแยก)
+
+        Besides the raw position/speed it derives, from the sample stream:
+          velocity  - position delta / time delta (pps, EMA smoothed)
+          ferr      - following-error estimate: speed integrated over the
+                      move minus the distance actually travelled (pulse)
+
+        With idle_interval set, the poller drops to that rate while every
+        axis is at rest and returns to `interval` on the first sample that
+        shows motion.
+        """
+        self.plc = plc_controller
+        self.axes = list(range(1, axis_count + 1))
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.smoothing = smoothing
+        self.moving = True
+
+        blocks = [(MONITOR_BASE + (axis - 1) * MONITOR_STRIDE, MONITOR_WORDS) for axis in self.axes]
+        self.reads = coalesce_ranges(blocks, self.plc.MAX_READ_REGS)
+
+        self._state = {axis: {"pos": None, "t": None, "velocity": 0.0, "ferr": 0.0} for axis in self.axes}
+        self._latest = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def latest(self):
+        """Most recent {axis: {...}} snapshot, or None while offline."""
+        with self._lock:
+            return self._latest
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="AxisMonitorPoller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def poll_once(self):
+        now = time.monotonic()
+        words = {}
+        for start, count in self.reads:
+            values, ok = self.plc.read_holding_range(start, count)
+            if not ok:
+                with self._lock:
+                    self._latest = None
+                return None
+            for i, value in enumerate(values):
+                words[start + i] = value
+
+        snapshot = {}
+        for axis in self.axes:
+            base = MONITOR_BASE + (axis - 1) * MONITOR_STRIDE
+            pos = words_to_int32(words[base], words[base + 1])
+            spd = words_to_int32(words[base + 4], words[base + 5])
+            snapshot[axis] = self._derive(axis, pos, spd, now)
+
+        with self._lock:
+            self._latest = snapshot
+            self.moving = any(data["spd"] != 0 or abs(data["velocity"]) >= 1 for data in snapshot.values())
+        return snapshot
+
+    def current_interval(self) -> float:
+        if self.idle_interval is None or self.moving:
+            return self.interval
+        return max(self.interval, self.idle_interval)
+
+    def _derive(self, axis: int, pos: int, spd: int, now: float) -> dict:
+        state = self._state[axis]
+        if state["pos"] is not None and now > state["t"]:
+            dt = now - state["t"]
+            delta = pos - state["pos"]
+            raw_velocity = delta / dt
+            state["velocity"] += self.smoothing * (raw_velocity - state["velocity"])
+
+            if spd == 0 and delta == 0:
+                # Axis at rest: start the next move's estimate from zero
+                state["ferr"] = 0.0
+            else:
+                state["ferr"] += spd * dt - delta
+
+        state["pos"] = pos
+        state["t"] = now
+        return {"pos": pos, "spd": spd, "velocity": state["velocity"], "ferr": state["ferr"]}
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            self.poll_once()
+            remaining = self.current_interval() - (time.monotonic() - started)
+            if remaining > 0:
+                self._stop_event.wait(remaining)
+
 
 class ServoMonitorUI:
-    def __init__(self, master, plc_controller):
+    FRAME_MS = 30
+
+    def __init__(self, master, plc_controller, axis_count: int = 4, refresh_ms: int = 500):
         """
-        GUI สำหรับมอนิเตอร์สถานะ แกน 1-4 (Fixed Unit: Pulse, PPS)
+        GUI สำหรับมอนิเตอร์สถานะ แกน 1-N (Fixed Unit: Pulse, PPS)
         """
         self.master = master
         self.plc = plc_controller
-        
+        # Full refresh rate only while an axis is moving; 1 s while all are at rest
+        self.poller = AxisMonitorPoller(self.plc, axis_count=axis_count, interval=refresh_ms / 1000.0,
+                                        idle_interval=1.0)
+
         if isinstance(self.master, tk.Tk) or isinstance(self.master, tk.Toplevel):
             self.master.title("Servo Multi-Axis Monitor")
-            self.master.geometry("350x300")
+            self.master.geometry(f"560x{110 + 52 * axis_count}")
             self.master.attributes("-topmost", True) # ให้อยู่บนสุดเสมอจะได้ดูง่ายๆ
-        
+            self.master.protocol("WM_DELETE_WINDOW", self.close)
+
         self.axis_data = {}
-        
-        self.setup_ui()
+        self._shown = {}
+
+        self.setup_ui(refresh_ms)
+        self.poller.start()
         self.update_monitor()
 
-    def setup_ui(self):
+    def setup_ui(self, refresh_ms):
         main_frame = ttk.Frame(self.master, padding=10)
         main_frame.pack(fill="both", expand=True)
-        
-        ttk.Label(main_frame, text="Real-Time Position & Speed", font=("Arial", 12, "bold")).pack(pady=(0, 10))
 
-        for axis in range(1, 5):
+        header = ttk.Frame(main_frame)
+        header.pack(fill="x", pady=(0, 10))
+        ttk.Label(header, text="Real-Time Position & Speed", font=("Arial", 12, "bold")).pack(side="left")
+        self.refresh_entry = ttk.Entry(header, width=6)
+        self.refresh_entry.insert(0, str(refresh_ms))
+        self.refresh_entry.pack(side="right")
+        ttk.Label(header, text="Refresh (ms):").pack(side="right", padx=5)
+
+        for axis in self.poller.axes:
             frame = ttk.LabelFrame(main_frame, text=f"Axis {axis} Status")
             frame.pack(fill="x", pady=2, padx=5)
-            
-            pos_var = tk.StringVar(value="0 pulse")
-            spd_var = tk.StringVar(value="0 pps")
-            
-            self.axis_data[axis] = {"pos": pos_var, "spd": spd_var}
-            
+
+            self.axis_data[axis] = {key: tk.StringVar(value="-") for key in ("pos", "spd", "velocity", "ferr")}
+
             row = ttk.Frame(frame)
             row.pack(fill="x", padx=5, pady=2)
-            
-            ttk.Label(row, text="Position:", width=10).pack(side="left")
-            ttk.Label(row, textvariable=pos_var, width=15, foreground="blue").pack(side="left")
-            
-            ttk.Label(row, text="Speed:", width=8).pack(side="left")
-            ttk.Label(row, textvariable=spd_var, width=15, foreground="green").pack(side="left")
+
+            ttk.Label(row, text="Position:", width=8).pack(side="left")
+            ttk.Label(row, textvariable=self.axis_data[axis]["pos"], width=14, foreground="blue").pack(side="left")
+
+            ttk.Label(row, text="Speed:", width=6).pack(side="left")
+            ttk.Label(row, textvariable=self.axis_data[axis]["spd"], width=12, foreground="green").pack(side="left")
+
+            ttk.Label(row, text="Vel:", width=4).pack(side="left")
+            ttk.Label(row, textvariable=self.axis_data[axis]["velocity"], width=12).pack(side="left")
+
+            ttk.Label(row, text="F.Err:", width=5).pack(side="left")
+            ttk.Label(row, textvariable=self.axis_data[axis]["ferr"], width=12, foreground="red").pack(side="left")
 
     def update_monitor(self):
         """
-        ฟังก์ชันอ่านค่าจาก PLC และอัปเดต UI (วนลูปตัวเองทุกๆ 500ms)
+        อัปเดต UI จากค่าล่าสุดของ poller (อ่าน PLC บนเธรดแยก ไม่บล็อก mainloop)
         """
-        if self.plc and self.plc.client and self.plc.client.is_socket_open():
-            for axis in range(1, 5):
-
-                offset = (axis - 1) * 40
-                pos_addr = 5500 + offset
-                spd_addr = 5504 + offset
-                
-                pos_val, pos_ok = self.plc.read_holding_32bit(pos_addr)
-                spd_val, spd_ok = self.plc.read_holding_32bit(spd_addr)
-                
-                if pos_ok:
-                    self.axis_data[axis]["pos"].set(f"{pos_val} pulse")
-                if spd_ok:
-                    self.axis_data[axis]["spd"].set(f"{spd_val} pps")
-        else:
-            for axis in range(1, 5):
-                self.axis_data[axis]["pos"].set("Offline")
-                self.axis_data[axis]["spd"].set("Offline")
-
-        self.master.after(500, self.update_monitor)
+        try:
+            refresh_ms = max(MIN_REFRESH_MS, int(self.refresh_entry.get()))
+        except ValueError:
+            refresh_ms = 500
+        self.poller.interval = refresh_ms / 1000.0
+
+        snapshot = self.poller.latest()
+        for axis, fields in self.axis_data.items():
+            if snapshot is None:
+                texts = {"pos": "Offline", "spd": "Offline", "velocity": "-", "ferr": "-"}
+            else:
+                data = snapshot[axis]
+                texts = {
+                    "pos": f"{data['pos']} pulse",
+                    "spd": f"{data['spd']} pps",
+                    "velocity": f"{data['velocity']:.0f} pps",
+                    "ferr": f"{data['ferr']:.0f} pulse",
+                }
+            for key, text in texts.items():
+                # Only touch the widgets whose text actually changed
+                if self._shown.get((axis, key)) != text:
+                    self._shown[(axis, key)] = text
+                    fields[key].set(text)
+
+        self.master.after(self.FRAME_MS, self.update_monitor)
+
+    def close(self):
+        self.poller.stop()
+        self.master.destroy()
 
 
 if __name__ == "__main__":
     from basic.plc_module import PLCController
-    
+
+    # python position_monitor.py [axis_count] [refresh_ms]
+    axis_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    refresh_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
     test_plc = PLCController(config_print=False)
     test_plc.plcConnect("192.168.3.250", 502)
-    
+
     root = tk.Tk()
-    app = ServoMonitorUI(root, test_plc)
-    root.mainloop()
\ No newline at end of file
+    app = ServoMonitorUI(root, test_plc, axis_count=axis_count, refresh_ms=refresh_ms)
+    root.mainloop()
@@ -0,0 +1,285 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import csv
+import json
+import time
+import argparse
+import threading
+from basic.plc_pool import PLCPool
+from basic.plc_module import words_to_int32
+from servo.axis_profile import AxisProfile
+from servo.mj4r_servo import execute_move
+
+# Axis monitor block (as servo.position_monitor): position (32-bit) at D5500 + (axis-1)*40
+MONITOR_BASE = 5500
+MONITOR_STRIDE = 40
+
+# test_servo's sequence as data. Per step:
+#   MODE/TARGET/SPEED   - as in ddrvi
+#   REPEAT, SPEED_STEP  - run REPEAT times, adding SPEED_STEP to SPEED each time
+#   PPR_SCALE           - multiply the station PPR (basic test uses ppr*2)
+#   MOVES               - a group of steps repeated together (rapid reversal)
+#   DWELL               - optional pause after each move (default: none, the done bit is the wait)
+DEFAULT_SEQUENCE = [
+    {"name": "basic_fwd", "MODE": "rev", "TARGET": 1, "SPEED": 20, "PPR_SCALE": 2},
+    {"name": "basic_rev", "MODE": "rev", "TARGET": -1, "SPEED": 20, "PPR_SCALE": 2},
+    {"name": "low_speed_fwd", "MODE": "rev", "TARGET": 1, "SPEED": 50, "SPEED_STEP": 50, "REPEAT": 3},
+    {"name": "low_speed_rev", "MODE": "rev", "TARGET": -1, "SPEED": 50, "SPEED_STEP": 50, "REPEAT": 3},
+    {"name": "high_speed_fwd", "MODE": "rev", "TARGET": 2, "SPEED": 300, "SPEED_STEP": 100, "REPEAT": 3},
+    {"name": "high_speed_rev", "MODE": "rev", "TARGET": -2, "SPEED": 300, "SPEED_STEP": 100, "REPEAT": 3},
+    {"name": "sections8_fwd", "MODE": "rev", "TARGET": 1 / 8, "SPEED": 500, "REPEAT": 8},
+    {"name": "sections16_fwd", "MODE": "rev", "TARGET": 1 / 16, "SPEED": 500, "REPEAT": 16},
+    {"name": "sections8_rev", "MODE": "rev", "TARGET": -1 / 8, "SPEED": 500, "REPEAT": 8},
+    {"name": "sections16_rev", "MODE": "rev", "TARGET": -1 / 16, "SPEED": 500, "REPEAT": 16},
+    {"name": "rapid_reversal", "REPEAT": 10, "MOVES": [
+        {"MODE": "rev", "TARGET": 0.25, "SPEED": 150},
+        {"MODE": "rev", "TARGET": -0.15, "SPEED": 1000},
+    ]},
+]
+
+
+def parse_station(spec: str) -> dict:
+    """"192.168.3.250:502/1,2/36000" -> station dict; port defaults to 502, axes to 1, PPR to 10000."""
+    fields = spec.split("/")
+    if len(fields) > 3:
+        raise ValueError(f"Invalid station '{spec}'. Use ip[:port]/axes/ppr.")
+    ip, _, port = fields[0].partition(":")
+    axes = fields[1] if len(fields) > 1 and fields[1] else "1"
+    ppr = int(fields[2]) if len(fields) > 2 and fields[2] else 10000
+    if not ip or ppr <= 0:
+        raise ValueError(f"Invalid station '{spec}': need an IP and a PPR above 0.")
+    return {"ip": ip, "port": int(port or 502), "axes": [int(a) for a in axes.split(",")], "ppr": ppr}
+
+
+def expand_sequence(sequence, parent_name=None):
+    """Flatten a declarative sequence into individual moves."""
+    for step in sequence:
+        name = step.get("name", parent_name or "step")
+        for i in range(step.get("REPEAT", 1)):
+            if "MOVES" in step:
+                yield from expand_sequence(step["MOVES"], parent_name=name)
+                continue
+            yield {
+                "name": name,
+                "MODE": step.get("MODE", "pulse"),
+                "TARGET": step["TARGET"],
+                "SPEED": step["SPEED"] + step.get("SPEED_STEP", 0) * i,
+                "PPR_SCALE": step.get("PPR_SCALE", 1),
+                "DWELL": step.get("DWELL", 0.0),
+            }
+
+
+class ServoTestRunner:
+    def __init__(self, stations, sequence=None, pool=None, timeout_scale: float = 1.0,
+                 time_scale: float = 1.0, time_tolerance: float = 0.5, time_margin: float = 0.3,
+                 position_tolerance: int = 10, move_id_offset: int = None):
+        """
+        Headless runner for servo test sequences.
+
+        stations: [{"ip": ..., "port": 502, "axes": [1, 2], "ppr": 36000}, ...]
+        Every (station, axis) pair runs the sequence in its own thread; axes
+        on the same PLC share one pooled connection.
+
+        A move passes when done comes back, the monitor position moved by
+        the commanded pulses (+- position_tolerance) and it took the
+        expected time * time_scale (+- time_tolerance of it, plus
+        time_margin seconds for polling and handshake).
+        move_id_offset: write a move counter to D[axis*100+offset] for traces
+        (the register must be free on the PLC); off by default.
+        """
+        self.stations = stations
+        self.sequence = sequence if sequence is not None else DEFAULT_SEQUENCE
+        self.pool = pool if pool is not None else PLCPool()
+        self.timeout_scale = timeout_scale
+        self.time_scale = time_scale
+        self.time_tolerance = time_tolerance
+        self.time_margin = time_margin
+        self.position_tolerance = position_tolerance
+        self.move_id_offset = move_id_offset
+        self.results = []
+        self._lock = threading.Lock()
+
+    def run(self) -> list:
+        threads = []
+        for station in self.stations:
+            for axis in station.get("axes", [1]):
+                t = threading.Thread(target=self._run_axis, args=(station, axis), daemon=True)
+                threads.append(t)
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.results
+
+    def _run_axis(self, station, axis):
+        ip = station["ip"]
+        port = station.get("port", 502)
+        label = f"{ip}:{port} Axis {axis}"
+        plc = self.pool.get(ip, port)
+        if plc is None:
+            print(f">> [{label}] Connection failed.")
+            self._record({"station": f"{ip}:{port}", "axis": axis, "step": "connect", "index": 0,
+                          "status": "comm_error", "passed": False})
+            return
+
+        print(f">> [{label}] Running {len(self.sequence)} steps...")
+        for index, move in enumerate(expand_sequence(self.sequence)):
+            try:
+                profile = AxisProfile.for_mode(station.get("ppr", 10000) * move["PPR_SCALE"], move["MODE"].lower())
+                pulses, pps = profile.command(move["TARGET"], move["SPEED"])
+                if pps <= 0:
+                    raise ValueError(f"SPEED {move['SPEED']} is 0 pps")
+            except (ValueError, TypeError) as e:
+                print(f">> [{label}] {move['name']} #{index} invalid: {e}. Stopping this axis.")
+                self._record({"station": f"{ip}:{port}", "axis": axis, "step": move["name"], "index": index,
+                              "mode": move["MODE"], "target": move["TARGET"], "speed": move["SPEED"],
+                              "status": "invalid_move", "error": str(e), "passed": False})
+                return
+            expected = abs(pulses) / pps
+            timeout = (expected * 2.0 + 5.0) * self.timeout_scale
+
+            monitor = MONITOR_BASE + (axis - 1) * MONITOR_STRIDE
+            before, ok_before = plc.read_holding_range(monitor, 2, max_age=0)
+            move_id_addr = None if self.move_id_offset is None else axis * 100 + self.move_id_offset
+            status, elapsed = execute_move(plc, axis, pulses, pps, timeout=timeout, poll=0.02,
+                                           move_id_addr=move_id_addr)
+            after, ok_after = plc.read_holding_range(monitor, 2, max_age=0)
+
+            travel = None
+            if status == "done":
+                if not (ok_before and ok_after):
+                    status = "comm_error"
+                else:
+                    travel = words_to_int32(*after) - words_to_int32(*before)
+                    scaled = expected * self.time_scale
+                    if abs(travel - pulses) > self.position_tolerance:
+                        status = "position_error"
+                    elif abs(elapsed - scaled) > scaled * self.time_tolerance + self.time_margin:
+                        status = "time_error"
+            self._record({
+                "station": f"{ip}:{port}",
+                "axis": axis,
+                "step": move["name"],
+                "index": index,
+                "mode": move["MODE"],
+                "target": move["TARGET"],
+                "speed": move["SPEED"],
+                "pulses": pulses,
+                "pps": pps,
+                "expected_s": round(expected * self.time_scale, 4),
+                "elapsed_s": round(elapsed, 4),
+                "travel": travel,
+                "status": status,
+                "passed": status == "done",
+            })
+            if status != "done":
+                print(f">> [{label}] {move['name']} #{index} failed: {status}. Stopping this axis.")
+                return
+            if move["DWELL"]:
+                time.sleep(move["DWELL"])
+
+        print(f">> [{label}] Sequence completed.")
+
+    def _record(self, row):
+        with self._lock:
+            self.results.append(row)
+
+    def passed(self) -> bool:
+        return bool(self.results) and all(row["passed"] for row in self.results)
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"passed": self.passed(), "moves": self.results}, f, indent=2)
+
+    def write_csv(self, path):
+        fields = []
+        for row in self.results:
+            fields.extend(k for k in row if k not in fields)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run servo test sequences on many axes and PLCs in parallel.")
+    parser.add_argument("--station", action="append", default=[],
+                        help="ip[:port]/axes/ppr, e.g. 192.168.3.250/1,2,3,4/36000 (repeatable)")
+    parser.add_argument("--sequence", help="JSON file with a test sequence (default: test_servo sequence)")
+    parser.add_argument("--json", help="Write the report as JSON")
+    parser.add_argument("--csv", help="Write the per-move report as CSV")
+    parser.add_argument("--simulate", action="store_true", help="Run against the in-process PLC simulator")
+    parser.add_argument("--time-scale", type=float, default=0.01,
+                        help="Simulator move duration scale (default: 0.01)")
+    parser.add_argument("--trace", help="Record position/speed traces of every station into this directory")
+    parser.add_argument("--move-id-offset", type=int,
+                        help="Free D register (from axis*100) for a per-move counter in traces, e.g. 6")
+    args = parser.parse_args(argv)
+
+    try:
+        stations = [parse_station(spec) for spec in args.station or ["192.168.3.250/1/36000"]]
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+
+    sequence = None
+    if args.sequence:
+        with open(args.sequence) as f:
+            sequence = json.load(f)
+        try:
+            list(expand_sequence(sequence))
+        except (KeyError, TypeError) as e:
+            print(f"Error: invalid sequence in {args.sequence}: missing or bad field {e}")
+            return 2
+
+    pool = None
+    if args.simulate:
+        from basic.plc_simulator import SimulatedPLC
+
+        # One simulated PLC per station address
+        sims = {}
+        def factory(ip, port):
+            sim = sims.setdefault((ip, port), SimulatedPLC(axis_count=8, time_scale=args.time_scale))
+            return sim.client(ip, port)
+        pool = PLCPool(client_factory=factory)
+
+    runner = ServoTestRunner(stations, sequence=sequence, pool=pool,
+                             time_scale=args.time_scale if args.simulate else 1.0,
+                             move_id_offset=args.move_id_offset)
+    recorders = []
+    if args.trace:
+        from servo.trace_recorder import TraceRecorder
+
+        for station in stations:
+            plc = runner.pool.get(station["ip"], station["port"])
+            if plc is not None:
+                recorders.append(TraceRecorder(plc, axes=station["axes"], directory=args.trace,
+                                               move_id_offset=args.move_id_offset))
+                recorders[-1].start()
+
+    started = time.monotonic()
+    runner.run()
+    for recorder in recorders:
+        recorder.stop()
+    runner.pool.close_all()
+
+    if args.json:
+        runner.write_json(args.json)
+    if args.csv:
+        runner.write_csv(args.csv)
+
+    moves = len(runner.results)
+    failed = sum(1 for row in runner.results if not row["passed"])
+    print("\n" + "="*50)
+    print(f"{moves} moves, {failed} failed, {time.monotonic() - started:.2f} s")
+    print("PASSED" if runner.passed() else "FAILED")
+    print("="*50)
+    return 0 if runner.passed() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import csv
+import json
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from servo.trace_recorder import TRACE_DTYPE
+
+# status of a move
+DONE, ERROR, INCOMPLETE = 0, 1, 2
+STATUS_NAMES = {DONE: "done", ERROR: "error", INCOMPLETE: "incomplete"}
+
+MOVE_DTYPE = np.dtype([
+    ("t_start", "<f8"),
+    ("axis", "u1"),
+    ("status", "u1"),
+    ("cmd_pos", "<i4"),
+    ("cmd_spd", "<i4"),
+    ("travel", "<i4"),       # measured position change, start to done (pulse)
+    ("latency", "<f8"),      # move start -> done edge (s)
+    ("expected", "<f8"),     # |cmd_pos| / cmd_spd (s)
+    ("settle", "<f8"),       # done edge -> position stays within tolerance of its final value (s)
+    ("overshoot", "<i4"),    # furthest travel past the commanded end position (pulse)
+    ("ripple", "<f8"),       # speed std / mean over the cruise part of the move (%)
+])
+
+
+def load_trace(path: str) -> np.ndarray:
+    """Memory-map a .trace file; a partly written last record is ignored."""
+    size = os.path.getsize(path) // TRACE_DTYPE.itemsize
+    if size == 0:
+        return np.zeros(0, dtype=TRACE_DTYPE)
+    return np.memmap(path, dtype=TRACE_DTYPE, mode="r", shape=(size,))
+
+
+def rising_edges(bits: np.ndarray) -> np.ndarray:
+    bits = bits.astype(bool)
+    return np.flatnonzero(bits & ~np.concatenate(([bits[0]], bits[:-1])))
+
+
+def _segments_by_move_id(trace, spd, motion, n):
+    """(starts, ends, status) from the move_id register; see axis_moves."""
+    move_id = trace["move_id"].astype(np.int64)
+    starts = np.flatnonzero(move_id[1:] != move_id[:-1]) + 1
+    nexts = np.append(starts[1:], n)
+    # Ids count up by one per move (31-bit wrap); a restarted runner begins again at 1
+    jump = (move_id[starts] - move_id[starts - 1]) % (1 << 31)
+    merged = (jump != 1) & (move_id[starts] != 1)
+
+    err_edges = rising_edges(trace["err"])
+    end_edges = np.union1d(rising_edges(trace["done"]), err_edges)
+    # An edge on the start sample itself is the previous move's done, seen before its clear
+    first_end = np.append(end_edges, n)[np.searchsorted(end_edges, starts, side="right")]
+    signalled = first_end < nexts
+
+    # Last sample showing motion before the next command (-1 if none). Motion on the
+    # start sample itself may be the previous move's, so resting needs motion after it
+    last_motion = np.append(-1, motion)[np.searchsorted(motion, nexts)]
+    rested = ~signalled & (last_motion > starts) & (last_motion + 1 < nexts) & (nexts < n)
+
+    ends = np.where(signalled, first_end, np.where(rested, last_motion + 1, nexts - 1))
+    status = np.full(len(starts), INCOMPLETE, dtype=np.uint8)
+    status[signalled | rested] = DONE
+    status[signalled & np.isin(ends, err_edges)] = ERROR
+    # The sample before the start is the origin only if the previous move had ended by then
+    origin_known = np.append(True, (signalled | rested)[:-1]) & (spd[starts - 1] == 0)
+    status[merged | ~origin_known] = INCOMPLETE
+    return starts, ends, status
+
+
+def _segments_by_done(trace, spd, motion, n):
+    """(starts, ends, status) from done/err edges; see axis_moves."""
+    err_edges = rising_edges(trace["err"])
+    ends = np.union1d(rising_edges(trace["done"]), err_edges)
+    prev_ends = np.concatenate(([-1], ends[:-1]))
+    first_motion = np.append(motion, n)[np.searchsorted(motion, prev_ends, side="right")]
+    starts = np.where(first_motion <= ends, first_motion, prev_ends + 1)
+
+    # Evidence that a missed done merged several moves into one segment:
+    # a second trigger edge, a command change, or a stop inside the motion
+    trig_edges = rising_edges(trace["trig"])
+    triggers = np.searchsorted(trig_edges, ends, side="right") - np.searchsorted(trig_edges, prev_ends, side="right")
+    commands = np.flatnonzero((trace["cmd_pos"][1:] != trace["cmd_pos"][:-1]) |
+                              (trace["cmd_spd"][1:] != trace["cmd_spd"][:-1])) + 1
+    changed = np.searchsorted(commands, ends, side="right") - np.searchsorted(commands, starts, side="right")
+    rest = np.setdiff1d(np.arange(n), motion, assume_unique=True)
+    last_motion = np.append(-1, motion)[np.searchsorted(motion, ends, side="right")]
+    paused = np.searchsorted(rest, last_motion) - np.searchsorted(rest, starts, side="right")
+    merged = (triggers > 1) | (changed > 0) | (paused > 0)
+
+    status = np.where(np.isin(ends, err_edges), ERROR, DONE).astype(np.uint8)
+    origin_known = (starts >= 1) & (spd[np.maximum(starts - 1, 0)] == 0)
+    status[merged | ~origin_known] = INCOMPLETE
+    return starts, ends, status
+
+
+def axis_moves(samples: np.ndarray, axis: int, settle_tolerance: int = 10,
+               cruise_ratio: float = 0.9) -> np.ndarray:
+    """
+    Segment one axis' samples into moves and compute their metrics.
+
+    Traces recorded with a move_id register (see execute_move's
+    move_id_offset) start a move at every sample whose id changed: the id
+    is written in the same frame as the command, so a move cannot be
+    missed. An id jump above one means several commands fell between two
+    samples. Such a move ends on the first done or err edge, or where it
+    came to rest before the next command.
+
+    Without move ids a move ends on each done or err rising edge and
+    starts at the first sample showing motion after the previous one. A
+    done pulse the sampler missed merges two moves; a segment with a
+    second trigger edge, a command change or a stop inside it is
+    therefore reported as incomplete, never as done.
+
+    A move whose origin was not seen at rest is incomplete too. Each
+    move's window runs to the next start, so overshoot and settling after
+    done are still seen. Every metric is a reduceat over those windows,
+    so the cost does not depend on the number of moves.
+    """
+    trace = samples[samples["axis"] == axis]
+    trace = trace[np.argsort(trace["t"], kind="stable")]
+    n = len(trace)
+    if n < 2:
+        return np.zeros(0, dtype=MOVE_DTYPE)
+
+    t = trace["t"]
+    pos = trace["pos"].astype(np.int64)
+    spd = np.abs(trace["spd"].astype(np.int64))
+    motion = np.flatnonzero((spd != 0) | (np.diff(pos, prepend=pos[0]) != 0))
+
+    if np.any(trace["move_id"] != trace["move_id"][0]):
+        starts, ends, status = _segments_by_move_id(trace, spd, motion, n)
+    else:
+        starts, ends, status = _segments_by_done(trace, spd, motion, n)
+    if len(starts) == 0:
+        return np.zeros(0, dtype=MOVE_DTYPE)
+    nexts = np.append(starts[1:], n)
+    lengths = nexts - starts
+
+    # Position before the start sample is the move origin (motion may begin within one sample)
+    origin = pos[np.maximum(starts - 1, 0)]
+    # The command is set up before the move starts and held until the next setup
+    cmd_pos = trace["cmd_pos"][starts].astype(np.int64)
+    cmd_spd = trace["cmd_spd"][starts].astype(np.int64)
+    target = origin + cmd_pos
+    direction = np.where(cmd_pos >= 0, 1, -1)
+    final = pos[nexts - 1]
+
+    # Per-sample views of the per-move values, covering starts[0]..n
+    lo = starts[0]
+    index = np.arange(lo, n)
+    window_pos = pos[lo:]
+    offsets = starts - lo
+    rep = lambda values: np.repeat(values, lengths)
+
+    overshoot = np.maximum.reduceat(rep(direction) * (window_pos - rep(target)), offsets)
+    overshoot = np.maximum(overshoot, 0)
+
+    # Last sample after done that is still outside the band around the final position
+    outside = (np.abs(window_pos - rep(final)) > settle_tolerance) & (index >= rep(ends))
+    last_outside = np.maximum.reduceat(np.where(outside, index, -1), offsets)
+    settled_at = np.where(last_outside >= 0, np.minimum(last_outside + 1, nexts - 1), ends)
+    settle = t[settled_at] - t[ends]
+
+    # Speed ripple over samples between trigger and done that are near the peak speed
+    moving = index < rep(ends)
+    window_spd = np.where(moving, spd[lo:], 0)
+    peak = np.maximum.reduceat(window_spd, offsets)
+    cruise = moving & (window_spd >= cruise_ratio * rep(peak)) & (window_spd > 0)
+    count = np.add.reduceat(cruise.astype(np.int64), offsets)
+    total = np.add.reduceat(np.where(cruise, window_spd, 0).astype(np.float64), offsets)
+    squares = np.add.reduceat(np.where(cruise, window_spd, 0).astype(np.float64) ** 2, offsets)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean ** 2, 0))
+        ripple = np.where(count >= 3, std / mean * 100.0, np.nan)
+        expected = np.where(cmd_spd > 0, np.abs(cmd_pos) / cmd_spd, np.nan)
+
+    moves = np.zeros(len(starts), dtype=MOVE_DTYPE)
+    moves["t_start"] = t[starts]
+    moves["axis"] = axis
+    moves["status"] = status
+    moves["cmd_pos"] = cmd_pos
+    moves["cmd_spd"] = cmd_spd
+    moves["travel"] = pos[ends] - origin
+    moves["latency"] = t[ends] - t[starts]
+    moves["expected"] = expected
+    moves["settle"] = settle
+    moves["overshoot"] = overshoot
+    moves["ripple"] = ripple
+
+    incomplete = status == INCOMPLETE
+    for field in ("latency", "settle", "ripple"):
+        moves[field][incomplete] = np.nan
+    return moves
+
+
+def analyze_file(path: str, settle_tolerance: int = 10) -> np.ndarray:
+    samples = load_trace(path)
+    moves = [axis_moves(samples, axis, settle_tolerance) for axis in np.unique(samples["axis"])]
+    return np.concatenate(moves) if moves else np.zeros(0, dtype=MOVE_DTYPE)
+
+
+def analyze_files(paths: list, workers: int = None, settle_tolerance: int = 10) -> np.ndarray:
+    """
+    Analyze many trace files on a process pool (one file per task).
+
+    A move is only seen whole if it lies inside one file; the recorder
+    rotates files at most hourly, so at most one move per axis per file
+    boundary is reported as incomplete.
+    """
+    if not paths:
+        return np.zeros(0, dtype=MOVE_DTYPE)
+    if workers == 1 or len(paths) == 1:
+        results = [analyze_file(path, settle_tolerance) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(analyze_file, paths, [settle_tolerance] * len(paths)))
+    return np.concatenate(results)
+
+
+def summarize(moves: np.ndarray) -> list:
+    """One row per (axis, commanded speed)."""
+    summary = []
+    keys = np.unique(moves[["axis", "cmd_spd"]])
+    for axis, cmd_spd in keys:
+        group = moves[(moves["axis"] == axis) & (moves["cmd_spd"] == cmd_spd)]
+        ok = group[group["status"] == DONE]
+        excess = ok["latency"] - ok["expected"]
+        stat = lambda values, fn: round(float(fn(values)), 4) if len(values) and not np.all(np.isnan(values)) else None
+        summary.append({
+            "axis": int(axis),
+            "cmd_spd": int(cmd_spd),
+            "moves": len(group),
+            "errors": int(np.sum(group["status"] == ERROR)),
+            "incomplete": int(np.sum(group["status"] == INCOMPLETE)),
+            "latency_mean": stat(ok["latency"], np.nanmean),
+            "excess_mean": stat(excess, np.nanmean),
+            "excess_p95": stat(excess, lambda v: np.nanpercentile(v, 95)),
+            "settle_mean": stat(ok["settle"], np.nanmean),
+            "settle_p95": stat(ok["settle"], lambda v: np.nanpercentile(v, 95)),
+            "overshoot_max": stat(ok["overshoot"], np.max),
+            "ripple_mean": stat(ok["ripple"], np.nanmean),
+        })
+    return summary
+
+
+def print_summary(summary: list):
+    print(f"{'Axis':>4} {'Speed':>8} {'Moves':>6} {'Err':>4} {'Latency':>8} {'Excess95':>9} "
+          f"{'Settle95':>9} {'OvrMax':>7} {'Ripple%':>8}")
+    fmt = lambda value, spec: format(value, spec) if value is not None else "-"
+    for row in summary:
+        print(f"{row['axis']:>4} {row['cmd_spd']:>8} {row['moves']:>6} {row['errors']:>4} "
+              f"{fmt(row['latency_mean'], '8.3f'):>8} {fmt(row['excess_p95'], '9.3f'):>9} "
+              f"{fmt(row['settle_p95'], '9.3f'):>9} {fmt(row['overshoot_max'], '7.0f'):>7} "
+              f"{fmt(row['ripple_mean'], '8.2f'):>8}")
+
+
+def write_moves_csv(path: str, moves: np.ndarray):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(MOVE_DTYPE.names)
+        for move in moves:
+            row = list(move.tolist())
+            row[2] = STATUS_NAMES[row[2]]
+            writer.writerow(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-move servo statistics from recorded .trace files.")
+    parser.add_argument("paths", nargs="+", help="Trace files or directories")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--tolerance", type=int, default=10, help="Settle band in pulses (default: 10)")
+    parser.add_argument("--csv", help="Write every move as CSV")
+    parser.add_argument("--json", help="Write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            paths.extend(sorted(glob.glob(os.path.join(path, "*.trace"))))
+        else:
+            paths.append(path)
+
+    started = time.perf_counter()
+    moves = analyze_files(paths, workers=args.workers, settle_tolerance=args.tolerance)
+    summary = summarize(moves)
+    elapsed = time.perf_counter() - started
+
+    print_summary(summary)
+    print(f"\n{len(moves)} moves from {len(paths)} files in {elapsed:.2f} s")
+    if args.csv:
+        write_moves_csv(args.csv, moves)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
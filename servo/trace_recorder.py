@@ -0,0 +1,154 @@
+import os , sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import time
+import threading
+import numpy as np
+from basic.plc_module import coalesce_ranges, words_to_int32
+from servo.mj4r_servo import ddrvi_addresses
+
+# Same monitor block as servo.position_monitor: position (32-bit) at +0, speed (32-bit) at +4
+MONITOR_BASE = 5500
+MONITOR_STRIDE = 40
+MONITOR_WORDS = 6
+
+# One record per axis per sample, packed so files can be appended to and memory-mapped as-is
+TRACE_DTYPE = np.dtype([
+    ("t", "<f8"),         # time.time() of the sample
+    ("axis", "u1"),
+    ("pos", "<i4"),       # monitor position (pulse)
+    ("spd", "<i4"),       # monitor speed (pps)
+    ("trig", "?"),        # M[axis*100]
+    ("done", "?"),        # M[axis*100+10]
+    ("err", "?"),         # M[axis*100+11]
+    ("cmd_pos", "<i4"),   # D[axis*100]   commanded relative move (pulse)
+    ("cmd_spd", "<i4"),   # D[axis*100+2] commanded speed (pps)
+    ("move_id", "<i4"),   # D[axis*100+move_id_offset] counter written by execute_move (0 if not recorded)
+])
+
+
+class TraceRecorder:
+    def __init__(self, plc, axes=(1, 2, 3, 4), directory: str = "traces",
+                 interval: float = 0.01, rotate: float = 3600.0, move_id_offset: int = None):
+        """
+        บันทึก position/speed และบิต handshake ของ DDRVI ทุกแกนลงไฟล์ .trace (เธรดแยก)
+
+        Each sample is three ranged reads at most: monitor blocks, handshake
+        bits and command registers. Records are appended to
+        <directory>/trace_YYYYmmdd_HHMMSS.trace, a new file every `rotate`
+        seconds; servo.trace_analysis reads them back. move_id_offset is the
+        register (from axis*100) that execute_move's move_id_addr writes to;
+        without it move_id is recorded as 0 and moves are segmented on done.
+        """
+        self.plc = plc
+        self.axes = list(axes)
+        self.directory = directory
+        self.interval = interval
+        self.rotate = rotate
+        self.samples = 0
+        self.files = []
+        self.move_id_offset = move_id_offset
+
+        self.monitor_reads = coalesce_ranges(
+            [(MONITOR_BASE + (axis - 1) * MONITOR_STRIDE, MONITOR_WORDS) for axis in self.axes], plc.MAX_READ_REGS)
+        self.bit_reads = coalesce_ranges(
+            [(ddrvi_addresses(axis)["trigger"], 12) for axis in self.axes], plc.MAX_READ_BITS)
+        command_ranges = [(ddrvi_addresses(axis)["position"], 4) for axis in self.axes]
+        if move_id_offset is not None:
+            command_ranges += [(axis * 100 + move_id_offset, 2) for axis in self.axes]
+        self.command_reads = coalesce_ranges(command_ranges, plc.MAX_READ_REGS)
+
+        self._buffer = []
+        self._file = None
+        self._file_started = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop_event.clear()
+        # First sample before returning, so a move commanded right after start() is seen starting
+        self.sample_once()
+        self._thread = threading.Thread(target=self._run, name="TraceRecorder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self._flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read(self, reads, reader) -> dict:
+        values = {}
+        for start, count in reads:
+            chunk, ok = reader(start, count)
+            if not ok:
+                return None
+            for i, value in enumerate(chunk):
+                values[start + i] = value
+        return values
+
+    def sample_once(self) -> bool:
+        now = time.time()
+        # Monitor last: a done bit or new command seen in this sample is then already
+        # reflected in its position, never the other way round
+        bits = self._read(self.bit_reads, self.plc.read_M_range)
+        commands = bits and self._read(self.command_reads, self.plc.read_holding_range)
+        words = commands and self._read(self.monitor_reads, self.plc.read_holding_range)
+        if not words:
+            return False
+
+        for axis in self.axes:
+            base = MONITOR_BASE + (axis - 1) * MONITOR_STRIDE
+            addr = ddrvi_addresses(axis)
+            move_id = 0
+            if self.move_id_offset is not None:
+                id_addr = axis * 100 + self.move_id_offset
+                move_id = words_to_int32(commands[id_addr], commands[id_addr + 1])
+            self._buffer.append((
+                now, axis,
+                words_to_int32(words[base], words[base + 1]),
+                words_to_int32(words[base + 4], words[base + 5]),
+                bits[addr["trigger"]], bits[addr["done"]], bits[addr["err"]],
+                words_to_int32(commands[addr["position"]], commands[addr["position"] + 1]),
+                words_to_int32(commands[addr["speed"]], commands[addr["speed"] + 1]),
+                move_id,
+            ))
+        self.samples += 1
+        return True
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        now = time.time()
+        if self._file is None or now - self._file_started >= self.rotate:
+            if self._file is not None:
+                self._file.close()
+            name = time.strftime("trace_%Y%m%d_%H%M%S.trace", time.localtime(now))
+            path = os.path.join(self.directory, name)
+            self._file = open(path, "ab")
+            self._file_started = now
+            self.files.append(path)
+        self._file.write(np.array(self._buffer, dtype=TRACE_DTYPE).tobytes())
+        self._file.flush()
+        self._buffer = []
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            self.sample_once()
+            if started - last_flush >= 1.0:
+                self._flush()
+                last_flush = started
+            remaining = self.interval - (time.monotonic() - started)
+            if remaining > 0:
+                self._stop_event.wait(remaining)